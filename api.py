@@ -0,0 +1,194 @@
+import argparse, asyncio, io, os
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from PIL import Image
+import emv_tlv
+import encoding
+import metrics
+import qr_templates
+import render_cache
+import render_executor
+import scheduler
+from bulk import row_inputs
+from crc16 import verify_crc
+from decoders import decode_image, decoder_stats
+from vietqr import BANK_MAP, extract_vietqr_info
+
+# ======== HTTP API render/giải mã VietQR (chạy độc lập cạnh giao diện Streamlit) ========
+# Chạy: python api.py --port 8502
+#   GET  /health
+#   POST /payload               JSON {account, bank_bin?, note?, amount?}
+#   POST /render/{template}     JSON như /payload + name, store, staff_name, staff_phone, branch_name
+#                               ?profile=png|png_fast|png_palette|webp_lossless|jpeg (hoặc format=png|jpeg|webp)
+#                               &scale=<0.05..1> (bản xem trước nhỏ, render thẳng ở tỉ lệ này) &width=<px>
+#                               &cprofile=1 (render lại 1 lần dưới cProfile, trả bảng pstats dạng text)
+#   POST /decode                ảnh (body thô hoặc multipart field "file")
+#   GET  /metrics               histogram thời gian render/giải mã dạng Prometheus (cần QR_METRICS=1)
+MAX_QUEUE = int(os.environ.get("QR_API_MAX_QUEUE", "32"))
+MAX_BODY_MB = int(os.environ.get("QR_API_MAX_BODY_MB", "20"))
+KEEPALIVE_SECONDS = float(os.environ.get("QR_API_KEEPALIVE", "75"))
+# format= là cách gọi ngắn cho các hồ sơ mã hoá
+FORMAT_PROFILES = {"png": "png", "jpeg": "jpeg", "jpg": "jpeg", "webp": "webp_lossless"}
+
+
+async def run_blocking(request, fn, *args):
+    # Việc Pillow/OpenCV chạy trên pool dùng chung; quá MAX_QUEUE việc đang chờ thì trả 503
+    state = request.app["state"]
+    if state["inflight"] >= MAX_QUEUE:
+        raise web.HTTPServiceUnavailable(text="Máy chủ đang bận, vui lòng thử lại", headers={"Retry-After": "1"})
+    state["inflight"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(render_executor.get_executor(), fn, *args)
+    finally:
+        state["inflight"] -= 1
+
+
+# Thread chờ scheduler cấp phép (chờ lâu nhưng không tốn CPU); tối đa MAX_QUEUE request cùng chờ
+_admit_pool = ThreadPoolExecutor(max_workers=MAX_QUEUE, thread_name_prefix="qr-admit")
+
+
+def _release_when_granted(fut):
+    if not fut.cancelled() and fut.exception() is None:
+        scheduler.release(fut.result())
+
+
+async def render_scheduled(request, template_id, inputs, profile, scale):
+    # Xin scheduler cho chạy ngay trong tiến trình API rồi mới gửi việc sang pool render: giới hạn bộ nhớ và
+    # hàng chờ công bằng (theo địa chỉ client) vẫn là chung cả tiến trình kể cả khi QR_RENDER_EXECUTOR=process
+    pending = asyncio.get_running_loop().run_in_executor(_admit_pool, scheduler.acquire, template_id, scale,
+                                                         request.remote or "api")
+    try:
+        ticket = await asyncio.shield(pending)
+    except asyncio.CancelledError:
+        pending.add_done_callback(_release_when_granted)  # client bỏ đi: vé cấp muộn vẫn phải trả
+        raise
+    try:
+        return await run_blocking(request, qr_templates.render_template, template_id, inputs, profile, scale)
+    finally:
+        scheduler.release(ticket)
+
+
+async def read_inputs(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Body phải là JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Body phải là JSON object")
+    try:
+        return row_inputs({k: str(v).strip() for k, v in body.items() if v is not None})
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+
+def resize_image(data, width, profile):
+    # Thu nhỏ ảnh đã render theo chiều rộng rồi mã hoá lại theo hồ sơ
+    img = Image.open(io.BytesIO(data))
+    if width < img.width:
+        img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+    return encoding.encode(img, profile).getvalue()
+
+
+async def health(request):
+    return web.json_response({"status": "ok", "inflight": request.app["state"]["inflight"],
+                              "render_cache": render_cache.cache_stats(), "scheduler": scheduler.scheduler_stats(),
+                              "decoders": decoder_stats()})
+
+
+async def payload(request):
+    inputs = await read_inputs(request)
+    return web.json_response({"payload": inputs["data"], "crc": inputs["data"][-4:]})
+
+
+async def render(request):
+    template_id = request.match_info["template"]
+    if template_id not in qr_templates.TEMPLATES:
+        raise web.HTTPNotFound(text=f"Không có mẫu {template_id}")
+    fmt = request.query.get("format", "").lower()
+    profile = request.query.get("profile") or FORMAT_PROFILES.get(fmt, fmt) or None
+    if profile is not None and profile not in encoding.PROFILES:
+        raise web.HTTPBadRequest(text=f"profile phải là một trong: {', '.join(encoding.PROFILES)}")
+    try:
+        width = int(request.query.get("width", 0))
+        scale = float(request.query.get("scale", 1))
+    except ValueError:
+        raise web.HTTPBadRequest(text="width phải là số nguyên, scale phải là số")
+    if not 0.05 <= scale <= 1:
+        raise web.HTTPBadRequest(text="scale phải trong khoảng 0.05 - 1")
+    if width < 0:
+        raise web.HTTPBadRequest(text="width không được âm")
+    inputs = await read_inputs(request)
+    if request.query.get("cprofile") == "1":
+        _, stats = await run_blocking(request, metrics.profile_call, qr_templates.render_template,
+                                      template_id, inputs, profile, scale)
+        return web.Response(text=stats)
+
+    data = render_cache.lookup(template_id, inputs, profile, scale)
+    if data is None:
+        # Qua scheduler dùng chung (giới hạn bộ nhớ/số job), xếp hàng công bằng theo địa chỉ client
+        try:
+            buf = await render_scheduled(request, template_id, inputs, profile, scale)
+        except scheduler.SchedulerBusy as e:
+            raise web.HTTPServiceUnavailable(text=str(e), headers={"Retry-After": "5"})
+        data = buf.getvalue()
+        render_cache.store(template_id, inputs, data, profile, scale)
+    if width:
+        data = await run_blocking(request, resize_image, data, width, profile)
+    return web.Response(body=data, content_type=encoding.mime_type(profile))
+
+
+async def metrics_text(request):
+    return web.Response(body=metrics.prometheus_text().encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def decode(request):
+    if request.content_type.startswith("multipart/"):
+        form = await request.post()
+        field = form.get("file")
+        if field is None or not hasattr(field, "file"):
+            raise web.HTTPBadRequest(text="Thiếu field 'file'")
+        data = field.file.read()
+    else:
+        data = await request.read()
+    if not data:
+        raise web.HTTPBadRequest(text="Chưa gửi ảnh")
+    try:
+        text, method = await run_blocking(request, decode_image, data)
+    except (OSError, ValueError) as e:
+        raise web.HTTPBadRequest(text=f"Ảnh không hợp lệ: {e}")
+    if not text:
+        return web.json_response({"text": None, "method": None}, status=422)
+    ok, errors = emv_tlv.validate(text)
+    result = {"text": text, "method": method, "crc_ok": verify_crc(text), "valid": ok, "errors": errors}
+    try:
+        info = extract_vietqr_info(text)
+        result["info"] = info
+        result["bank_name"] = BANK_MAP.get(info["bank_bin"], "")
+    except ValueError as e:
+        result["error"] = str(e)
+    return web.json_response(result)
+
+
+def create_app():
+    app = web.Application(client_max_size=MAX_BODY_MB * 1024 * 1024)
+    app["state"] = {"inflight": 0}
+    app.router.add_get("/health", health)
+    app.router.add_post("/payload", payload)
+    app.router.add_post("/render/{template}", render)
+    app.router.add_post("/decode", decode)
+    app.router.add_get("/metrics", metrics_text)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API render/giải mã VietQR")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args(argv)
+    qr_templates.warmup_assets(background=False)
+    web.run_app(create_app(), host=args.host, port=args.port, keepalive_timeout=KEEPALIVE_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,51 @@
 import streamlit as st
-import qrcode
-import zxingcpp
-from PIL import Image, ImageDraw, ImageFont
-import io, os, base64, cv2, numpy as np
-import requests
-from bs4 import BeautifulSoup
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import io, os, base64, tempfile
+import qr_templates
+from crc16 import verify_crc
+from vietqr import BANK_MAP, clean_amount_input, build_vietqr_payload, extract_vietqr_info
+import encoding
+import metrics
+import output_store
+import render_cache
+import render_executor
+import scheduler
+import bulk
+from qr_templates import FONT_PATH
+# decoders / batch_decode (OpenCV, zxing-cpp, pyzbar) chỉ được import khi có người tải ảnh lên
+
+
+@st.cache_resource
+def font_css():
+    # Font nhúng base64: đọc + mã hoá 1 lần cho cả process thay vì mỗi lần rerun
+    if not os.path.exists(FONT_PATH):
+        return ""
+    with open(FONT_PATH, "rb") as f:
+        font_data = base64.b64encode(f.read()).decode()
+    return f"""
+    <style>
+    @font-face {{
+        font-family: 'RobotoCustom';
+        src: url(data:font/ttf;base64,{font_data}) format('truetype');
+    }}
+    * {{ font-family: 'RobotoCustom'; }}
+    </style>
+    """
+
+
+@st.cache_resource
+def header_html():
+    with open("assets/logo_bidv.png", "rb") as f:
+        logo_data = base64.b64encode(f.read()).decode()
+    return """
+    <div style="display: flex; align-items: center;">
+        <img src="data:image/png;base64,{logo_data}" style="max-height:20px; height:20px; width:auto; margin-right:10px;">
+        <span style="font-family: Roboto, sans-serif; font-weight: bold; font-size:20px; color:#007C71;">
+            Bản Update Test
+        </span>
+    </div>
+    """.format(logo_data=logo_data)
+
 
 st.set_page_config(page_title="VietQR BIDV", page_icon="assets/bidvfa.png", layout="centered")
 st.markdown(
@@ -21,632 +62,13 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
-ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
-LOGO_PATH = os.path.join(ASSETS_DIR, "logo.png")
-FONT_PATH = os.path.join(ASSETS_DIR, "Roboto-Bold.ttf")
-FONT_LABELPATH = os.path.join(ASSETS_DIR, "RobotoCondensed-Regular.ttf")
-BG_PATHFIX = os.path.join(ASSETS_DIR, "backgroundfix.png")
-BG_PATH = os.path.join(ASSETS_DIR, "background.png")
-BG_THAI_PATH = os.path.join(ASSETS_DIR, "backgroundthantai.png")
-BG_LOA_PATH = os.path.join(ASSETS_DIR, "backgroundloa.png")
-BG_TINGBOX_PATH = os.path.join(ASSETS_DIR, "tingbox.png")
-
-# ======== QR Logic Functions ========
-def clean_amount_input(raw_input):
-    if not raw_input:
-        return ""
-    try:
-        # Xử lý định dạng: "1.000.000,50" => "1000000.50"
-        cleaned = raw_input.replace(".", "").replace(",", ".")
-        value = float(cleaned)
-        return str(int(value))  # Lấy phần nguyên
-    except ValueError:
-        return None
-        
-def format_tlv(tag, value): return f"{tag}{len(value):02d}{value}"
-def sanitize_input(text):
-    return ''.join(text.split())
-
-def crc16_ccitt(data):
-    crc = 0xFFFF
-    for b in data.encode():
-        crc ^= b << 8
-        for _ in range(8):
-            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
-            crc &= 0xFFFF
-    return f"{crc:04X}"
-
-def parse_tlv(payload):
-    i = 0
-    tlv_data = {}
-    while i + 4 <= len(payload):
-        tag = payload[i:i+2]
-        length_str = payload[i+2:i+4]
-        try:
-            length = int(length_str)
-        except ValueError:
-            raise ValueError(f"Lỗi TLV: không thể chuyển '{length_str}' thành số nguyên tại vị trí {i}")
-        
-        value_start = i + 4
-        value_end = value_start + length
-        if value_end > len(payload):
-            raise ValueError(f"Lỗi TLV: độ dài value vượt quá payload tại tag {tag}")
-        
-        value = payload[value_start:value_end]
-        tlv_data[tag] = value
-        i = value_end
-    return tlv_data
-
-
-def extract_vietqr_info(payload):
-    parsed = parse_tlv(payload)
-    info = {"account": "", "bank_bin": "", "name": "", "note": "", "amount": ""}
-    if "38" in parsed:
-        nested_38 = parse_tlv(parsed["38"])
-        if "01" in nested_38:
-            acc_info = parse_tlv(nested_38["01"])
-            info["bank_bin"] = acc_info.get("00", "")
-            info["account"] = acc_info.get("01", "")
-    if "62" in parsed:
-        add = parse_tlv(parsed["62"])
-        info["note"] = add.get("08", "")
-    if "54" in parsed:
-        info["amount"] = parsed["54"]
-    return info
-
-def decode_opencv(gray_img):
-    try:
-        detector = cv2.QRCodeDetector()
-        data, _, _ = detector.detectAndDecode(gray_img)
-        if data:
-            return data, "OpenCV"
-    except:
-        pass
-    return None, None
-
-
-import zxingcpp
-
-def decode_zxingcpp(gray_img):
-    try:
-        results = zxingcpp.read_barcodes(gray_img)
-        if results and results[0].text:
-            return results[0].text, "ZXingCPP"
-    except:
-        pass
-    return None, None
+# Nạp trước nền + logo vào cache dùng chung (tắt bằng QR_ASSET_WARMUP=0)
+if os.environ.get("QR_ASSET_WARMUP", "1") != "0":
+    qr_templates.warmup_assets()
 
-
-from pyzbar.pyzbar import decode as pyzbar_decode, ZBarSymbol
-
-def decode_pyzbar(gray_img):
-    try:
-        results = pyzbar_decode(gray_img, symbols=[ZBarSymbol.QRCODE])
-        if results:
-            return results[0].data.decode("utf-8"), "Pyzbar"
-    except:
-        pass
-    return None, None
-def decode_qr_auto(gray_img):
-    # 1) OpenCV
-    text, method = decode_opencv(gray_img)
-    if text:
-        return text, method
-
-    # 2) ZXingCPP
-    text, method = decode_zxingcpp(gray_img)
-    if text:
-        return text, method
-
-    # 3) Pyzbar
-    text, method = decode_pyzbar(gray_img)
-    if text:
-        return text, method
-
-    return None, None
-    
-def round_corners(image, radius):
-    rounded = Image.new("RGBA", image.size, (0, 0, 0, 0))
-    mask = Image.new("L", image.size, 0)
-    draw = ImageDraw.Draw(mask)
-    draw.rounded_rectangle([0, 0, image.size[0], image.size[1]], radius=radius, fill=255)
-    rounded.paste(image, (0, 0), mask=mask)
-    return rounded
-
-def build_vietqr_payload(merchant_id, bank_bin, add_info, amount=""):
-    p = format_tlv
-    payload = p("00", "01") + p("01", "12")
-    acc_info = p("00", bank_bin) + p("01", merchant_id)
-    nested_38 = p("00", "A000000727") + p("01", acc_info) + p("02", "QRIBFTTA")
-    payload += p("38", nested_38) + p("52", "0000") + p("53", "704")
-    if amount: payload += p("54", amount)
-    payload += p("58", "VN") + p("62", p("08", add_info)) + "6304"
-    return payload + crc16_ccitt(payload)
-
-def generate_qr_with_logo(data):
-    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=2)
-    qr.add_data(data); qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white").convert("RGBA")
-    logo = Image.open(LOGO_PATH).convert("RGBA").resize((int(img.width*0.15), int(img.height*0.15)))
-    img.paste(logo, ((img.width - logo.width) // 2, (img.height - logo.height) // 2), logo)
-    buf = io.BytesIO(); img.save(buf, format="PNG"); buf.seek(0)
-    return buf
-def create_qr_with_text(data, acc_name, merchant_id, border=100, usage_ratio=0.85,
-                        qr_tip_font_size=60, qr_tip_gap=100):
-    # ===== Tạo QR gốc =====
-    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=0)
-    qr.add_data(data)
-    qr.make(fit=True)
-
-    # ===== Mở nền =====
-    base = Image.open(BG_PATHFIX).convert("RGBA")
-    base_w, base_h = base.size
-
-    # ===== Thêm border =====
-    new_w, new_h = base_w + border*2, base_h + border*2
-    bordered_base = Image.new("RGBA", (new_w, new_h), (255,255,255,255))
-    bordered_base.paste(base, (border, border))
-    base = bordered_base
-    base_w, base_h = base.size
-    draw = ImageDraw.Draw(base)
-
-    # ===== Tính block width cho mỗi QR =====
-    half_w = (base_w - 2*border)//2
-    qr_target_w = int(half_w * usage_ratio)
-    qr_target_h = qr_target_w  # QR vuông
-
-    # ===== Hàm giảm font tự động =====
-    def get_font(text, max_width, base_size):
-        font_size = base_size
-        font = ImageFont.truetype(FONT_PATH, font_size)
-        text_width = draw.textbbox((0,0), text, font=font)[2]
-        while text_width > max_width and font_size > 20:
-            font_size -= 2
-            font = ImageFont.truetype(FONT_PATH, font_size)
-            text_width = draw.textbbox((0,0), text, font=font)[2]
-        return font, font_size
-
-    label_font_size = 46
-    font_label = ImageFont.truetype(FONT_LABELPATH, label_font_size)
-    font_qr_tip = ImageFont.truetype(FONT_PATH, qr_tip_font_size)
-
-    # ===== Vẽ 2 QR + text =====
-    for i in range(2):
-        # QR resize
-        qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((qr_target_w, qr_target_h))
-        # Logo resize và paste vào QR
-        logo_resized = Image.open(LOGO_PATH).convert("RGBA")
-        logo_w = int(qr_target_w * 0.2)
-        logo_h = int(logo_resized.height / logo_resized.width * logo_w)
-        logo_resized = logo_resized.resize((logo_w, logo_h))
-        qr_img.paste(logo_resized, ((qr_target_w - logo_w)//2, (qr_target_h - logo_h)//2), logo_resized)
-
-        # ===== Tính tổng chiều cao block (QR + text) =====
-        total_text_h = 0
-        if acc_name and acc_name.strip():
-            _, acc_h = get_font(acc_name.upper(), qr_target_w, 40)
-            total_text_h += label_font_size + 20 + acc_h
-        if merchant_id and merchant_id.strip():
-            _, merchant_h = get_font(merchant_id, qr_target_w, 40)
-            total_text_h += label_font_size + 20 + merchant_h
-
-        total_block_h = qr_target_h + total_text_h + qr_tip_gap  # khoảng cách tip tùy chỉnh
-
-        # ===== Căn giữa theo chiều dọc =====
-        qr_x = border + i*half_w + (half_w - qr_target_w)//2
-        qr_y = (base_h - total_block_h)//2 + qr_tip_gap
-
-        # ===== Vẽ QR =====
-        base.paste(qr_img, (qr_x, qr_y), qr_img)
-
-        # ===== Vẽ dòng Quét mã QR trên QR, căn giữa QR =====
-        qr_tip_text = "Quét mã QR để thanh toán"
-        x_tip = qr_x + (qr_target_w - draw.textbbox((0,0), qr_tip_text, font=font_qr_tip)[2]) // 2
-        y_tip = qr_y - qr_tip_gap  # khoảng cách từ QR, mặc định 100px
-        draw.text((x_tip, y_tip), qr_tip_text, fill=(0,102,102), font=font_qr_tip)
-
-        # ===== Vẽ text dưới QR với nhãn =====
-        y_offset = qr_y + qr_target_h + 20  # 20 px dưới QR
-        max_text_width = qr_target_w
-
-        if acc_name and acc_name.strip():
-            label_acc = "Tên tài khoản:"
-            x_label_acc = qr_x + (qr_target_w - draw.textbbox((0,0), label_acc, font=font_label)[2])//2
-            draw.text((x_label_acc, y_offset), label_acc, fill="black", font=font_label)
-            y_offset += label_font_size + 15
-            font_acc, acc_font_size = get_font(acc_name.upper(), max_text_width, 40)
-            x_acc = qr_x + (qr_target_w - draw.textbbox((0,0), acc_name.upper(), font=font_acc)[2])//2
-            draw.text((x_acc, y_offset), acc_name.upper(), fill=(0,102,102), font=font_acc)
-            y_offset += acc_font_size + 35
-
-        if merchant_id and merchant_id.strip():
-            label_merchant = "Số tài khoản:"
-            x_label_merchant = qr_x + (qr_target_w - draw.textbbox((0,0), label_merchant, font=font_label)[2])//2
-            draw.text((x_label_merchant, y_offset), label_merchant, fill="black", font=font_label)
-            y_offset += label_font_size + 15
-            font_merchant, merchant_font_size = get_font(merchant_id, max_text_width, 40)
-            x_merchant = qr_x + (qr_target_w - draw.textbbox((0,0), merchant_id, font=font_merchant)[2])//2
-            draw.text((x_merchant, y_offset), merchant_id, fill=(0,102,102), font=font_merchant)
-
-    # ===== Quay 90 độ sang landscape =====
-    base = base.rotate(-90, expand=True)
-
-    # ===== Lưu buffer =====
-    buf = io.BytesIO()
-    base.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-
-def create_qr_with_background(data, acc_name, merchant_id, store_name, staff_name="", staff_phone="", branch_name=""):
-    # ===== Tạo QR =====
-    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=2)
-    qr.add_data(data)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((540, 540))
-    qr_img = round_corners(qr_img, 40)
-
-    # Logo trên QR
-    logo = Image.open(LOGO_PATH).convert("RGBA").resize((100, 100))
-    qr_img.paste(logo, ((qr_img.width - logo.width)//2, (qr_img.height - logo.height)//2), logo)
-
-    # Nền
-    base = Image.open(BG_PATH).convert("RGBA")
-    base_w, base_h = base.size
-    qr_x, qr_y = 460, 936
-    base.paste(qr_img, (qr_x, qr_y), qr_img)
-
-    draw = ImageDraw.Draw(base)
-
-    # Font label
-    font_label = ImageFont.truetype(FONT_LABELPATH, 46)
-
-    # Hàm giảm font nếu chữ dài
-    def get_font(text, max_width, base_size):
-        font_size = base_size
-        font = ImageFont.truetype(FONT_PATH, font_size)
-        text_width = draw.textbbox((0,0), text, font=font)[2]
-        while text_width > max_width and font_size > 12:
-            font_size -= 1
-            font = ImageFont.truetype(FONT_PATH, font_size)
-            text_width = draw.textbbox((0,0), text, font=font)[2]
-        return font, font_size
-
-    # ===== Vẽ Tên tài khoản =====
-    max_text_width = int(base_w * 0.7)
-    y_offset = qr_y + qr_img.height + 130
-
-    if acc_name and acc_name.strip():
-        label_acc = "Tên tài khoản:"
-        x_label = (base_w - draw.textbbox((0,0), label_acc, font=font_label)[2]) // 2
-        draw.text((x_label, y_offset), label_acc, fill="black", font=font_label)
-        y_offset += 28 + 30
-
-        font_acc, acc_font_size = get_font(acc_name.upper(), max_text_width, 48)
-        x_acc = (base_w - draw.textbbox((0,0), acc_name.upper(), font=font_acc)[2]) // 2
-        draw.text((x_acc, y_offset), acc_name.upper(), fill="#007C71", font=font_acc)
-        y_offset += acc_font_size + 45
-
-    # ===== Vẽ Số tài khoản =====
-    if merchant_id and merchant_id.strip():
-        label_merchant = "Số tài khoản:"
-        x_label = (base_w - draw.textbbox((0,0), label_merchant, font=font_label)[2]) // 2
-        draw.text((x_label, y_offset), label_merchant, fill="black", font=font_label)
-        y_offset += 28 + 30
-
-        font_merchant, merchant_font_size = get_font(merchant_id, max_text_width, 46)
-        x_merchant = (base_w - draw.textbbox((0,0), merchant_id, font=font_merchant)[2]) // 2
-        draw.text((x_merchant, y_offset), merchant_id, fill="#007C71", font=font_merchant)
-        y_offset += merchant_font_size + 55
-
-    # ===== Vẽ Chi nhánh =====
-    # Chuẩn hóa branch_name: viết hoa chữ cái đầu của mỗi từ
-    def normalize_branch_name(name: str) -> str:
-        return " ".join([w.capitalize() for w in name.strip().split()]) if name else ""
-    
-    # Trong create_qr_with_background hoặc create_qr_with_background_thantai
-    if branch_name and branch_name.strip():
-        branch_name_text = "Chi nhánh " + normalize_branch_name(branch_name)
-        font_branch = ImageFont.truetype(FONT_PATH, 41)  # cỡ font tùy chỉnh
-        draw.text((471, 157), branch_name_text, fill="#3C7471", font=font_branch)
-
-    # ===== Hiển thị Staff (Cán bộ hỗ trợ) =====
-    padding_left = 70
-    padding_bottom = 60
-    if (staff_name and staff_name.strip()) or (staff_phone and staff_phone.strip()):
-        font_staff = ImageFont.truetype(FONT_LABELPATH, 34)
-        label_text = "Cán bộ hỗ trợ: "
-        contact_text = staff_name if staff_name else ""
-        label2_text = " - Liên hệ: "
-        phone_text = staff_phone if staff_phone else ""
-
-        support_x = padding_left
-        support_y = base_h - 32 - padding_bottom
-
-        draw.text((support_x, support_y), label_text, fill="#007C71", font=font_staff)
-        offset_x = support_x + draw.textbbox((0,0), label_text, font=font_staff)[2]
-
-        draw.text((offset_x, support_y), contact_text, fill=(255,0,0), font=font_staff)
-        offset_x += draw.textbbox((0,0), contact_text, font=font_staff)[2]
-
-        draw.text((offset_x, support_y), label2_text, fill="#007C71", font=font_staff)
-        offset_x += draw.textbbox((0,0), label2_text, font=font_staff)[2]
-
-        draw.text((offset_x, support_y), phone_text, fill=(255,0,0), font=font_staff)
-
-    # ===== Vẽ Store name =====
-    store_font = ImageFont.truetype(FONT_PATH, 70)
-    if store_name and store_name.strip():
-        cx = lambda t, f: (base.width - draw.textbbox((0,0), t, font=f)[2]) // 2
-        draw.text((cx(store_name.upper(), store_font), 265), store_name.upper(), fill="#007C71", font=store_font)
-
-    # Lưu buffer
-    buf = io.BytesIO()
-    base.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-def create_qr_with_background_thantai(data, acc_name, merchant_id, store_name, staff_name="", staff_phone="", branch_name=""):
-    # ===== Tạo QR =====
-    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=0)
-    qr.add_data(data)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((480, 520))
-
-    # Thêm logo lên QR
-    logo = Image.open(LOGO_PATH).convert("RGBA").resize((100, 100))
-    qr_img.paste(logo, ((qr_img.width - logo.width)//2, (qr_img.height - logo.height)//2), logo)
-
-    # Mở nền
-    base = Image.open(BG_THAI_PATH).convert("RGBA")
-    base_w, base_h = base.size
-    qr_x, qr_y = 793, 725
-    base.paste(qr_img, (qr_x, qr_y), qr_img)
-
-    draw = ImageDraw.Draw(base)
-
-    # Font label
-    font_label = ImageFont.truetype(FONT_LABELPATH, 46)
-
-    # Hàm giảm font nếu chữ dài, giới hạn max_width
-    def get_font(text, max_width, base_size):
-        font_size = base_size
-        font = ImageFont.truetype(FONT_PATH, font_size)
-        text_width = draw.textbbox((0, 0), text, font=font)[2]
-        while text_width > max_width and font_size > 12:
-            font_size -= 1
-            font = ImageFont.truetype(FONT_PATH, font_size)
-            text_width = draw.textbbox((0, 0), text, font=font)[2]
-        return font, font_size
-
-    # Tối đa 70% chiều rộng nền
-    max_text_width = int(base_w * 0.7)
-
-    # Vẽ Tên tài khoản và Số tài khoản căn giữa nền
-    y_offset = qr_y + qr_img.height + 360
-    if acc_name and acc_name.strip():
-        label_acc = "Tên tài khoản:"
-        text_width = draw.textbbox((0,0), label_acc, font=font_label)[2]
-        x_label = (base_w - text_width) // 2  # căn giữa nền
-        draw.text((x_label, y_offset), label_acc, fill="black", font=font_label)
-        y_offset += 28 + 30
-
-        font_acc, acc_font_size = get_font(acc_name.upper(), max_text_width, 48)
-        text_width = draw.textbbox((0,0), acc_name.upper(), font=font_acc)[2]
-        x_acc = (base_w - text_width) // 2  # căn giữa nền
-        draw.text((x_acc, y_offset), acc_name.upper(), fill=(0,102,102), font=font_acc)
-        y_offset += acc_font_size + 45
-
-    if merchant_id and merchant_id.strip():
-        label_merchant = "Số tài khoản:"
-        text_width = draw.textbbox((0,0), label_merchant, font=font_label)[2]
-        x_label = (base_w - text_width) // 2  # căn giữa nền
-        draw.text((x_label, y_offset), label_merchant, fill="black", font=font_label)
-        y_offset += 28 + 30
-
-        font_merchant, merchant_font_size = get_font(merchant_id, max_text_width, 46)
-        text_width = draw.textbbox((0,0), merchant_id, font=font_merchant)[2]
-        x_merchant = (base_w - text_width) // 2  # căn giữa nền
-        draw.text((x_merchant, y_offset), merchant_id, fill=(0,102,102), font=font_merchant)
-        y_offset += merchant_font_size + 35
-    # ===== Hiển thị Cán bộ hỗ trợ 1 dòng, căn trái =====
-    padding_left = 70
-    padding_bottom = 60
-
-    # ===== Vẽ Chi nhánh =====
-    # Chuẩn hóa branch_name: viết hoa chữ cái đầu của mỗi từ
-    def normalize_branch_name(name: str) -> str:
-        return " ".join([w.capitalize() for w in name.strip().split()]) if name else ""
-    
-    # Trong create_qr_with_background hoặc create_qr_with_background_thantai
-    if branch_name and branch_name.strip():
-        branch_name_text = "Chi nhánh " + normalize_branch_name(branch_name)
-        font_branch = ImageFont.truetype(FONT_PATH, 41)  # cỡ font tùy chỉnh
-        draw.text((471, 157), branch_name_text, fill="#3C7471", font=font_branch)
-
-    # ===== Hiển thị Staff (Cán bộ hỗ trợ) =====
-    padding_left = 70
-    padding_bottom = 60
-    if (staff_name and staff_name.strip()) or (staff_phone and staff_phone.strip()):
-        font_staff = ImageFont.truetype(FONT_LABELPATH, 34)
-        label_text = "Cán bộ hỗ trợ: "
-        contact_text = staff_name if staff_name else ""
-        label2_text = " - Liên hệ: "
-        phone_text = staff_phone if staff_phone else ""
-
-        support_x = padding_left
-        support_y = base_h - 32 - padding_bottom
-
-        draw.text((support_x, support_y), label_text, fill="#007C71", font=font_staff)
-        offset_x = support_x + draw.textbbox((0,0), label_text, font=font_staff)[2]
-
-        draw.text((offset_x, support_y), contact_text, fill=(255,0,0), font=font_staff)
-        offset_x += draw.textbbox((0,0), contact_text, font=font_staff)[2]
-
-        draw.text((offset_x, support_y), label2_text, fill="#007C71", font=font_staff)
-        offset_x += draw.textbbox((0,0), label2_text, font=font_staff)[2]
-
-        draw.text((offset_x, support_y), phone_text, fill=(255,0,0), font=font_staff)
-
-    # ===== Vẽ Store name =====
-    store_font = ImageFont.truetype(FONT_PATH, 70)
-    if store_name and store_name.strip():
-        cx = lambda t, f: (base.width - draw.textbbox((0,0), t, font=f)[2]) // 2
-        draw.text((cx(store_name.upper(), store_font), 265), store_name.upper(), fill="#007C71", font=store_font)
-
-    # Lưu buffer
-    buf = io.BytesIO()
-    base.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-def create_qr_with_background_loa(data, acc_name, merchant_id, store_name="",
-                                  staff_name="", staff_phone=""):
-    # ===== Tạo QR =====
-    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=0)
-    qr.add_data(data)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((560, 560))
-
-    # Thêm logo lên QR
-    logo = Image.open(LOGO_PATH).convert("RGBA").resize((100, 100))
-    qr_img.paste(
-        logo,
-        ((qr_img.width - logo.width) // 2, (qr_img.height - logo.height) // 2),
-        logo
-    )
-
-    # ===== Mở nền và paste QR =====
-    base = Image.open(BG_LOA_PATH).convert("RGBA")
-    qr_x, qr_y = 175, 285
-    base.paste(qr_img, (qr_x, qr_y), qr_img)
-
-    draw = ImageDraw.Draw(base)
-
-    # ===== Hàm tự động giảm font nếu chữ dài =====
-    def get_font(text, max_width, base_size):
-        font_size = base_size
-        font = ImageFont.truetype(FONT_PATH, font_size)
-        text_width = draw.textbbox((0, 0), text, font=font)[2]
-        while text_width > max_width and font_size > 20:
-            font_size -= 2
-            font = ImageFont.truetype(FONT_PATH, font_size)
-            text_width = draw.textbbox((0, 0), text, font=font)[2]
-        return font, font_size
-
-    # ===== Vẽ Tên tài khoản =====
-    max_text_width = qr_img.width
-    y_offset = qr_y + qr_img.height + 20
-    label_font_size = 28
-    font_label = ImageFont.truetype(FONT_LABELPATH, label_font_size)
-
-    if acc_name and acc_name.strip():
-        label_acc = "Tên tài khoản:"
-        draw.text(
-            (qr_x + (qr_img.width - draw.textbbox((0,0), label_acc, font=font_label)[2]) // 2, y_offset),
-            label_acc, fill="black", font=font_label
-        )
-        y_offset += label_font_size + 8
-
-        font_acc, acc_font_size = get_font(acc_name.upper(), max_text_width, 32)
-        x_acc = qr_x + (qr_img.width - draw.textbbox((0,0), acc_name.upper(), font=font_acc)[2]) // 2
-        draw.text((x_acc, y_offset), acc_name.upper(), fill=(0,102,102), font=font_acc)
-        y_offset += acc_font_size + 15
-
-    # ===== Vẽ Số tài khoản =====
-    if merchant_id and merchant_id.strip():
-        label_merchant = "Số tài khoản:"
-        draw.text(
-            (qr_x + (qr_img.width - draw.textbbox((0,0), label_merchant, font=font_label)[2]) // 2, y_offset),
-            label_merchant, fill="black", font=font_label
-        )
-        y_offset += label_font_size + 8
-
-        font_merchant, merchant_font_size = get_font(merchant_id, max_text_width, 32)
-        x_merchant = qr_x + (qr_img.width - draw.textbbox((0,0), merchant_id, font=font_merchant)[2]) // 2
-        draw.text((x_merchant, y_offset), merchant_id, fill=(0,102,102), font=font_merchant)
-        y_offset += merchant_font_size + 20
-
-    # ===== Vẽ thông tin cán bộ hỗ trợ (giữ nguyên tọa độ) với biến mới =====
-    staff_name_x, staff_name_y = 500, 1138
-    staff_phone_x, staff_phone_y = 570, 1175
-
-    if staff_name.strip():  # an toàn với string rỗng
-        font_staff_name = ImageFont.truetype(FONT_LABELPATH, 32)
-        draw.text((staff_name_x, staff_name_y), staff_name, fill=(0,102,102), font=font_staff_name)
-
-    if staff_phone.strip():
-        font_staff_phone = ImageFont.truetype(FONT_LABELPATH, 32)
-        draw.text((staff_phone_x, staff_phone_y), staff_phone, fill=(0,102,102), font=font_staff_phone)
-
-    # ===== Luôn return buffer =====
-    buf = io.BytesIO()
-    base.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-
-def create_qr_tingbox(data, merchant_id):
-    # Tạo QR
-    qr = qrcode.QRCode(
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=12,
-        border=0
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((460, 460))
-    # Thêm logo lên QR
-    logo = Image.open(LOGO_PATH).convert("RGBA").resize((100, 100))
-    qr_img.paste(
-        logo,
-        ((qr_img.width - logo.width) // 2, (qr_img.height - logo.height) // 2),
-        logo
-    )
-    # Mở nền ảnh có sẵn
-    base = Image.open(BG_TINGBOX_PATH).convert("RGBA")
-
-    # Paste QR vào nền, căn giữa theo X và vị trí Y tùy chỉnh
-    qr_x = 202
-    qr_y = 395  # điều chỉnh tùy ý
-    base.paste(qr_img, (qr_x, qr_y), qr_img)
-
-    draw = ImageDraw.Draw(base)
-
-    # Hàm tính font giảm nếu tên quá dài
-    def get_font(text, max_width, base_size):
-        font_size = base_size
-        font = ImageFont.truetype(FONT_PATH, font_size)
-        text_width = draw.textbbox((0,0), text, font=font)[2]
-        while text_width > max_width and font_size > 12:
-            font_size -= 1
-            font = ImageFont.truetype(FONT_PATH, font_size)
-            text_width = draw.textbbox((0,0), text, font=font)[2]
-        return font
-
-    # Vẽ merchant_id dưới QR, căn giữa
-    if merchant_id and merchant_id.strip():
-        max_text_width = qr_img.width
-        font_merchant = get_font(merchant_id, max_text_width, 32)
-        text_width = draw.textbbox((0,0), merchant_id, font=font_merchant)[2]
-        x_merchant = qr_x + (qr_img.width - text_width) // 2
-        y_merchant = qr_y + qr_img.height + 20
-        draw.text((x_merchant, y_merchant), merchant_id, fill=(0,102,102), font=font_merchant)
-
-    # Lưu buffer
-    buf = io.BytesIO()
-    base.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-    
 # ==== Giao diện người dùng ====
-if os.path.exists(FONT_PATH):
-    font_css = f"""
-    <style>
-    @font-face {{
-        font-family: 'RobotoCustom';
-        src: url(data:font/ttf;base64,{base64.b64encode(open(FONT_PATH, "rb").read()).decode()}) format('truetype');
-    }}
-    * {{ font-family: 'RobotoCustom'; }}
-    </style>
-    """
-    st.markdown(font_css, unsafe_allow_html=True)
+if font_css():
+    st.markdown(font_css(), unsafe_allow_html=True)
 
 # Tiêu đề 1: Tên ứng dụng
 st.markdown(
@@ -661,19 +83,7 @@ st.markdown(
 )
 
 # Tiêu đề 2: BIDV Thái Bình + logo
-st.markdown(
-    """
-    <div style="display: flex; align-items: center;">
-        <img src="data:image/png;base64,{logo_data}" style="max-height:20px; height:20px; width:auto; margin-right:10px;">
-        <span style="font-family: Roboto, sans-serif; font-weight: bold; font-size:20px; color:#007C71;">
-            Bản Update Test
-        </span>
-    </div>
-    """.format(
-        logo_data=base64.b64encode(open("assets/logo_bidv.png", "rb").read()).decode()
-    ),
-    unsafe_allow_html=True
-)
+st.markdown(header_html(), unsafe_allow_html=True)
 
 
 uploaded_result = st.file_uploader("📤 Tải ảnh QR VietQR", type=["png", "jpg", "jpeg"], key="uploaded_file")
@@ -681,10 +91,8 @@ if uploaded_result and uploaded_result != st.session_state.get("last_file_upload
     st.session_state["last_file_uploaded"] = uploaded_result
 
     # Đọc ảnh → convert sang grayscale để decode
-    image = Image.open(uploaded_result).convert("RGB")
-    gray_img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
-
-    qr_text, method = decode_qr_auto(gray_img)
+    from decoders import decode_image
+    qr_text, method = decode_image(uploaded_result)
 
     if qr_text:
         st.success(f"🔍 Đã giải mã bằng: **{method}**")
@@ -697,48 +105,14 @@ if uploaded_result and uploaded_result != st.session_state.get("last_file_upload
     # ======================================================
     try:
         info = extract_vietqr_info(qr_text)
+        if not verify_crc(qr_text):
+            st.warning("⚠️ Mã kiểm tra CRC (tag 63) của QR không khớp, vui lòng kiểm tra lại dữ liệu.")
 
         bank_bin = info.get("bank_bin", "")
 
-        bank_map = {
-            "970418": "BIDV",
-            "970436": "Vietcombank",
-            "970415": "VietinBank",
-            "970405": "Agribank",
-            "970422": "MB Bank",
-            "970407": "Techcombank",
-            "970423": "TPBank",
-            "970424": "Shinhan Bank",
-            "970441": "VIB",
-            "970432": "VPBank",
-            "970443": "SHB",
-            "970431": "Eximbank",
-            "970438": "BaoVietBank",
-            "970454": "VietCapitalBank",
-            "970429": "SCB",
-            "970421": "VRB",
-            "970425": "ABBank",
-            "970412": "PVcomBank",
-            "970414": "OceanBank",
-            "970428": "NamABank",
-            "970437": "HDBank",
-            "970433": "VietBank",
-            "970459": "ABBANK",
-            "970448": "OCB",
-            "970409": "BacABank",
-            "970442": "Hong Leong Bank VN",
-            "970430": "PG Bank",
-            "970446": "Co-op Bank",
-            "422589": "CIMB VN",
-            "970434": "Indovina Bank",
-            "970457": "Woori VN",
-            "970458": "UOB VN",
-            "970466": "KEB Hana HCM",
-            "970467": "KEB Hana HN",
-        }
 
         if bank_bin != "970418":
-            bank_name = bank_map.get(bank_bin, f"Mã BIN {bank_bin}")
+            bank_name = BANK_MAP.get(bank_bin, f"Mã BIN {bank_bin}")
             st.error(f"""
             ⚠️ Mã QR này thuộc ngân hàng: **{bank_name}**  
             Ứng dụng chỉ hỗ trợ QR thuộc **BIDV – BIN 970418**
@@ -792,30 +166,181 @@ if st.button("🎉 Tạo mã QR"):
         st.warning("⚠️ Vui lòng nhập số tài khoản.")
     else:
         qr_data = build_vietqr_payload(account.strip(), bank_bin.strip(), note.strip(), amount.strip())
-        st.session_state["qr1"] = generate_qr_with_logo(qr_data)
-        st.session_state["qr2"] = create_qr_with_text(qr_data, name.strip(), account.strip())
-        st.session_state["qr3"] = create_qr_with_background(qr_data, name.strip(), account.strip(), store.strip(), staff_name.strip(), staff_phone.strip(), branch_name.strip())
-        st.session_state["qr4"] = create_qr_with_background_thantai(qr_data, name.strip(), account.strip(), store.strip(), staff_name.strip(), staff_phone.strip(), branch_name.strip())
-        st.session_state["qr5"] = create_qr_with_background_loa(qr_data, name.strip(), account.strip(), store.strip(), staff_name.strip(), staff_phone.strip())
-        st.session_state["qr6"] = create_qr_tingbox(qr_data, account.strip())
+        inputs = {
+            "data": qr_data, "name": name.strip(), "account": account.strip(), "store": store.strip(),
+            "staff_name": staff_name.strip(), "staff_phone": staff_phone.strip(), "branch_name": branch_name.strip(),
+        }
+        # Chỉ lưu input; ảnh được render khi người dùng mở xem/tải mẫu
+        st.session_state["render_inputs"] = inputs
+        for tid in qr_templates.TEMPLATE_IDS:
+            st.session_state.pop(f"full_{tid}", None)
         st.success("✅ Mã QR đã được tạo thành công.")
 
 # ==== Hiển thị ảnh QR nếu có ====
-if "qr1" in st.session_state:
-    with st.expander("🏷️ Mẫu 1: QR có logo"):
-        st.image(st.session_state["qr1"], caption="Mẫu QR có logo", use_container_width=True)
-if "qr2" in st.session_state:
-    with st.expander("📄 Mẫu 2: QR có chữ"):
-        st.image(st.session_state["qr2"], caption="Mẫu QR có chữ", use_container_width=True)
-if "qr3" in st.session_state:
-    with st.expander("🐱 Mẫu 3: QR mèo thần tài"):
-        st.image(st.session_state["qr3"], caption="Mẫu QR mèo thần tài", use_container_width=True)
-if "qr4" in st.session_state:
-    with st.expander("🐯 Mẫu 4: QR thần tài"):
-        st.image(st.session_state["qr4"], caption="Mẫu QR nền thần tài", use_container_width=True)
-if "qr5" in st.session_state:
-    with st.expander("🔊 Mẫu 5: QR nền loa thanh toán"):
-        st.image(st.session_state["qr5"], caption="Mẫu QR loa thanh toán", use_container_width=True)
-if "qr6" in st.session_state:
-    with st.expander("📱 Mẫu 6: QR Tingbox"):
-        st.image(st.session_state["qr6"], caption="Mẫu QR Tingbox", use_container_width=True)
+TEMPLATE_LABELS = [
+    ("qr1", "🏷️ Mẫu 1: QR có logo", "Mẫu QR có logo"),
+    ("qr2", "📄 Mẫu 2: QR có chữ", "Mẫu QR có chữ"),
+    ("qr3", "🐱 Mẫu 3: QR mèo thần tài", "Mẫu QR mèo thần tài"),
+    ("qr4", "🐯 Mẫu 4: QR thần tài", "Mẫu QR nền thần tài"),
+    ("qr5", "🔊 Mẫu 5: QR nền loa thanh toán", "Mẫu QR loa thanh toán"),
+    ("qr6", "📱 Mẫu 6: QR Tingbox", "Mẫu QR Tingbox"),
+]
+PROFILE_LABELS = {
+    "png": "PNG (chuẩn)",
+    "png_fast": "PNG nhanh",
+    "png_palette": "PNG bảng màu (nhẹ)",
+    "webp_lossless": "WebP không mất dữ liệu",
+    "jpeg": "JPEG chất lượng cao (xem trước in)",
+}
+# Xem trước ở ~25% độ phân giải; ảnh gốc chỉ render khi bấm chuẩn bị tải (rồi được cache)
+PREVIEW_SCALE = float(os.environ.get("QR_PREVIEW_SCALE", "0.25"))
+PREVIEW_PROFILE = "png_fast"
+render_inputs = st.session_state.get("render_inputs")
+if render_inputs:
+    profile = st.selectbox("🖼️ Định dạng ảnh", list(PROFILE_LABELS), format_func=PROFILE_LABELS.get,
+                           index=list(PROFILE_LABELS).index(encoding.DEFAULT_PROFILE), key="output_profile")
+    # Mỗi mẫu chỉ render khi bật xem; kết quả lấy từ cache dùng chung nếu đã có
+    slots, wanted = {}, []
+    for tid, label, _ in TEMPLATE_LABELS:
+        slots[tid] = st.container()
+        if slots[tid].toggle(label, key=f"show_{tid}"):
+            wanted.append(tid)
+    captions = {tid: caption for tid, _, caption in TEMPLATE_LABELS}
+    # Render đi qua scheduler dùng chung: khi máy bận thì báo vị trí trong hàng chờ thay vì render cùng lúc
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else "default"
+    queue_note = st.empty()
+
+    def show_queue(position):
+        queue_note.info(f"⏳ Máy chủ đang bận, bạn đang ở vị trí {position} trong hàng chờ...")
+
+    # Session chỉ giữ input + cờ; ảnh nằm trong kho output_store dùng chung, hiển thị thẳng từ file
+    for tid, handle, err in render_cache.get_or_render_handles(wanted, render_inputs, PREVIEW_PROFILE, PREVIEW_SCALE,
+                                                               session_id, show_queue):
+        queue_note.empty()
+        if isinstance(err, scheduler.SchedulerBusy):
+            slots[tid].warning(f"⚠️ Máy chủ đang quá tải, chưa tạo được mẫu {tid}. Vui lòng thử lại sau ít phút.")
+            continue
+        if err is not None:
+            slots[tid].error(f"❌ Lỗi khi tạo mẫu {tid}: {err}")
+            continue
+        slots[tid].image(output_store.path(handle), caption=captions[tid], use_container_width=True)
+        if slots[tid].button("📥 Chuẩn bị ảnh gốc để tải", key=f"prepare_{tid}"):
+            st.session_state[f"full_{tid}"] = True
+        if st.session_state.get(f"full_{tid}"):
+            try:
+                full = render_cache.get_or_render_bytes(tid, render_inputs, profile, 1, session_id, show_queue)
+            except scheduler.SchedulerBusy:
+                slots[tid].warning("⚠️ Máy chủ đang quá tải, vui lòng bấm lại sau ít phút.")
+                continue
+            except Exception as e:
+                slots[tid].error(f"❌ Lỗi khi tạo ảnh gốc {tid}: {e}")
+                continue
+            queue_note.empty()
+            slots[tid].download_button("⬇️ Tải ảnh", data=full,
+                                       file_name=f"vietqr_{tid}.{encoding.extension(profile)}",
+                                       mime=encoding.mime_type(profile), key=f"download_{tid}")
+
+# ==== Tạo hàng loạt từ CSV ====
+with st.expander("📦 Tạo hàng loạt từ file CSV"):
+    st.caption("Cột: account, name, store, staff_name, staff_phone, branch_name, amount (note, bank_bin tuỳ chọn)")
+    bulk_csv = st.file_uploader("📄 File CSV cửa hàng", type=["csv"], key="bulk_csv")
+    bulk_templates = st.multiselect("Mẫu cần tạo", [tid for tid, _, _ in TEMPLATE_LABELS],
+                                    default=["qr3", "qr6"], format_func={i: l for i, l, _ in TEMPLATE_LABELS}.get,
+                                    key="bulk_templates")
+    if bulk_csv and bulk_templates and st.button("🚀 Tạo ZIP", key="bulk_run"):
+        progress = st.empty()
+        zip_file = tempfile.TemporaryFile()
+        stats = bulk.run_bulk(bulk.read_rows(io.TextIOWrapper(bulk_csv, encoding="utf-8-sig", newline="")),
+                              zip_file, bulk_templates, processes=render_executor.EXECUTOR_KIND == "process",
+                              on_progress=lambda rows, images, errors: progress.text(
+                                  f"Đã xử lý {rows} dòng, {images} ảnh, {errors} lỗi"))
+        progress.success(f"✅ {stats['images']} ảnh trong {stats['seconds']:.1f}s "
+                         f"({stats['images_per_sec']:.1f} ảnh/s), {stats['errors']} lỗi")
+        if stats["errors"]:
+            st.warning("⚠️ Một số dòng bị lỗi, xem chi tiết trong errors.csv trong file ZIP.")
+        zip_file.seek(0)
+        st.download_button("⬇️ Tải file ZIP", data=zip_file, file_name="vietqr_posters.zip",
+                           mime="application/zip", key="bulk_download")
+
+    # Dàn trang in: PDF vector, nhiều cửa hàng trên 1 tờ A4/A3 (reportlab chỉ nạp khi bấm tạo)
+    labels = {i: l for i, l, _ in TEMPLATE_LABELS}
+    print_cols = st.columns(2)
+    print_tid = print_cols[0].selectbox("🖨️ Mẫu in PDF", ["qr6", "qr1", "qr3", "qr4", "qr5"],
+                                        format_func=labels.get, key="print_template")
+    print_page = print_cols[1].selectbox("Khổ giấy", ["A4", "A3"], key="print_page")
+    if bulk_csv and st.button("🖨️ Tạo PDF in", key="print_run"):
+        import vector_output
+        bulk_csv.seek(0)
+        pdf_file = tempfile.TemporaryFile()
+        rows = bulk.read_rows(io.TextIOWrapper(bulk_csv, encoding="utf-8-sig", newline=""))
+        stats = vector_output.impose_pdf(vector_output.csv_items(rows), pdf_file, print_tid, print_page)
+        st.success(f"✅ {stats['items']} ô trên {stats['pages']} trang ({stats['per_page']} ô/trang) "
+                   f"trong {stats['seconds']:.1f}s, {stats['errors']} lỗi")
+        pdf_file.seek(0)
+        st.download_button("⬇️ Tải PDF", data=pdf_file, file_name=f"vietqr_in_{print_tid}_{print_page}.pdf",
+                           mime="application/pdf", key="print_download")
+
+# ==== Giải mã hàng loạt ====
+with st.expander("🔍 Giải mã hàng loạt ảnh QR"):
+    st.caption("Nhiều ảnh, file ZIP, TIFF hoặc PDF nhiều trang; đọc mọi mã QR trong từng ảnh")
+    batch_files = st.file_uploader("📤 Ảnh / ZIP / TIFF / PDF", accept_multiple_files=True, key="batch_files",
+                                   type=["png", "jpg", "jpeg", "webp", "tif", "tiff", "zip", "pdf"])
+    table = st.empty()
+    if batch_files and st.button("🔎 Giải mã", key="batch_run"):
+        # Kết quả hiện dần lên bảng khi từng ảnh giải mã xong
+        import batch_decode
+        rows, images = [], 0
+        tasks = batch_decode.iter_tasks([(f.name, f.getvalue()) for f in batch_files])
+        for result in batch_decode.decode_batch(tasks, processes=render_executor.EXECUTOR_KIND == "process"):
+            rows.extend(result)
+            images += 1
+            if images % 8 == 1:
+                table.dataframe(rows, use_container_width=True)
+        st.session_state["batch_rows"] = rows
+    batch_rows = st.session_state.get("batch_rows")
+    if batch_rows:
+        import batch_decode
+        table.dataframe(batch_rows, use_container_width=True)
+        ok = sum(r["status"] == "OK" for r in batch_rows)
+        st.caption(f"{ok}/{len(batch_rows)} mã QR hợp lệ")
+        st.download_button("⬇️ Tải kết quả CSV", data=batch_decode.rows_to_csv(batch_rows),
+                           file_name="vietqr_decoded.csv", mime="text/csv", key="batch_download")
+
+# ==== Bảng số liệu hiệu năng (tuỳ chọn, bật bằng QR_METRICS_PANEL=1) ====
+@st.cache_resource
+def metrics_endpoint(port):
+    # Endpoint /metrics cục bộ cho tiến trình Streamlit, mở 1 lần
+    return metrics.serve(port)
+
+
+if os.environ.get("QR_METRICS_PORT"):
+    metrics.enable()
+    metrics_endpoint(int(os.environ["QR_METRICS_PORT"]))
+
+if os.environ.get("QR_METRICS_PANEL") == "1":
+    with st.sidebar:
+        st.subheader("⏱️ Hiệu năng")
+        if st.toggle("Ghi số liệu", value=metrics.is_enabled(), key="metrics_on"):
+            metrics.enable()
+        else:
+            metrics.enable(False)
+        rows = [{"chỉ số": r["name"].removeprefix("qr_").removesuffix("_seconds"),
+                 "nhãn": ", ".join(f"{k}={v}" for k, v in r["labels"].items()), "lần": r["count"],
+                 "tb ms": round(r["avg_ms"], 2), "p95 ms ≤": r["p95_ms"]} for r in metrics.snapshot()]
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+        else:
+            st.caption("Chưa có số liệu")
+        if st.button("Xoá số liệu", key="metrics_reset"):
+            metrics.reset()
+        st.caption(f"Cache render: {render_cache.cache_stats()}")
+        st.caption(f"Hàng chờ render: {scheduler.scheduler_stats()}")
+        # cProfile 1 lần render ảnh gốc (không qua cache) ngay trong lượt chạy này
+        if render_inputs:
+            cprofile_tid = st.selectbox("Mẫu đo cProfile", qr_templates.TEMPLATE_IDS, index=2,
+                                        key="metrics_cprofile_tid")
+            if st.button("🔬 cProfile 1 lần render", key="metrics_cprofile"):
+                _, stats_text = metrics.profile_call(qr_templates.render_template, cprofile_tid, render_inputs,
+                                                     profile, limit=25)
+                st.code(stats_text)
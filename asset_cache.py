@@ -0,0 +1,197 @@
+import os, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from PIL import Image
+import metrics
+
+# ======== Bộ nhớ đệm ảnh đã giải mã (dùng chung cho cả tiến trình) ========
+# Mỗi ảnh nền / logo chỉ được giải mã 1 lần, các lần sau trả về bản copy.
+# Giới hạn theo dung lượng RGBA đã giải mã, vượt quá thì bỏ ảnh ít dùng nhất (LRU). Cùng 1 giới hạn này
+# còn tính cả lớp dựng sẵn (get_layer) và canvas của render tăng dần (put_item/take_item: layouts, dynamic_qr).
+# Mặc định 128 MB, ngân sách 512 MB cho cả tiến trình:
+#   ~100 MB  Python + Streamlit + numpy/OpenCV/zxing (đo ~80 MB sau import, chưa render; cộng phần session)
+#    128 MB  cache này (nền + lớp dựng sẵn của 6 mẫu ở 2 tỉ lệ ~100 MB, phần còn lại cho canvas)
+#    192 MB  job đang render (QR_SCHED_MEM_MB; canvas đang được vẽ đã lấy ra khỏi cache nên tính ở đây)
+#     64 MB  mmap của output_store (QR_OUTPUT_STORE_MEM_MB)
+#   = 484 MB, còn ~28 MB cho phân mảnh heap. Tăng cái nào thì giảm cái khác cho tổng vẫn <= 512 MB.
+# Ảnh được giải mã ngoài lock: nhiều thread cần cùng 1 ảnh thì chờ chung 1 lần nạp, ảnh khác không phải chờ.
+MAX_CACHE_BYTES = int(os.environ.get("QR_ASSET_CACHE_MB", "128")) * 1024 * 1024
+
+
+def _image_nbytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+class AssetCache:
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._loading = {}  # key -> Future của lần nạp đang chạy
+        self._lock = threading.Lock()
+
+    def _get_or_load(self, key, loader):
+        with self._lock:
+            img = self._items.get(key)
+            if img is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return img
+            pending = self._loading.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._loading[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return pending.result()  # lỗi của lần nạp cũng được raise lại ở đây
+        try:
+            img = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._store(key, img, _image_nbytes(img))
+        pending.set_result(img)
+        return img
+
+    def _store(self, key, value, nbytes):
+        # Gọi khi đang giữ lock. Bỏ mục cũ nhất, luôn giữ lại mục vừa thêm
+        self._items[key] = value
+        self._sizes[key] = nbytes
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            old, _ = self._items.popitem(last=False)
+            self._bytes -= self._sizes.pop(old)
+
+    def take(self, key):
+        # Lấy hẳn mục ra khỏi cache (không ai khác thấy nữa cho tới khi put lại)
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._bytes -= self._sizes.pop(key)
+            return value
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                del self._items[key]
+                self._bytes -= self._sizes.pop(key)
+            self._store(key, value, nbytes)
+
+    def image(self, path, mode="RGBA"):
+        # Ảnh dùng chung: KHÔNG được vẽ/paste trực tiếp lên ảnh này
+        def load():
+            with metrics.span("qr_asset_load_seconds", asset=os.path.basename(path)), Image.open(path) as im:
+                return im.convert(mode)
+        return self._get_or_load((path, mode, None), load)
+
+    def resized(self, path, size, mode="RGBA"):
+        size = (int(size[0]), int(size[1]))
+        return self._get_or_load((path, mode, size),
+                                 lambda: self.image(path, mode).resize(size))
+
+    def clear(self, kind=None):
+        # kind: chỉ xoá các mục có key[0] == kind (vd "canvas")
+        with self._lock:
+            for key in [k for k in self._items if kind is None or k[0] == kind]:
+                del self._items[key]
+                self._bytes -= self._sizes.pop(key)
+
+    def usage(self, kind):
+        # (số mục, số byte) của các mục có key[0] == kind
+        with self._lock:
+            keys = [k for k in self._items if k[0] == kind]
+            return len(keys), sum(self._sizes[k] for k in keys)
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_cache = AssetCache()
+
+
+def get_image(path, mode="RGBA", copy=True):
+    # Mặc định trả về bản copy để vẽ lên; copy=False chỉ dùng khi đọc (paste làm nguồn/mask)
+    img = _cache.image(path, mode)
+    return img.copy() if copy else img
+
+
+def get_scaled(path, scale, mode="RGBA", copy=True):
+    # Nền thu nhỏ theo tỉ lệ (bản xem trước), được cache như ảnh gốc
+    if scale == 1:
+        return get_image(path, mode, copy)
+    src = _cache.image(path, mode)
+    img = _cache.resized(path, (max(1, round(src.width * scale)), max(1, round(src.height * scale))), mode)
+    return img.copy() if copy else img
+
+
+def get_resized(path, size, mode="RGBA"):
+    # Biến thể đã resize (vd logo 100x100, 15%/20% chiều rộng QR) - chỉ dùng để đọc
+    return _cache.resized(path, size, mode)
+
+
+def get_layer(key, build):
+    # Lớp ảnh dựng sẵn (vd nền đã vẽ phần tĩnh của poster), tính vào cùng giới hạn bộ nhớ - chỉ dùng để đọc
+    def timed_build():
+        with metrics.span("qr_asset_load_seconds", asset=f"layer:{key[0]}"):
+            return build()
+    return _cache._get_or_load(("layer",) + tuple(key), timed_build)
+
+
+def take_item(key):
+    # Mục đã put_item (vd canvas để vẽ tiếp) hoặc None nếu chưa có / đã bị bỏ do hết chỗ
+    return _cache.take(key)
+
+
+def put_item(key, value, nbytes):
+    # Trả mục về cache, tính nbytes vào cùng giới hạn với ảnh; lớn hơn cả giới hạn thì bỏ luôn
+    _cache.put(key, value, nbytes)
+
+
+def item_usage(kind):
+    return _cache.usage(kind)
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def clear_cache(kind=None):
+    _cache.clear(kind)
+
+
+_warmed = set()
+
+
+def warmup(paths, background=True):
+    # Nạp trước ảnh khi khởi động; gọi nhiều lần (mỗi lần Streamlit rerun) cũng không tốn gì
+    pending = [p for p in paths if p not in _warmed and os.path.exists(p)]
+    if not pending:
+        return None
+    _warmed.update(pending)
+
+    def run():
+        for p in pending:
+            try:
+                _cache.image(p)
+            except Exception:
+                _warmed.discard(p)
+
+    if not background:
+        run()
+        return None
+    t = threading.Thread(target=run, name="asset-warmup", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,157 @@
+import argparse, csv, io, os, sys, time, zipfile, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from PIL import Image
+import preprocess
+from crc16 import verify_crc
+from decoders import decode_all
+from vietqr import BANK_MAP, extract_vietqr_info
+
+# ======== Giải mã hàng loạt: nhiều ảnh / ZIP / TIFF, PDF nhiều trang -> bảng kết quả ========
+# Mỗi ảnh (mỗi trang) là một job chạy trong process pool, đọc MỌI mã QR có trong ảnh.
+# PDF đọc bằng pypdfium2 (nạp khi gặp file PDF đầu tiên).
+# Chạy: python batch_decode.py anh1.jpg stickers.zip scan.pdf -o ket_qua.csv
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+COLUMNS = ["source", "page", "qr", "status", "method", "bank_bin", "bank_name", "account", "amount", "note",
+           "payload"]
+
+
+def _page_count(name, data):
+    if name.lower().endswith(".pdf"):
+        try:
+            import pypdfium2
+        except ImportError:
+            raise ValueError("Cần cài pypdfium2 để đọc file PDF")
+        return len(pypdfium2.PdfDocument(data))
+    with Image.open(io.BytesIO(data)) as im:
+        return getattr(im, "n_frames", 1)
+
+
+def iter_tasks(files):
+    # files: list (tên file, bytes) -> job (tên, bytes, trang); ZIP được bung ra theo từng ảnh bên trong
+    for name, data in files:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                inner = [(f"{name}/{i.filename}", zf.read(i)) for i in zf.infolist()
+                         if not i.is_dir() and i.filename.lower().endswith(IMAGE_EXTS + (".pdf",))]
+            yield from iter_tasks(inner)
+            continue
+        try:
+            pages = _page_count(name, data)
+        except Exception as e:
+            yield name, None, f"{type(e).__name__}: {e}"
+            continue
+        for page in range(pages):
+            yield name, data, page
+
+
+def _load_page(name, data, page):
+    if name.lower().endswith(".pdf"):
+        import pypdfium2
+        pdf_page = pypdfium2.PdfDocument(data)[page]
+        width, height = pdf_page.get_size()
+        scale = min(4.0, preprocess.MAX_SIDE / max(width, height))
+        return np.asarray(pdf_page.render(scale=scale, grayscale=True).to_pil().convert("L"))
+    return preprocess.load_gray(data, frame=page)
+
+
+def _row(name, page, index, status, text="", method=""):
+    return {"source": name, "page": page + 1, "qr": index, "status": status, "method": method, "bank_bin": "",
+            "bank_name": "", "account": "", "amount": "", "note": "", "payload": text}
+
+
+def decode_task(name, data, page):
+    # Chạy trong worker: trả về list dòng kết quả (mỗi mã QR một dòng)
+    if data is None:
+        return [_row(name, 0, 0, f"Lỗi: {page}")]
+    try:
+        gray = _load_page(name, data, page)
+        found = []
+        for level in preprocess.pyramid(gray):
+            found = decode_all(level)
+            if found:
+                break
+        if not found:
+            found = decode_all(preprocess.threshold(gray))
+    except Exception as e:
+        return [_row(name, page, 0, f"Lỗi: {type(e).__name__}: {e}")]
+    if not found:
+        return [_row(name, page, 0, "Không tìm thấy QR")]
+
+    rows = []
+    for index, (text, method) in enumerate(found, start=1):
+        row = _row(name, page, index, "OK", text, method)
+        try:
+            info = extract_vietqr_info(text)
+            row.update({k: info[k] for k in ("bank_bin", "account", "amount", "note")})
+            row["bank_name"] = BANK_MAP.get(info["bank_bin"], "")
+            if not info["account"]:
+                row["status"] = "Không phải VietQR"
+            elif not verify_crc(text):
+                row["status"] = "Sai CRC"
+        except ValueError:
+            row["status"] = "Không phải VietQR"
+        rows.append(row)
+    return rows
+
+
+def decode_batch(tasks, workers=None, processes=True):
+    # Trả về dần từng list dòng kết quả khi job xong; số job đang chờ bị giới hạn
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr-batch-decode")
+    with executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(decode_task, *task))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+
+def rows_to_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8-sig")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Giải mã hàng loạt ảnh QR VietQR (ảnh, ZIP, TIFF, PDF) ra CSV")
+    parser.add_argument("files", nargs="+", help="ảnh, file ZIP, TIFF nhiều trang hoặc PDF")
+    parser.add_argument("-o", "--output", default="vietqr_decoded.csv", help="file CSV đầu ra")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="số worker (mặc định: số CPU)")
+    parser.add_argument("--threads", action="store_true", help="dùng thread thay vì process")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    started = time.perf_counter()
+    rows, images = [], 0
+    for result in decode_batch(iter_tasks(files), args.workers, processes=not args.threads):
+        rows.extend(result)
+        images += 1
+        print(f"\r{images} ảnh, {len(rows)} dòng", end="", file=sys.stderr, flush=True)
+    seconds = time.perf_counter() - started
+    with open(args.output, "wb") as f:
+        f.write(rows_to_csv(rows))
+    ok = sum(r["status"] == "OK" for r in rows)
+    print(file=sys.stderr)
+    print(f"{images} ảnh trong {seconds:.1f}s = {images / seconds if seconds else 0:.1f} ảnh/s; "
+          f"{ok}/{len(rows)} QR hợp lệ -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import io, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+import encoding
+import qr_templates
+from vietqr import build_vietqr_payload
+
+# ======== Thời gian mã hoá + dung lượng theo từng hồ sơ, cho từng mẫu ========
+# Chạy: python benchmarks/bench_encode.py [số lần lặp]
+INPUTS = {
+    "data": build_vietqr_payload("12345678901", "970418", "THANH TOAN", "50000"),
+    "name": "NGUYEN VAN AN", "account": "12345678901", "store": "TAP HOA MINH ANH",
+    "staff_name": "Tran Binh", "staff_phone": "0912345678", "branch_name": "thai binh",
+}
+
+
+def composed_image(template_id):
+    # Ảnh RGBA đúng như lúc template gọi encoding.encode (PNG là không mất dữ liệu)
+    return Image.open(qr_templates.render_template(template_id, INPUTS, "png")).convert("RGBA")
+
+
+def main(n=3):
+    try:
+        import zxingcpp
+    except ImportError:
+        zxingcpp = None
+    print(f"{'mẫu':<5} {'hồ sơ':<14} {'ms':>8} {'KB':>9} {'quét':>5}")
+    for tid in qr_templates.TEMPLATE_IDS:
+        img = composed_image(tid)
+        for profile in encoding.PROFILES:
+            encoding.encode(img, profile)
+            t = time.perf_counter()
+            for _ in range(n):
+                data = encoding.encode(img, profile).getvalue()
+            ms = (time.perf_counter() - t) / n * 1000
+            scan = ""
+            if zxingcpp is not None:
+                scan = "ok" if zxingcpp.read_barcodes(Image.open(io.BytesIO(data))) else "LỖI"
+            print(f"{tid:<5} {profile:<14} {ms:>8.1f} {len(data) / 1024:>9.1f} {scan:>5}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
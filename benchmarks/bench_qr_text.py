@@ -0,0 +1,262 @@
+import os, resource, subprocess, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+import asset_cache
+import encoding
+import qr_matrix
+import qr_templates
+import text_fit
+from vietqr import build_vietqr_payload
+
+# ======== qr2 (create_qr_with_text): bản gốc trước mọi tối ưu, bản chỉ còn bước quay, bản vẽ thẳng khổ dọc ========
+# Chạy: python benchmarks/bench_qr_text.py [số lần lặp]
+#   baseline: code gốc của app.py trước loạt thay đổi (qrcode + make_image, mở nền/logo/font mỗi lần, quay cả ảnh)
+#   rotate  : đã dùng asset_cache, raster NumPy, fit_font - chỉ còn khác bản mới ở bước vẽ khổ ngang rồi quay,
+#             nên rotate so với new là tác dụng riêng của việc bỏ bước quay
+#   new     : qr_templates.create_qr_with_text hiện tại
+# Mỗi bản chạy trong 1 process riêng để đo bộ nhớ đỉnh (ru_maxrss) của lần render đầu tiên
+# sau khi nền đã được giải mã (cache MB: phần trong đó là nền dựng sẵn được giữ lại trong asset_cache);
+# thời gian là trung bình các lần sau (không tính mã hoá PNG).
+DATA = build_vietqr_payload("12345678901", "970418", "THANH TOAN", "50000")
+NAME, ACCOUNT = "NGUYEN VAN AN PHUONG THAO", "12345678901"
+LOGO_PATH = qr_templates.LOGO_PATH
+FONT_PATH = qr_templates.FONT_PATH
+FONT_LABELPATH = qr_templates.FONT_LABELPATH
+BG_PATHFIX = qr_templates.BG_PATHFIX
+
+
+# ===== Bản gốc, chép nguyên từ app.py trước loạt tối ưu =====
+def baseline_create_qr_with_text(data, acc_name, merchant_id, border=100, usage_ratio=0.85,
+                                 qr_tip_font_size=60, qr_tip_gap=100):
+    # ===== Tạo QR gốc =====
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    # ===== Mở nền =====
+    base = Image.open(BG_PATHFIX).convert("RGBA")
+    base_w, base_h = base.size
+
+    # ===== Thêm border =====
+    new_w, new_h = base_w + border*2, base_h + border*2
+    bordered_base = Image.new("RGBA", (new_w, new_h), (255,255,255,255))
+    bordered_base.paste(base, (border, border))
+    base = bordered_base
+    base_w, base_h = base.size
+    draw = ImageDraw.Draw(base)
+
+    # ===== Tính block width cho mỗi QR =====
+    half_w = (base_w - 2*border)//2
+    qr_target_w = int(half_w * usage_ratio)
+    qr_target_h = qr_target_w  # QR vuông
+
+    # ===== Hàm giảm font tự động =====
+    def get_font(text, max_width, base_size):
+        font_size = base_size
+        font = ImageFont.truetype(FONT_PATH, font_size)
+        text_width = draw.textbbox((0,0), text, font=font)[2]
+        while text_width > max_width and font_size > 20:
+            font_size -= 2
+            font = ImageFont.truetype(FONT_PATH, font_size)
+            text_width = draw.textbbox((0,0), text, font=font)[2]
+        return font, font_size
+
+    label_font_size = 46
+    font_label = ImageFont.truetype(FONT_LABELPATH, label_font_size)
+    font_qr_tip = ImageFont.truetype(FONT_PATH, qr_tip_font_size)
+
+    # ===== Vẽ 2 QR + text =====
+    for i in range(2):
+        # QR resize
+        qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((qr_target_w, qr_target_h))
+        # Logo resize và paste vào QR
+        logo_resized = Image.open(LOGO_PATH).convert("RGBA")
+        logo_w = int(qr_target_w * 0.2)
+        logo_h = int(logo_resized.height / logo_resized.width * logo_w)
+        logo_resized = logo_resized.resize((logo_w, logo_h))
+        qr_img.paste(logo_resized, ((qr_target_w - logo_w)//2, (qr_target_h - logo_h)//2), logo_resized)
+
+        # ===== Tính tổng chiều cao block (QR + text) =====
+        total_text_h = 0
+        if acc_name and acc_name.strip():
+            _, acc_h = get_font(acc_name.upper(), qr_target_w, 40)
+            total_text_h += label_font_size + 20 + acc_h
+        if merchant_id and merchant_id.strip():
+            _, merchant_h = get_font(merchant_id, qr_target_w, 40)
+            total_text_h += label_font_size + 20 + merchant_h
+
+        total_block_h = qr_target_h + total_text_h + qr_tip_gap  # khoảng cách tip tùy chỉnh
+
+        # ===== Căn giữa theo chiều dọc =====
+        qr_x = border + i*half_w + (half_w - qr_target_w)//2
+        qr_y = (base_h - total_block_h)//2 + qr_tip_gap
+
+        # ===== Vẽ QR =====
+        base.paste(qr_img, (qr_x, qr_y), qr_img)
+
+        # ===== Vẽ dòng Quét mã QR trên QR, căn giữa QR =====
+        qr_tip_text = "Quét mã QR để thanh toán"
+        x_tip = qr_x + (qr_target_w - draw.textbbox((0,0), qr_tip_text, font=font_qr_tip)[2]) // 2
+        y_tip = qr_y - qr_tip_gap  # khoảng cách từ QR, mặc định 100px
+        draw.text((x_tip, y_tip), qr_tip_text, fill=(0,102,102), font=font_qr_tip)
+
+        # ===== Vẽ text dưới QR với nhãn =====
+        y_offset = qr_y + qr_target_h + 20  # 20 px dưới QR
+        max_text_width = qr_target_w
+
+        if acc_name and acc_name.strip():
+            label_acc = "Tên tài khoản:"
+            x_label_acc = qr_x + (qr_target_w - draw.textbbox((0,0), label_acc, font=font_label)[2])//2
+            draw.text((x_label_acc, y_offset), label_acc, fill="black", font=font_label)
+            y_offset += label_font_size + 15
+            font_acc, acc_font_size = get_font(acc_name.upper(), max_text_width, 40)
+            x_acc = qr_x + (qr_target_w - draw.textbbox((0,0), acc_name.upper(), font=font_acc)[2])//2
+            draw.text((x_acc, y_offset), acc_name.upper(), fill=(0,102,102), font=font_acc)
+            y_offset += acc_font_size + 35
+
+        if merchant_id and merchant_id.strip():
+            label_merchant = "Số tài khoản:"
+            x_label_merchant = qr_x + (qr_target_w - draw.textbbox((0,0), label_merchant, font=font_label)[2])//2
+            draw.text((x_label_merchant, y_offset), label_merchant, fill="black", font=font_label)
+            y_offset += label_font_size + 15
+            font_merchant, merchant_font_size = get_font(merchant_id, max_text_width, 40)
+            x_merchant = qr_x + (qr_target_w - draw.textbbox((0,0), merchant_id, font=font_merchant)[2])//2
+            draw.text((x_merchant, y_offset), merchant_id, fill=(0,102,102), font=font_merchant)
+
+    # ===== Quay 90 độ sang landscape =====
+    base = base.rotate(-90, expand=True)
+    return base  # bản gốc lưu PNG ở đây; bỏ qua để cùng điều kiện với các bản khác (không tính mã hoá)
+
+
+
+# ===== Bản chỉ còn bước quay (các phần khác đã tối ưu) =====
+
+
+def rotate_create_qr_with_text(data, acc_name, merchant_id, border=100, usage_ratio=0.85,
+                        qr_tip_font_size=60, qr_tip_gap=100, profile=None, scale=1):
+    S = qr_templates._scaler(scale)
+    border, qr_tip_font_size, qr_tip_gap = S(border), S(qr_tip_font_size), S(qr_tip_gap)
+    # ===== Tạo QR gốc =====
+    matrix = qr_matrix.get_matrix(data)
+
+    # ===== Mở nền =====
+    base = asset_cache.get_scaled(qr_templates.BG_PATHFIX, scale, copy=False)
+    base_w, base_h = base.size
+
+    # ===== Thêm border =====
+    new_w, new_h = base_w + border*2, base_h + border*2
+    bordered_base = Image.new("RGBA", (new_w, new_h), (255,255,255,255))
+    bordered_base.paste(base, (border, border))
+    base = bordered_base
+    base_w, base_h = base.size
+    draw = ImageDraw.Draw(base)
+
+    # ===== Tính block width cho mỗi QR =====
+    half_w = (base_w - 2*border)//2
+    qr_target_w = int(half_w * usage_ratio)
+    qr_target_h = qr_target_w  # QR vuông
+
+    label_font_size = S(46)
+    font_label = text_fit.get_font(qr_templates.FONT_LABELPATH, label_font_size)
+    font_qr_tip = text_fit.get_font(qr_templates.FONT_PATH, qr_tip_font_size)
+
+    # ===== QR resize + logo (dựng 1 lần, dán cho cả 2 khối) =====
+    qr_img = qr_matrix.rasterize_image(matrix, qr_target_w, qr_target_h)
+    logo_src = asset_cache.get_image(qr_templates.LOGO_PATH, copy=False)
+    logo_w = int(qr_target_w * 0.2)
+    logo_h = int(logo_src.height / logo_src.width * logo_w)
+    logo_resized = asset_cache.get_resized(qr_templates.LOGO_PATH, (logo_w, logo_h))
+    qr_img.paste(logo_resized, ((qr_target_w - logo_w)//2, (qr_target_h - logo_h)//2), logo_resized)
+
+    # ===== Vẽ 2 QR + text =====
+    for i in range(2):
+        # ===== Tính tổng chiều cao block (QR + text) =====
+        total_text_h = 0
+        if acc_name and acc_name.strip():
+            _, acc_h = text_fit.fit_font(qr_templates.FONT_PATH, acc_name.upper(), qr_target_w, S(40), S(20), S(2))
+            total_text_h += label_font_size + S(20) + acc_h
+        if merchant_id and merchant_id.strip():
+            _, merchant_h = text_fit.fit_font(qr_templates.FONT_PATH, merchant_id, qr_target_w, S(40), S(20), S(2))
+            total_text_h += label_font_size + S(20) + merchant_h
+
+        total_block_h = qr_target_h + total_text_h + qr_tip_gap  # khoảng cách tip tùy chỉnh
+
+        # ===== Căn giữa theo chiều dọc =====
+        qr_x = border + i*half_w + (half_w - qr_target_w)//2
+        qr_y = (base_h - total_block_h)//2 + qr_tip_gap
+
+        # ===== Vẽ QR =====
+        base.paste(qr_img, (qr_x, qr_y), qr_img)
+
+        # ===== Vẽ dòng Quét mã QR trên QR, căn giữa QR =====
+        qr_tip_text = "Quét mã QR để thanh toán"
+        x_tip = qr_x + (qr_target_w - text_fit.text_width(font_qr_tip, qr_tip_text)) // 2
+        y_tip = qr_y - qr_tip_gap  # khoảng cách từ QR, mặc định 100px
+        draw.text((x_tip, y_tip), qr_tip_text, fill=(0,102,102), font=font_qr_tip)
+
+        # ===== Vẽ text dưới QR với nhãn =====
+        y_offset = qr_y + qr_target_h + S(20)  # 20 px dưới QR
+        max_text_width = qr_target_w
+
+        if acc_name and acc_name.strip():
+            label_acc = "Tên tài khoản:"
+            x_label_acc = qr_x + (qr_target_w - text_fit.text_width(font_label, label_acc))//2
+            draw.text((x_label_acc, y_offset), label_acc, fill="black", font=font_label)
+            y_offset += label_font_size + S(15)
+            font_acc, acc_font_size = text_fit.fit_font(qr_templates.FONT_PATH, acc_name.upper(), max_text_width, S(40), S(20), S(2))
+            x_acc = qr_x + (qr_target_w - text_fit.text_width(font_acc, acc_name.upper()))//2
+            draw.text((x_acc, y_offset), acc_name.upper(), fill=(0,102,102), font=font_acc)
+            y_offset += acc_font_size + S(35)
+
+        if merchant_id and merchant_id.strip():
+            label_merchant = "Số tài khoản:"
+            x_label_merchant = qr_x + (qr_target_w - text_fit.text_width(font_label, label_merchant))//2
+            draw.text((x_label_merchant, y_offset), label_merchant, fill="black", font=font_label)
+            y_offset += label_font_size + S(15)
+            font_merchant, merchant_font_size = text_fit.fit_font(qr_templates.FONT_PATH, merchant_id, max_text_width, S(40), S(20), S(2))
+            x_merchant = qr_x + (qr_target_w - text_fit.text_width(font_merchant, merchant_id))//2
+            draw.text((x_merchant, y_offset), merchant_id, fill=(0,102,102), font=font_merchant)
+
+    # ===== Quay 90 độ sang landscape =====
+    base = base.rotate(-90, expand=True)
+
+    # ===== Mã hoá ảnh theo hồ sơ =====
+    return encoding.encode(base, profile)
+
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_one(variant, n):
+    fn = {"baseline": baseline_create_qr_with_text, "rotate": rotate_create_qr_with_text,
+          "new": qr_templates.create_qr_with_text}[variant]
+    encoding.encode = lambda img, profile=None: img  # chỉ đo phần dựng ảnh
+    asset_cache.get_image(qr_templates.BG_PATHFIX, copy=False)
+    asset_cache.get_image(qr_templates.LOGO_PATH, copy=False)
+    rss0, cached0 = _max_rss_mb(), asset_cache.cache_stats()["bytes"]
+    t = time.perf_counter()
+    img = fn(DATA, NAME, ACCOUNT)
+    first_ms = (time.perf_counter() - t) * 1000
+    peak = _max_rss_mb() - rss0
+    cached = (asset_cache.cache_stats()["bytes"] - cached0) / 1024 / 1024
+    t = time.perf_counter()
+    for _ in range(n):
+        fn(DATA, NAME, ACCOUNT)
+    ms = (time.perf_counter() - t) / n * 1000
+    print(f"{variant:<8} {first_ms:>9.1f} {ms:>9.1f} {peak:>10.1f} {cached:>10.1f}  {img.size}")
+
+
+def main(n=10):
+    print(f"{'bản':<8} {'lần đầu':>9} {'ms/lần':>9} {'+RSS MB':>10} {'cache MB':>10}  kích thước")
+    for variant in ("baseline", "rotate", "new"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--one", variant, str(n)], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--one":
+        run_one(sys.argv[2], int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,47 @@
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import qrcode
+import qr_matrix
+
+# ======== So sánh: make_image + resize (cách cũ) vs rasterize NumPy ========
+# Chạy: python benchmarks/bench_raster.py [số lần lặp]
+PAYLOAD = ("00020101021238570010A000000727012700069704180113123456789010208QRIBFTTA"
+           "53037045405500005802VN62130809THANHTOAN6304")
+TARGETS = [(540, 540, 2, 10), (480, 520, 0, 10), (560, 560, 0, 10), (460, 460, 0, 12), (1000, 1000, 0, 10)]
+
+
+def legacy(width, height, border, box_size):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=box_size, border=border)
+    qr.add_data(PAYLOAD)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((width, height))
+
+
+def legacy_raster_only(qr, width, height):
+    return qr.make_image(fill_color="black", back_color="white").convert("RGBA").resize((width, height))
+
+
+def timeit(fn, n):
+    fn()
+    t = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t) / n * 1000
+
+
+def main(n=20):
+    matrix = qr_matrix.get_matrix(PAYLOAD)
+    print(f"modules={matrix.shape[0]}  lặp={n}")
+    print(f"{'kích thước':>12} {'cũ (encode+raster)':>20} {'cũ (raster)':>12} {'rasterize':>10} {'nhanh hơn':>10}")
+    for w, h, border, box in TARGETS:
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=box, border=border)
+        qr.add_data(PAYLOAD)
+        qr.make(fit=True)
+        t_full = timeit(lambda: legacy(w, h, border, box), max(1, n // 4))
+        t_old = timeit(lambda: legacy_raster_only(qr, w, h), n)
+        t_new = timeit(lambda: qr_matrix.rasterize_image(matrix, w, h, border=border), n)
+        print(f"{w}x{h:<8} {t_full:>17.2f}ms {t_old:>10.2f}ms {t_new:>8.2f}ms {t_old / t_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
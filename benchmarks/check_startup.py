@@ -0,0 +1,74 @@
+import json, os, subprocess, sys
+
+# ======== Ngân sách khởi động / rerun của giao diện Streamlit ========
+# Chạy: python benchmarks/check_startup.py [--json]
+# Đo trong process riêng (lạnh):
+#   import_ms : thời gian import các module của app (không tính bản thân streamlit)
+#   first_ms  : lần chạy app.py đầu tiên (AppTest, chưa tải ảnh)
+#   rerun_ms  : trung vị các lần rerun sau đó
+#   heavy     : thư viện nặng đã bị import dù chưa có ai tải ảnh (phải rỗng)
+# Vượt ngân sách -> in ra và trả mã lỗi 1. Ngân sách chỉnh bằng biến môi trường QR_BUDGET_<TÊN>_MS.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGETS = {
+    "import_ms": float(os.environ.get("QR_BUDGET_IMPORT_MS", "400")),
+    "first_ms": float(os.environ.get("QR_BUDGET_FIRST_MS", "1200")),
+    "rerun_ms": float(os.environ.get("QR_BUDGET_RERUN_MS", "120")),
+}
+HEAVY_MODULES = ("cv2", "zxingcpp", "pyzbar", "requests", "bs4")
+RERUNS = 10
+
+_PROBE = r"""
+import json, os, statistics, sys, time
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+import logging; logging.disable(logging.CRITICAL)
+import streamlit
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+t = time.perf_counter()
+import qr_templates, vietqr, encoding, render_cache, render_executor, bulk, crc16
+import_ms = (time.perf_counter() - t) * 1000
+at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+t = time.perf_counter()
+at.run()
+first_ms = (time.perf_counter() - t) * 1000
+times = []
+for _ in range(RERUNS):
+    t = time.perf_counter()
+    at.run()
+    times.append((time.perf_counter() - t) * 1000)
+print(json.dumps({"import_ms": import_ms, "first_ms": first_ms, "rerun_ms": statistics.median(times),
+                  "heavy": [m for m in HEAVY_MODULES if m in sys.modules],
+                  "errors": [str(e.value) for e in at.exception]}))
+"""
+
+
+def measure():
+    code = f"ROOT = {ROOT!r}\nRERUNS = {RERUNS}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n" + _PROBE
+    env = dict(os.environ, QR_ASSET_WARMUP="0")  # không tính luồng nạp ảnh nền chạy song song
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    result = measure()
+    if "--json" in argv:
+        print(json.dumps(result, indent=2))
+    failures = [f"{name}: {result[name]:.0f} ms > {budget:.0f} ms" for name, budget in BUDGETS.items()
+                if result[name] > budget]
+    if result["heavy"]:
+        failures.append(f"import sớm thư viện nặng: {', '.join(result['heavy'])}")
+    if result["errors"]:
+        failures.append(f"app.py lỗi: {result['errors']}")
+    for name, budget in BUDGETS.items():
+        print(f"{name:<10} {result[name]:>8.1f} ms  (ngân sách {budget:.0f})")
+    if failures:
+        print("VƯỢT NGÂN SÁCH:\n  " + "\n  ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
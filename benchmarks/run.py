@@ -0,0 +1,478 @@
+import argparse, io, json, os, platform, random, statistics, sys, time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import numpy as np
+from PIL import Image, ImageFilter
+import crc16
+import dynamic_qr
+import emv_tlv
+import encoding
+import layouts
+import qr_matrix
+import qr_templates
+import text_fit
+import vietqr
+from vietqr import build_vietqr_payload
+
+# ======== Bộ benchmark + kiểm tra đúng (chạy offline, dữ liệu cửa hàng giả lập) ========
+# Chạy: python benchmarks/run.py [--quick] [--only stages,crc,decode,golden,roundtrip,incremental,dynamic]
+#                                [--json out.json] [--baseline base.json] [--threshold 0.25]
+#                                [--save-baseline base.json] [--update-golden]
+# Đo:
+#   stages    : từng mẫu, tách thời gian dựng QR / ghép ảnh / chữ / mã hoá (ms mỗi lần render)
+#   crc       : thông lượng crc16_ccitt, crc16_batch, parse_tlv, emv_tlv.validate (payload/s)
+#   decode    : độ trễ từng backend + decode_image trên bộ ảnh sinh ra và làm xấu (mờ, nhiễu, JPEG, xoay...)
+# Kiểm tra:
+#   golden    : ảnh 25% của từng mẫu so với benchmarks/golden/<mẫu>.png (cho lệch nhỏ do bản FreeType)
+#   roundtrip : ảnh gốc của từng mẫu giải mã lại phải ra đúng payload
+#   incremental: đổi 1 trường rồi render lại (mẫu layout spec): ms vẽ lại (không tính mã hoá) + ms cả lần render,
+#               ảnh phải giống hệt render từ đầu
+#   dynamic   : QR động theo số tiền (DynamicQRSession, mẫu qr6) - số tiền/s trên 1 core cho payload, ảnh chưa
+#               mã hoá và từng hồ sơ mã hoá, so với đường cũ build_vietqr_payload + render_template;
+#               payload phải giống build_vietqr_payload và ảnh giải mã lại đúng
+# Kết quả in dạng bảng, --json ghi file JSON. Có --baseline thì so từng chỉ số, chậm hơn quá ngưỡng
+# hoặc kiểm tra sai -> mã lỗi 1.
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+GOLDEN_SCALE = 0.25
+# Lệch cho phép khi so ảnh golden: tỉ lệ điểm ảnh khác nhau / độ lệch trung bình (0-255)
+GOLDEN_MAX_CHANGED = 0.01
+GOLDEN_MAX_MEAN_DIFF = 0.5
+SECTIONS = ("stages", "crc", "decode", "golden", "roundtrip", "incremental", "dynamic")
+DYNAMIC_PROFILES = ("jpeg", "png_fast", "png")
+STAGES = ("qr", "compose", "text", "encode")
+
+SURNAMES = ("NGUYEN", "TRAN", "LE", "PHAM", "HOANG", "VU", "DANG", "BUI", "DO", "NGO")
+MIDDLES = ("VAN", "THI", "DUC", "MINH", "NGOC", "HUU", "THANH")
+GIVEN = ("AN", "BINH", "CUONG", "DUNG", "HA", "HUNG", "LAN", "LONG", "MAI", "NAM", "PHUONG", "TUAN")
+STORES = ("TAP HOA", "CAFE", "BUN BO", "PHO", "SHOP", "NHA THUOC", "TIEM BANH", "VAN PHONG PHAM")
+BRANCHES = ("thai binh", "ha noi", "Chi nhánh Hải Phòng", "bac ninh", "Sở giao dịch 1")
+
+
+def merchants(n, seed=20):
+    # Dữ liệu cửa hàng giả lập, cố định theo seed (mỗi lần chạy giống nhau)
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        account = "".join(rnd.choice("0123456789") for _ in range(rnd.choice((10, 11, 13))))
+        amount = rnd.choice(("", "10000", "50000", "125000", "2000000"))
+        name = " ".join((rnd.choice(SURNAMES), rnd.choice(MIDDLES), rnd.choice(GIVEN)))
+        out.append({
+            "data": build_vietqr_payload(account, "970418", rnd.choice(("", "THANH TOAN", "CK DON HANG")), amount),
+            "name": name, "account": account,
+            "store": f"{rnd.choice(STORES)} {rnd.choice(GIVEN)} {rnd.choice(GIVEN)}",
+            "staff_name": rnd.choice(("", f"{rnd.choice(SURNAMES).title()} {rnd.choice(GIVEN).title()}")),
+            "staff_phone": "09" + "".join(rnd.choice("0123456789") for _ in range(8)),
+            "branch_name": rnd.choice(BRANCHES),
+        })
+    return out
+
+
+def fixed_inputs():
+    # Đầu vào cố định cho ảnh golden / round-trip (đủ mọi trường, có dấu tiếng Việt)
+    return {
+        "data": build_vietqr_payload("12345678901", "970418", "THANH TOAN", "50000"),
+        "name": "NGUYỄN VĂN AN", "account": "12345678901", "store": "TẠP HOÁ MINH ANH",
+        "staff_name": "Trần Bình", "staff_phone": "0912345678", "branch_name": "thai binh",
+    }
+
+
+def _median_ms(fn, n):
+    fn()
+    times = []
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return statistics.median(times) * 1000
+
+
+# ===== Tách giai đoạn render: bọc các hàm của từng giai đoạn, chỉ tính lớp ngoài cùng =====
+class _StageTimer:
+    def __init__(self):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self._active = False
+        self._patched = []
+
+    def wrap(self, owner, name, stage):
+        fn = owner[name] if isinstance(owner, dict) else getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            if self._active:  # lồng trong giai đoạn khác (vd fit_font trong drawer) thì tính cho lớp ngoài
+                return fn(*args, **kwargs)
+            self._active = True
+            t = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - t
+                self._active = False
+
+        self._patched.append((owner, name, fn))
+        if isinstance(owner, dict):
+            owner[name] = timed
+        else:
+            setattr(owner, name, timed)
+
+    def __enter__(self):
+        self.wrap(qr_matrix, "get_matrix", "qr")
+        self.wrap(qr_matrix, "rasterize_image", "qr")
+        self.wrap(qr_templates, "_text_block", "text")
+        self.wrap(text_fit, "fit_font", "text")
+        for kind in layouts.DRAWERS:
+            self.wrap(layouts.DRAWERS, kind, "text")
+        self.wrap(encoding, "encode", "encode")
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, fn in reversed(self._patched):
+            if isinstance(owner, dict):
+                owner[name] = fn
+            else:
+                setattr(owner, name, fn)
+
+
+def bench_stages(n, profile=None):
+    # ms mỗi lần render (trung bình n cửa hàng khác nhau, đã qua 1 lần làm nóng cache nền/font)
+    rows = merchants(n)
+    results = {}
+    for tid in qr_templates.TEMPLATE_IDS:
+        qr_templates.render_template(tid, fixed_inputs(), profile)
+        qr_matrix.clear_cache()  # mỗi cửa hàng phải dựng ma trận QR thật
+        with _StageTimer() as timer:
+            t = time.perf_counter()
+            for inputs in rows:
+                layouts.clear_canvas_cache()  # vẽ từ đầu, không dùng ảnh của cửa hàng trước
+                qr_templates.render_template(tid, inputs, profile)
+            total = time.perf_counter() - t
+        stages = {k: v / n * 1000 for k, v in timer.totals.items()}
+        stages["compose"] = max(0.0, total / n * 1000 - sum(stages.values()))
+        stages["total"] = total / n * 1000
+        results[tid] = stages
+    return results
+
+
+def bench_crc(n):
+    # payload/s cho CRC (từng cái + theo lô) và phân tích TLV
+    payloads = [m["data"] for m in merchants(n, seed=7)]
+    bodies = [p[:-4] for p in payloads]
+    out = {}
+
+    def rate(fn):
+        fn()
+        t = time.perf_counter()
+        fn()
+        return len(payloads) / (time.perf_counter() - t)
+
+    out["crc16_ccitt"] = rate(lambda: [crc16.crc16_ccitt(b) for b in bodies])
+    out["crc16_batch"] = rate(lambda: crc16.crc16_batch(bodies))
+    out["parse_tlv"] = rate(lambda: [vietqr.parse_tlv(p) for p in payloads])
+    out["extract_vietqr_info"] = rate(lambda: [vietqr.extract_vietqr_info(p) for p in payloads])
+    out["emv_validate"] = rate(lambda: [emv_tlv.validate(p) for p in payloads])
+    out["emv_validate_many"] = rate(lambda: emv_tlv.validate_many(payloads))
+    return out
+
+
+# ===== Bộ ảnh giải mã: QR sạch, poster và các kiểu làm xấu thường gặp khi chụp =====
+def _on_canvas(img, size=900, offset=(120, 160)):
+    canvas = Image.new("RGB", (size, size), (236, 233, 226))
+    canvas.paste(img.convert("RGB"), offset)
+    return canvas
+
+
+def _perspective(img):
+    import cv2
+    arr = np.asarray(img)
+    h, w = arr.shape[:2]
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    dst = np.float32([[w * 0.08, h * 0.05], [w * 0.95, 0], [w * 0.9, h * 0.97], [w * 0.02, h * 0.9]])
+    warped = cv2.warpPerspective(arr, cv2.getPerspectiveTransform(src, dst), (w, h), borderValue=(236, 233, 226))
+    return Image.fromarray(warped)
+
+
+def _jpeg(img, quality):
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG", quality=quality)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+def decode_corpus():
+    # -> list (tên, ảnh RGB, payload mong đợi)
+    rnd = np.random.default_rng(3)
+    inputs = fixed_inputs()
+    expected = inputs["data"]
+    qr = Image.open(qr_templates.render_template("qr1", inputs, "png", 0.5))
+    clean = _on_canvas(qr)
+    noisy = np.asarray(clean, dtype=np.float32) + rnd.normal(0, 28, (900, 900, 3))
+    dim = np.asarray(clean, dtype=np.float32) * 0.35 + 95
+    corpus = [
+        ("clean", clean),
+        ("blur", clean.filter(ImageFilter.GaussianBlur(2.5))),
+        ("jpeg_q15", _jpeg(clean, 15)),
+        ("noise", Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))),
+        ("low_contrast", Image.fromarray(dim.astype(np.uint8))),
+        ("rotate_17", clean.rotate(17, expand=True, fillcolor=(236, 233, 226))),
+        ("perspective", _perspective(clean)),
+        ("small", clean.resize((240, 240), Image.BILINEAR)),
+    ]
+    for tid in ("qr2", "qr3", "qr6"):
+        corpus.append((f"poster_{tid}", _jpeg(Image.open(qr_templates.render_template(tid, inputs, "png", 0.5)), 80)))
+    return [(name, img, expected) for name, img in corpus]
+
+
+def bench_decode(n):
+    # ms trung vị mỗi backend trên từng ảnh (đọc thẳng ảnh xám) + decode_image (cả pipeline tiền xử lý)
+    import decoders
+    results = {}
+    for name, img, expected in decode_corpus():
+        gray = np.asarray(img.convert("L"))
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        data = buf.getvalue()
+        row = {}
+        for backend, read in decoders.BACKENDS.items():
+            def once(read=read):
+                try:
+                    return read(gray)
+                except Exception:
+                    return None
+            row[backend] = {"ms": _median_ms(once, n), "ok": once() == expected}
+        decoders.engine.reset_stats()
+        row["decode_image"] = {"ms": _median_ms(lambda: decoders.decode_image(data), n),
+                               "ok": decoders.decode_image(data)[0] == expected}
+        results[name] = row
+    return results
+
+
+# ===== Ảnh golden =====
+def _golden_path(tid):
+    return os.path.join(GOLDEN_DIR, f"{tid}.png")
+
+
+def check_golden(update=False):
+    # -> {mẫu: {"ok", "changed", "mean_diff"}}; update=True ghi lại ảnh golden từ code hiện tại
+    results = {}
+    inputs = fixed_inputs()
+    for tid in qr_templates.TEMPLATE_IDS:
+        img = Image.open(qr_templates.render_template(tid, inputs, "png", GOLDEN_SCALE)).convert("RGBA")
+        path = _golden_path(tid)
+        if update:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            img.save(path, "PNG", optimize=True)
+        if not os.path.exists(path):
+            results[tid] = {"ok": False, "error": "chưa có ảnh golden (chạy --update-golden)"}
+            continue
+        ref = Image.open(path).convert("RGBA")
+        if ref.size != img.size:
+            results[tid] = {"ok": False, "error": f"kích thước {img.size} khác golden {ref.size}"}
+            continue
+        diff = np.abs(np.asarray(img, dtype=np.int16) - np.asarray(ref, dtype=np.int16))
+        changed = float((diff.max(axis=2) > 0).mean())
+        mean_diff = float(diff.mean())
+        results[tid] = {"ok": changed <= GOLDEN_MAX_CHANGED and mean_diff <= GOLDEN_MAX_MEAN_DIFF,
+                        "changed": changed, "mean_diff": mean_diff}
+    return results
+
+
+def check_roundtrip():
+    # Ảnh gốc (PNG và JPEG) của từng mẫu phải giải mã lại đúng payload
+    import decoders
+    results = {}
+    for inputs in [fixed_inputs()] + merchants(2, seed=11):
+        for tid in qr_templates.TEMPLATE_IDS:
+            for profile in ("png", "jpeg"):
+                data = qr_templates.render_template(tid, inputs, profile).getvalue()
+                text, method = decoders.decode_image(data)
+                key = f"{tid}/{profile}/{inputs['account']}"
+                results[key] = {"ok": text == inputs["data"], "method": method}
+    return results
+
+
+def check_incremental(n, profile="png"):
+    # -> {"mẫu/trường": {"ok", "ms", "total_ms"}}: lần lượt đổi 1 trường qua n giá trị, các trường khác giữ nguyên
+    results = {}
+    values = merchants(n, seed=5)
+    for tid in qr_templates.LAYOUTS:
+        for field in qr_templates.TEMPLATE_FIELDS[tid]:
+            inputs = fixed_inputs()
+            qr_templates.render_template(tid, inputs, profile)
+            with _StageTimer() as timer:
+                t = time.perf_counter()
+                for row in values:
+                    inputs[field] = row[field]
+                    qr_templates.render_template(tid, inputs, profile)
+                total = time.perf_counter() - t
+            # Đúng: mỗi bước, ảnh vẽ lại phải giống hệt ảnh vẽ từ đầu
+            inputs = fixed_inputs()
+            qr_templates.render_template(tid, inputs, profile)
+            ok = True
+            for row in values:
+                inputs[field] = row[field]
+                img = Image.open(qr_templates.render_template(tid, inputs, profile)).tobytes()
+                layouts.clear_canvas_cache()
+                ok = ok and img == Image.open(qr_templates.render_template(tid, inputs, profile)).tobytes()
+            results[f"{tid}/{field}"] = {"ok": ok, "ms": (total - timer.totals["encode"]) / n * 1000,
+                                         "total_ms": total / n * 1000}
+    return results
+
+
+def bench_dynamic(n, scale=1):
+    # -> {"rates": {tên: số tiền/s}, "ok": bool}; chạy trong 1 thread nên là thông lượng trên 1 core
+    import decoders
+    account, add_info = "12345678901", "THANH TOAN"
+    session = dynamic_qr.DynamicQRSession(account, add_info=add_info, scale=scale)
+    amounts = [10000 + 500 * i for i in range(n)]
+
+    def rate(fn, amounts):
+        t = time.perf_counter()
+        for amount in amounts:
+            fn(amount)
+        return len(amounts) / (time.perf_counter() - t)
+
+    rates = {"payload": rate(session.payload, amounts * 50), "image": rate(session.image, amounts)}
+    for profile in DYNAMIC_PROFILES:
+        rates[profile] = rate(lambda a: session.render(a, profile), amounts)
+    rates["full_pipeline"] = rate(lambda a: qr_templates.render_template(
+        "qr6", {"data": build_vietqr_payload(account, "970418", add_info, str(a)), "account": account}, "png",
+        scale), amounts[:max(2, n // 4)])
+    ok = all(session.payload(a) == build_vietqr_payload(account, "970418", add_info, str(a)) for a in amounts)
+    for amount in amounts[:2]:
+        ok = ok and decoders.decode_image(session.render(amount, "png").getvalue())[0] == session.payload(amount)
+    return {"rates": rates, "ok": ok}
+
+
+# ===== Chỉ số phẳng + so baseline =====
+def flatten(report):
+    # -> {tên chỉ số: (giá trị, "lower"/"higher" là tốt hơn)}
+    metrics = {}
+    for tid, stages in report.get("stages", {}).items():
+        for stage, ms in stages.items():
+            metrics[f"stages.{tid}.{stage}_ms"] = (ms, "lower")
+    for name, rate in report.get("crc", {}).items():
+        metrics[f"crc.{name}_per_s"] = (rate, "higher")
+    for image, row in report.get("decode", {}).items():
+        for backend, r in row.items():
+            if r["ok"]:
+                metrics[f"decode.{image}.{backend}_ms"] = (r["ms"], "lower")
+    for key, r in report.get("incremental", {}).items():
+        metrics[f"incremental.{key}_ms"] = (r["ms"], "lower")
+    for name, rate in report.get("dynamic", {}).get("rates", {}).items():
+        metrics[f"dynamic.{name}_per_s"] = (rate, "higher")
+    return metrics
+
+
+def compare(report, baseline, threshold):
+    # -> list dòng hồi quy; chỉ số quá nhỏ (< 0.5 ms) bỏ qua vì dao động đo lớn hơn bản thân nó
+    current, base = flatten(report), flatten(baseline)
+    regressions = []
+    for name, (value, better) in sorted(current.items()):
+        if name not in base:
+            continue
+        ref = base[name][0]
+        if better == "lower" and max(value, ref) < 0.5:
+            continue
+        change = (value - ref) / ref if ref else 0.0
+        if (better == "lower" and change > threshold) or (better == "higher" and -change > threshold):
+            regressions.append(f"{name}: {ref:.3g} -> {value:.3g} ({change:+.0%})")
+    # Ảnh từng giải mã được ở baseline mà giờ không được nữa cũng là hồi quy
+    for image, row in baseline.get("decode", {}).items():
+        for backend, r in row.items():
+            now = report.get("decode", {}).get(image, {}).get(backend)
+            if r["ok"] and now is not None and not now["ok"]:
+                regressions.append(f"decode.{image}.{backend}: không còn giải mã được")
+    return regressions
+
+
+def failed_checks(report):
+    failed = [f"{section}.{key}" for section in ("golden", "roundtrip", "incremental")
+              for key, r in report.get(section, {}).items() if not r["ok"]]
+    if not report.get("dynamic", {}).get("ok", True):
+        failed.append("dynamic")
+    return failed
+
+
+def print_report(report):
+    if "stages" in report:
+        print(f"{'mẫu':<5}" + "".join(f"{s:>10}" for s in STAGES + ("total",)) + "   (ms/render)")
+        for tid, stages in report["stages"].items():
+            print(f"{tid:<5}" + "".join(f"{stages[s]:>10.1f}" for s in STAGES + ("total",)))
+    if "crc" in report:
+        print()
+        for name, rate in report["crc"].items():
+            print(f"{name:<22} {rate:>12,.0f} payload/s")
+    if "decode" in report:
+        backends = list(next(iter(report["decode"].values())))
+        print("\n" + f"{'ảnh':<20}" + "".join(f"{b:>16}" for b in backends) + "   (ms, x = không đọc được)")
+        for image, row in report["decode"].items():
+            print(f"{image:<20}" + "".join(f"{row[b]['ms']:>15.1f}{' ' if row[b]['ok'] else 'x'}" for b in backends))
+    if "incremental" in report:
+        print("\n" + f"{'mẫu/trường đổi':<20}{'vẽ lại':>10}{'cả render':>12}   (ms)")
+        for key, r in report["incremental"].items():
+            print(f"{key:<20}{r['ms']:>10.1f}{r['total_ms']:>12.1f}" + ("" if r["ok"] else "  khác ảnh vẽ từ đầu"))
+    if "dynamic" in report:
+        print("\n" + f"{'QR động (qr6)':<20}{'số tiền/s':>12}{'ms':>10}   (1 core)")
+        for name, rate in report["dynamic"]["rates"].items():
+            print(f"{name:<20}{rate:>12,.0f}{1000 / rate:>10.2f}")
+        if not report["dynamic"]["ok"]:
+            print("  sai: payload khác build_vietqr_payload hoặc ảnh không giải mã lại đúng")
+    for section in ("golden", "roundtrip"):
+        if section in report:
+            bad = [k for k, r in report[section].items() if not r["ok"]]
+            print(f"\n{section}: {len(report[section]) - len(bad)}/{len(report[section])} đạt"
+                  + (f", lỗi: {', '.join(bad)}" if bad else ""))
+            for k in bad:
+                print(f"  {k}: {report[section][k]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark render/mã hoá/giải mã + kiểm tra ảnh golden")
+    parser.add_argument("--only", default=",".join(SECTIONS), help="các phần cần chạy, cách nhau dấu phẩy")
+    parser.add_argument("--quick", action="store_true", help="ít lần lặp (kiểm tra nhanh)")
+    parser.add_argument("--json", help="ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", help="file JSON kết quả cũ để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.25, help="mức chậm hơn cho phép so với baseline")
+    parser.add_argument("--save-baseline", help="ghi kết quả lần này làm baseline")
+    parser.add_argument("--update-golden", action="store_true", help="ghi lại ảnh golden từ code hiện tại")
+    args = parser.parse_args(argv)
+    sections = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"phần không hợp lệ: {', '.join(sorted(unknown))}")
+    n = 3 if args.quick else 15
+
+    report = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                       "cpus": os.cpu_count(), "quick": args.quick, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}}
+    if "stages" in sections:
+        report["stages"] = bench_stages(n)
+    if "crc" in sections:
+        report["crc"] = bench_crc(500 if args.quick else 5000)
+    if "decode" in sections:
+        report["decode"] = bench_decode(n)
+    if "golden" in sections or args.update_golden:
+        report["golden"] = check_golden(update=args.update_golden)
+    if "roundtrip" in sections:
+        report["roundtrip"] = check_roundtrip()
+    if "incremental" in sections:
+        report["incremental"] = check_incremental(n)
+    if "dynamic" in sections:
+        report["dynamic"] = bench_dynamic(20 if args.quick else 200)
+    print_report(report)
+
+    problems = failed_checks(report)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+        print(f"\nSo với {args.baseline} (ngưỡng {args.threshold:.0%}): "
+              + ("không có hồi quy" if not regressions else f"{len(regressions)} hồi quy"))
+        for line in regressions:
+            print(f"  {line}")
+        problems += regressions
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=1)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
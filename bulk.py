@@ -0,0 +1,142 @@
+import argparse, csv, io, os, re, sys, time, zipfile, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import encoding
+import qr_templates
+from vietqr import build_vietqr_payload, clean_amount_input, sanitize_input
+
+# ======== Tạo poster hàng loạt: CSV -> ZIP ========
+# Cột CSV: account, name, store, staff_name, staff_phone, branch_name, amount, note (tuỳ chọn), bank_bin (tuỳ chọn)
+# Chạy: python bulk.py merchants.csv -o posters.zip -t qr3,qr6
+DEFAULT_BANK_BIN = "970418"
+
+
+def read_rows(file):
+    # file: đường dẫn hoặc file text đã mở; bỏ BOM của Excel, tên cột không phân biệt hoa thường
+    if isinstance(file, str):
+        with open(file, newline="", encoding="utf-8-sig") as f:
+            yield from read_rows(f)
+        return
+    for row in csv.DictReader(file):
+        yield {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+
+
+def row_inputs(row):
+    account = sanitize_input(row.get("account", ""))
+    if not account:
+        raise ValueError("Thiếu số tài khoản")
+    amount = clean_amount_input(row.get("amount", ""))
+    if amount is None:
+        raise ValueError(f"Số tiền không hợp lệ: {row.get('amount')}")
+    bank_bin = sanitize_input(row.get("bank_bin", "")) or DEFAULT_BANK_BIN
+    data = build_vietqr_payload(account, bank_bin, row.get("note", ""), amount)
+    return {
+        "data": data, "name": row.get("name", ""), "account": account, "store": row.get("store", ""),
+        "staff_name": row.get("staff_name", ""), "staff_phone": row.get("staff_phone", ""),
+        "branch_name": row.get("branch_name", ""),
+    }
+
+
+def render_row(index, inputs, template_ids, profile=None):
+    # Chạy trong worker: trả về list (template_id, ảnh đã mã hoá hoặc None, lỗi hoặc None)
+    out = []
+    for tid in template_ids:
+        try:
+            out.append((tid, qr_templates.render_template(tid, inputs, profile).getvalue(), None))
+        except Exception as e:
+            out.append((tid, None, f"{type(e).__name__}: {e}"))
+    return index, out
+
+
+def _file_name(index, inputs, tid, profile=None):
+    account = re.sub(r"[^0-9A-Za-z_-]", "", inputs["account"]) or "row"
+    return f"{index:05d}_{account}_{tid}.{encoding.extension(profile)}"
+
+
+def run_bulk(rows, output, template_ids=qr_templates.TEMPLATE_IDS, workers=None, processes=True,
+             on_progress=None, profile=None):
+    # output: đường dẫn hoặc file nhị phân; ảnh được ghi vào ZIP ngay khi xong,
+    # số job đang chạy bị giới hạn nên bộ nhớ không tăng theo số dòng CSV
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr-bulk")
+    pending = {}
+    errors = []
+    stats = {"rows": 0, "images": 0, "errors": 0, "bytes": 0}
+    started = time.perf_counter()
+
+    def collect(done, zf):
+        for fut in done:
+            index, results = fut.result()
+            inputs = pending.pop(fut)
+            for tid, png, err in results:
+                if err is not None:
+                    errors.append((index, inputs["account"], tid, err))
+                    continue
+                zf.writestr(_file_name(index, inputs, tid, profile), png)
+                stats["images"] += 1
+                stats["bytes"] += len(png)
+            if on_progress:
+                on_progress(stats["rows"] - len(pending), stats["images"], len(errors))
+
+    with executor, zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as zf:
+        for index, row in enumerate(rows, start=1):
+            stats["rows"] += 1
+            try:
+                inputs = row_inputs(row)
+            except Exception as e:
+                errors.append((index, row.get("account", ""), "", str(e)))
+                continue
+            pending[executor.submit(render_row, index, inputs, tuple(template_ids), profile)] = inputs
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done, zf)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done, zf)
+        if errors:
+            report = io.StringIO()
+            writer = csv.writer(report)
+            writer.writerow(["row", "account", "template", "error"])
+            writer.writerows(sorted(errors))
+            zf.writestr("errors.csv", report.getvalue().encode("utf-8-sig"))
+
+    stats["errors"] = len(errors)
+    stats["seconds"] = time.perf_counter() - started
+    stats["images_per_sec"] = stats["images"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["error_rows"] = sorted(errors)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo poster VietQR hàng loạt từ file CSV, xuất ra ZIP")
+    parser.add_argument("csv", help="file CSV (account,name,store,staff_name,staff_phone,branch_name,amount[,note,bank_bin])")
+    parser.add_argument("-o", "--output", default="vietqr_posters.zip", help="file ZIP đầu ra")
+    parser.add_argument("-t", "--templates", default=",".join(qr_templates.TEMPLATE_IDS),
+                        help="các mẫu cần tạo, vd qr3,qr6 (mặc định: tất cả)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="số worker (mặc định: số CPU)")
+    parser.add_argument("-p", "--profile", default=None, choices=list(encoding.PROFILES),
+                        help=f"hồ sơ mã hoá ảnh (mặc định: {encoding.DEFAULT_PROFILE})")
+    parser.add_argument("--threads", action="store_true", help="dùng thread thay vì process")
+    args = parser.parse_args(argv)
+
+    template_ids = [t.strip() for t in args.templates.split(",") if t.strip()]
+    unknown = [t for t in template_ids if t not in qr_templates.TEMPLATES]
+    if unknown:
+        parser.error(f"mẫu không tồn tại: {', '.join(unknown)}")
+
+    def progress(rows_done, images, errors):
+        print(f"\r{rows_done} dòng, {images} ảnh, {errors} lỗi", end="", file=sys.stderr, flush=True)
+
+    stats = run_bulk(read_rows(args.csv), args.output, template_ids, args.workers,
+                     processes=not args.threads, on_progress=progress, profile=args.profile)
+    print(file=sys.stderr)
+    print(f"{stats['rows']} dòng -> {stats['images']} ảnh ({stats['bytes'] / 1e6:.1f} MB) trong "
+          f"{stats['seconds']:.1f}s = {stats['images_per_sec']:.1f} ảnh/s; {stats['errors']} lỗi -> {args.output}")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import numpy as np
+
+# ======== CRC16-CCITT (poly 0x1021, init 0xFFFF) theo bảng 256 phần tử ========
+# Cho kết quả giống hệt bản tính từng bit cũ, dùng cho tag 63 của VietQR/EMVCo.
+CRC_INIT = 0xFFFF
+CRC_TAG = "6304"
+
+
+def _make_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _make_table()
+_TABLE_NP = np.array(CRC_TABLE, dtype=np.uint32)
+# Nhóm payload cùng độ dài có từ ngần này phần tử trở lên thì tính bằng NumPy
+BATCH_MIN_GROUP = 16
+
+
+def _as_bytes(data):
+    return data.encode() if isinstance(data, str) else data
+
+
+def crc16_update(crc, data):
+    # Tính tiếp CRC từ trạng thái crc (cho phép tính trước phần đầu payload); data: str/bytes/memoryview
+    table = CRC_TABLE
+    for b in _as_bytes(data):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+def crc16_ccitt(data):
+    return f"{crc16_update(CRC_INIT, data):04X}"
+
+
+def _crc16_rows(rows):
+    # rows: mảng uint8 (n, length) -> CRC từng dòng, vector hoá theo cột
+    crc = np.full(rows.shape[0], CRC_INIT, dtype=np.uint32)
+    for col in rows.T:
+        crc = ((crc << 8) & 0xFFFF) ^ _TABLE_NP[(crc >> 8) ^ col]
+    return crc
+
+
+def crc16_batch(payloads):
+    # Trả về list chuỗi CRC (4 ký tự hex) theo đúng thứ tự đầu vào
+    encoded = [_as_bytes(p) for p in payloads]
+    result = [None] * len(encoded)
+    groups = {}
+    for i, data in enumerate(encoded):
+        groups.setdefault(len(data), []).append(i)
+    for length, idx in groups.items():
+        if len(idx) < BATCH_MIN_GROUP or length == 0:
+            for i in idx:
+                result[i] = crc16_ccitt(encoded[i])
+            continue
+        rows = np.frombuffer(b"".join(bytes(encoded[i]) for i in idx), dtype=np.uint8).reshape(len(idx), length)
+        for i, crc in zip(idx, _crc16_rows(rows).tolist()):
+            result[i] = f"{crc:04X}"
+    return result
+
+
+def _split_crc(payload):
+    # payload hợp lệ kết thúc bằng "6304" + 4 ký tự CRC; CRC tính trên phần trước 4 ký tự cuối
+    if not isinstance(payload, str):
+        payload = bytes(payload).decode()
+    if len(payload) < 8 or payload[-8:-4] != CRC_TAG:
+        return None, None
+    return payload[:-4], payload[-4:].upper()
+
+
+def verify_crc(payload):
+    body, crc = _split_crc(payload)
+    return body is not None and crc16_ccitt(body) == crc
+
+
+def verify_batch(payloads):
+    split = [_split_crc(p) for p in payloads]
+    bodies = [body for body, _ in split if body is not None]
+    computed = iter(crc16_batch(bodies))
+    return [body is not None and next(computed) == crc for body, crc in split]
@@ -0,0 +1,230 @@
+import os, threading, time
+import cv2
+import zxingcpp
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from crc16 import verify_crc
+import metrics
+import preprocess
+
+try:
+    from pyzbar.pyzbar import decode as pyzbar_decode, ZBarSymbol
+except ImportError:  # thiếu thư viện libzbar trên máy
+    pyzbar_decode = None
+
+# ======== Giải mã QR ========
+# Mỗi backend: nhận ảnh xám, trả về text hoặc None, lỗi thì raise (engine sẽ ghi nhận).
+_local = threading.local()
+
+
+def _opencv_detector():
+    # QRCodeDetector không an toàn khi dùng chung giữa các thread -> mỗi thread giữ 1 bộ
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = _local.detector = cv2.QRCodeDetector()
+    return detector
+
+
+def _read_opencv(gray_img):
+    data, _, _ = _opencv_detector().detectAndDecode(gray_img)
+    return data or None
+
+
+def _read_zxingcpp(gray_img):
+    results = zxingcpp.read_barcodes(gray_img, formats=zxingcpp.BarcodeFormat.QRCode)
+    return results[0].text if results and results[0].text else None
+
+
+def _read_pyzbar(gray_img):
+    results = pyzbar_decode(gray_img, symbols=[ZBarSymbol.QRCODE])
+    return results[0].data.decode("utf-8") if results else None
+
+
+BACKENDS = {"OpenCV": _read_opencv, "ZXingCPP": _read_zxingcpp}
+if pyzbar_decode is not None:
+    BACKENDS["Pyzbar"] = _read_pyzbar
+
+
+def _safe(name, gray_img):
+    try:
+        text = BACKENDS[name](gray_img)
+        if text:
+            return text, name
+    except Exception:
+        pass
+    return None, None
+
+
+def decode_opencv(gray_img):
+    return _safe("OpenCV", gray_img)
+
+
+def decode_zxingcpp(gray_img):
+    return _safe("ZXingCPP", gray_img)
+
+
+def decode_pyzbar(gray_img):
+    return _safe("Pyzbar", gray_img) if "Pyzbar" in BACKENDS else (None, None)
+
+
+def decode_all(gray_img):
+    # Mọi mã QR trong ảnh -> list (text, method), không trùng; dừng ở backend đầu tiên đọc được
+    readers = (
+        ("ZXingCPP", lambda g: [r.text for r in zxingcpp.read_barcodes(g, formats=zxingcpp.BarcodeFormat.QRCode)]),
+        ("Pyzbar", lambda g: [r.data.decode("utf-8") for r in pyzbar_decode(g, symbols=[ZBarSymbol.QRCODE])]),
+        ("OpenCV", lambda g: list(_opencv_detector().detectAndDecodeMulti(g)[1] or ())),
+    )
+    for name, read in readers:
+        if name not in BACKENDS:
+            continue
+        try:
+            texts = [t for t in read(gray_img) if t]
+        except Exception:
+            continue
+        if texts:
+            return [(t, name) for t in dict.fromkeys(texts)]
+    return []
+
+
+def is_vietqr(text):
+    # Payload EMVCo hợp lệ: bắt đầu bằng 000201 và CRC khớp
+    return text.startswith("000201") and verify_crc(text)
+
+
+# ======== Bộ giải mã thích nghi ========
+# adaptive (mặc định): thử lần lượt, backend nào nhanh + hay thành công hơn được thử trước.
+# race: chạy mọi backend song song, lấy kết quả VietQR hợp lệ đầu tiên trước hạn chót.
+DECODE_MODE = os.environ.get("QR_DECODE_MODE", "adaptive").strip().lower()
+DECODE_DEADLINE = float(os.environ.get("QR_DECODE_DEADLINE_MS", "2000")) / 1000
+# Thứ tự ban đầu khi chưa có số liệu
+DEFAULT_ORDER = ("ZXingCPP", "Pyzbar", "OpenCV")
+
+
+class BackendStats:
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.avg_time = None  # trung bình trượt (EMA), giây
+
+    def record(self, elapsed, ok, error=False):
+        self.calls += 1
+        self.hits += ok
+        self.errors += error
+        self.total_time += elapsed
+        self.avg_time = elapsed if self.avg_time is None else 0.8 * self.avg_time + 0.2 * elapsed
+
+    def expected_cost(self, prior=0.0):
+        # Thời gian kỳ vọng để ra kết quả = độ trễ / tỉ lệ thành công (làm trơn Laplace); chưa chạy lần nào -> prior
+        if self.avg_time is None:
+            return prior
+        return self.avg_time * (self.calls + 2) / (self.hits + 1)
+
+    def as_dict(self):
+        return {"calls": self.calls, "hits": self.hits, "errors": self.errors,
+                "success_rate": round(self.hits / self.calls, 3) if self.calls else None,
+                "avg_ms": round(self.avg_time * 1000, 2) if self.avg_time is not None else None,
+                "total_ms": round(self.total_time * 1000, 1)}
+
+
+class DecoderEngine:
+    def __init__(self, backends=None, mode=DECODE_MODE, deadline=DECODE_DEADLINE, validate=is_vietqr):
+        self.backends = dict(backends or BACKENDS)
+        self.mode = mode
+        self.deadline = deadline
+        self.validate = validate
+        self.stats = {name: BackendStats() for name in self.backends}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _run(self, name, gray_img):
+        start = time.perf_counter()
+        text, error = None, False
+        try:
+            text = self.backends[name](gray_img)
+        except Exception:
+            error = True
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats[name].record(elapsed, bool(text), error)
+        metrics.observe("qr_decode_backend_seconds", elapsed, backend=name,
+                        result="error" if error else "hit" if text else "miss")
+        return text or None
+
+    def order(self):
+        # Backend chưa có số liệu lấy chi phí trung bình của các backend đã chạy: vẫn được thử (khi backend
+        # nhanh nhất trượt) nhưng không chen lên trước backend đã chứng minh nhanh; hoà thì theo DEFAULT_ORDER
+        rank = {name: i for i, name in enumerate(DEFAULT_ORDER)}
+        with self._lock:
+            tried = [s.expected_cost() for s in self.stats.values() if s.avg_time is not None]
+            prior = sum(tried) / len(tried) if tried else 0.0
+            return sorted(self.backends, key=lambda n: (self.stats[n].expected_cost(prior), rank.get(n, len(rank))))
+
+    def decode(self, gray_img):
+        return self.race(gray_img) if self.mode == "race" else self.cascade(gray_img)
+
+    def cascade(self, gray_img):
+        # Trả về kết quả hợp lệ đầu tiên; nếu chỉ đọc được QR không phải VietQR thì trả về cái đó
+        fallback = (None, None)
+        for name in self.order():
+            text = self._run(name, gray_img)
+            if not text:
+                continue
+            if self.validate is None or self.validate(text):
+                return text, name
+            if fallback[0] is None:
+                fallback = (text, name)
+        return fallback
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=len(self.backends), thread_name_prefix="qr-decode")
+            return self._pool
+
+    def race(self, gray_img):
+        pool = self._get_pool()
+        futures = {pool.submit(self._run, name, gray_img): name for name in self.order()}
+        end = time.perf_counter() + self.deadline
+        fallback = (None, None)
+        pending = set(futures)
+        while pending:
+            timeout = end - time.perf_counter()
+            if timeout <= 0:
+                break
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                text = fut.result()
+                if not text:
+                    continue
+                if self.validate is None or self.validate(text):
+                    # Các backend còn lại chạy nốt ở nền, vẫn được tính vào thống kê
+                    return text, futures[fut]
+                if fallback[0] is None:
+                    fallback = (text, futures[fut])
+        return fallback
+
+    def stats_dict(self):
+        with self._lock:
+            return {name: s.as_dict() for name, s in self.stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {name: BackendStats() for name in self.backends}
+
+
+engine = DecoderEngine()
+
+
+def decode_qr_auto(gray_img):
+    return engine.decode(gray_img)
+
+
+def decoder_stats():
+    return {"mode": engine.mode, "order": engine.order(), "backends": engine.stats_dict()}
+
+
+def decode_image(file):
+    # file: đường dẫn, file object hoặc bytes của ảnh tải lên -> (text, method)
+    with metrics.span("qr_decode_seconds"):
+        return preprocess.decode_upload(file, decode_qr_auto)
@@ -0,0 +1,74 @@
+import itertools, threading, weakref
+import asset_cache
+import crc16
+import encoding
+import layouts
+import qr_matrix
+import qr_templates
+import vietqr
+
+# ======== QR động theo số tiền (máy POS / màn hình Tingbox tại quầy) ========
+# Mỗi cửa hàng mở 1 DynamicQRSession, các phần không đổi giữa các lần bán được tính 1 lần:
+#   - payload: phần trước/sau tag 54 và trạng thái CRC của phần trước (crc16_update)
+#   - poster: nền, chữ, logo đã vẽ sẵn (canvas riêng của session, nằm trong asset_cache nên chung giới hạn bộ nhớ;
+#     bị bỏ do hết chỗ thì lần sau vẽ lại từ đầu)
+# Mỗi số tiền chỉ còn: nối tag 54 + tính CRC phần còn lại, mã hoá QR (zxing-cpp nếu có), raster thẳng vào ô QR.
+#   s = DynamicQRSession("12345678901", template_id="qr6", scale=0.5)
+#   s.payload(125000)           -> chuỗi VietQR, giống hệt build_vietqr_payload
+#   s.image(125000)             -> ảnh RGBA dùng chung của session (bị vẽ đè ở lần gọi sau)
+#   s.render(125000, "png_fast") -> BytesIO như các hàm create_qr_*
+# Benchmark: python benchmarks/run.py --only dynamic
+MAX_AMOUNT_LEN = 13  # tag 54 của EMVCo tối đa 13 ký tự
+_session_ids = itertools.count()
+
+
+def normalize_amount(amount):
+    # Số tiền (đồng, số nguyên) -> chuỗi chữ số; None / "" / 0 / "0" / "000" = QR không kèm số tiền.
+    # Không nhận số 0 ở đầu ("0500"): không rõ người nhập muốn số nào
+    text = "" if amount is None else str(amount).strip()
+    if not text.lstrip("0"):
+        return ""
+    if not text.isdigit() or text[0] == "0" or len(text) > MAX_AMOUNT_LEN:
+        raise ValueError(f"Số tiền không hợp lệ: {amount!r}")
+    return text
+
+
+class DynamicQRSession:
+    def __init__(self, merchant_id, bank_bin="970418", add_info="", template_id="qr6", inputs=None, scale=1,
+                 encoder="fast"):
+        # inputs: các trường chữ của poster (name, store, ...); mặc định chỉ có số tài khoản
+        if template_id not in qr_templates.LAYOUTS:
+            raise ValueError(f"QR động chỉ hỗ trợ mẫu {', '.join(qr_templates.LAYOUTS)}")
+        self.spec = qr_templates.LAYOUTS[template_id]
+        self.scale = scale
+        self.encode_matrix = qr_matrix.ENCODERS[encoder]
+        self.inputs = dict({"account": merchant_id}, **(inputs or {}))
+        self._head, self._tail = vietqr.payload_parts(merchant_id, bank_bin, add_info)
+        self._head_crc = crc16.crc16_update(crc16.CRC_INIT, self._head)
+        self._canvas_key = ("session_canvas", next(_session_ids))
+        weakref.finalize(self, asset_cache.take_item, self._canvas_key)  # session bị huỷ -> trả chỗ trong cache
+        self._lock = threading.Lock()
+        self.image(0)  # vẽ sẵn nền + chữ + logo
+
+    def payload(self, amount=""):
+        amount = normalize_amount(amount)
+        tag = vietqr.format_tlv("54", amount) if amount else ""
+        crc = crc16.crc16_update(crc16.crc16_update(self._head_crc, tag), self._tail)
+        return f"{self._head}{tag}{self._tail}{crc:04X}"
+
+    def _draw(self, amount):
+        # Gọi khi đang giữ lock; chỉ lớp QR được vẽ lại
+        data = self.payload(amount)
+        inputs = dict(self.inputs, data=data)
+        canvas = layouts.paint(self.spec, inputs, self.scale, asset_cache.take_item(self._canvas_key),
+                               self.encode_matrix(data))
+        asset_cache.put_item(self._canvas_key, canvas, asset_cache._image_nbytes(canvas.img))
+        return canvas.img
+
+    def image(self, amount=""):
+        with self._lock:
+            return self._draw(amount)
+
+    def render(self, amount="", profile=None):
+        with self._lock:
+            return encoding.encode(self._draw(amount), profile)
@@ -0,0 +1,206 @@
+from crc16 import CRC_TAG, crc16_ccitt, verify_batch
+
+# ======== Bộ phân tích TLV EMVCo (VietQR) ========
+# Không cắt chuỗi khi quét: mỗi tag chỉ lưu (vị trí đầu, vị trí cuối) của value trên payload gốc,
+# value chỉ được cắt ra khi gọi get().
+# Template lồng nhau (26-51, 62, 64) chỉ được quét khi truy cập tới.
+# Lỗi cấu trúc được gom vào danh sách errors (dict path/offset/code/message) thay vì raise ngay.
+TEMPLATE_TAGS = frozenset([f"{n:02d}" for n in range(26, 52)] + ["62", "64"])
+REQUIRED_TAGS = ("00", "53", "58", "63")
+MERCHANT_TAGS = tuple(f"{n:02d}" for n in range(26, 52))
+_TAG_NAMES = tuple(f"{n:02d}" for n in range(100))
+# 2 byte ASCII (b0 << 8 | b1) -> số 00-99, -1 nếu không phải 2 chữ số: đọc tag/độ dài bằng 1 phép tra bảng
+_PAIRS = [-1] * 65536
+for _n in range(100):
+    _PAIRS[(48 + _n // 10) << 8 | (48 + _n % 10)] = _n
+_PAIRS = tuple(_PAIRS)
+
+
+def _error(errors, path, offset, code, message):
+    errors.append({"path": path, "offset": offset, "code": code, "message": message})
+
+
+def _loose_length(text):
+    # Độ dài không phải 2 chữ số nhưng int() vẫn đọc được (" 5", "+5"); -1 nếu không đọc được hoặc âm
+    try:
+        length = int(text)
+    except ValueError:
+        return -1
+    return length if length >= 0 else -1
+
+
+def _scan(text, codes, start, end, path, errors):
+    # -> {tag: (value_start, value_end)}; dừng ở lỗi độ dài/tràn vì sau đó không còn xác định được ranh giới tag
+    # codes: bytes ASCII của payload (đọc số nhanh hơn str), None nếu payload có ký tự Unicode
+    index = {}
+    i = start
+    while i + 4 <= end:
+        if codes is not None:
+            tag_no, length = _PAIRS[codes[i] << 8 | codes[i + 1]], _PAIRS[codes[i + 2] << 8 | codes[i + 3]]
+        else:
+            tag_no, length = [_PAIRS[(ord(a) << 8 | ord(b)) & 0xFFFF] if a.isascii() and b.isascii() else -1
+                              for a, b in (text[i:i + 2], text[i + 2:i + 4])]
+        if length < 0:
+            length = _loose_length(text[i + 2:i + 4])
+            if length < 0:
+                _error(errors, path, i, "bad_length",
+                       f"Lỗi TLV: không thể chuyển '{text[i + 2:i + 4]}' thành số nguyên tại vị trí {i}")
+                return index
+            _error(errors, path, i, "loose_length",
+                   f"Lỗi TLV: độ dài '{text[i + 2:i + 4]}' không phải 2 chữ số tại vị trí {i}")
+        if tag_no < 0:
+            # Độ dài vẫn đọc được nên ranh giới không mất: ghi lỗi rồi quét tiếp với tag nguyên văn
+            tag = text[i:i + 2]
+            _error(errors, path + (tag,), i, "bad_tag", f"Lỗi TLV: tag '{tag}' không phải số tại vị trí {i}")
+        else:
+            tag = _TAG_NAMES[tag_no]
+        value_start = i + 4
+        value_end = value_start + length
+        if value_end > end:
+            _error(errors, path + (tag,), i, "overflow", f"Lỗi TLV: độ dài value vượt quá payload tại tag {tag}")
+            return index
+        if tag in index:
+            _error(errors, path + (tag,), i, "duplicate", f"Lỗi TLV: tag {tag} xuất hiện nhiều lần tại vị trí {i}")
+        index[tag] = (value_start, value_end)  # tag lặp: giữ value cuối như parse_tlv cũ
+        i = value_end
+    if i != end:
+        _error(errors, path, i, "trailing", f"Lỗi TLV: thừa {end - i} ký tự cuối tại vị trí {i}")
+    return index
+
+
+class Template:
+    __slots__ = ("_text", "_codes", "_start", "_end", "_index", "_children", "path", "errors")
+
+    def __init__(self, text, codes, start, end, path, errors):
+        self._text = text
+        self._codes = codes
+        self._start = start
+        self._end = end
+        self._index = None
+        self._children = None
+        self.path = path
+        self.errors = errors  # dùng chung với payload gốc
+
+    @property
+    def index(self):
+        # {tag: (đầu, cuối)}, chỉ quét ở lần truy cập đầu tiên
+        index = self._index
+        if index is None:
+            index = self._index = _scan(self._text, self._codes, self._start, self._end, self.path, self.errors)
+        return index
+
+    def tags(self):
+        return list(self.index)
+
+    def __contains__(self, tag):
+        return tag in self.index
+
+    def span(self, tag):
+        return self.index.get(tag)
+
+    def get(self, tag, default=""):
+        index = self._index
+        span = (self.index if index is None else index).get(tag)
+        if span is None:
+            return default
+        return self._text[span[0]:span[1]]
+
+    def __getitem__(self, tag):
+        if tag not in self.index:
+            raise KeyError(tag)
+        return self.get(tag)
+
+    def template(self, tag):
+        # Value của tag được hiểu là một template TLV con; trả về None nếu không có tag
+        if self._children is None:
+            self._children = {}
+        child = self._children.get(tag)
+        if child is None:
+            span = self.index.get(tag)
+            if span is None:
+                return None
+            child = self._children[tag] = Template(self._text, self._codes, span[0], span[1],
+                                                   self.path + (tag,), self.errors)
+        return child
+
+    def to_dict(self, deep=True):
+        # deep: bung các template con theo TEMPLATE_TAGS (chỉ ở cấp gốc) thành dict lồng nhau
+        out = {}
+        for tag in self.index:
+            if deep and not self.path and tag in TEMPLATE_TAGS:
+                out[tag] = self.template(tag).to_dict(deep=False)
+            else:
+                out[tag] = self.get(tag)
+        return out
+
+    def walk(self):
+        # Quét hết các template con theo chuẩn (để gom đủ lỗi)
+        for tag in self.index:
+            if not self.path and tag in TEMPLATE_TAGS:
+                self.template(tag).index
+        return self.errors
+
+
+class Payload(Template):
+    __slots__ = ()
+    def __init__(self, payload):
+        # Độ dài TLV tính theo ký tự: payload bytes được giải mã UTF-8 trước khi quét
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload).decode("utf-8")
+        codes = payload.encode("ascii") if payload.isascii() else None
+        super().__init__(payload, codes, 0, len(payload), (), [])
+
+    @property
+    def text(self):
+        return self._text
+
+    def crc_ok(self):
+        text = self.text
+        return len(text) >= 8 and text[-8:-4] == CRC_TAG and crc16_ccitt(text[:-4]) == text[-4:].upper()
+
+    def validate(self, deep=True, crc_ok=None):
+        # -> list lỗi: lỗi cấu trúc (quét cả template con nếu deep) + lỗi theo quy tắc EMVCo
+        # crc_ok: kết quả CRC đã tính sẵn (vd theo lô), None thì tự tính
+        if deep:
+            self.walk()
+        else:
+            self.index
+        return self.errors + _rule_errors(self, self.crc_ok() if crc_ok is None else crc_ok)
+
+
+def _rule_errors(payload, crc_ok):
+    errors = []
+    index = payload.index
+    if payload.span("00") != (4, 6) or payload.get("00") != "01":
+        _error(errors, ("00",), 0, "format_indicator", "Payload phải bắt đầu bằng 000201")
+    for tag in REQUIRED_TAGS:
+        if tag not in index:
+            _error(errors, (tag,), None, "missing", f"Thiếu tag bắt buộc {tag}")
+    if not any(tag in index for tag in MERCHANT_TAGS):
+        _error(errors, (), None, "missing", "Thiếu thông tin tài khoản thụ hưởng (tag 26-51)")
+    span = index.get("63")
+    if span is not None and span[1] != len(payload.text):
+        _error(errors, ("63",), span[0] - 4, "crc_position", "Tag 63 (CRC) phải nằm cuối payload")
+    elif span is not None and not crc_ok:
+        _error(errors, ("63",), span[0] - 4, "crc", "Mã kiểm tra CRC (tag 63) không khớp")
+    return errors
+
+
+def parse(payload):
+    return Payload(payload)
+
+
+def validate(payload, deep=True):
+    # -> (hợp lệ, list lỗi)
+    errors = parse(payload).validate(deep)
+    return not errors, errors
+
+
+def validate_many(payloads, deep=False):
+    # Kiểm tra hàng loạt: CRC tính theo lô bằng NumPy (crc16.verify_batch), chỉ quét cấp gốc nếu deep=False
+    crc_flags = verify_batch(payloads)
+    results = []
+    for payload, crc_ok in zip(payloads, crc_flags):
+        errors = parse(payload).validate(deep, crc_ok)
+        results.append({"ok": not errors, "crc_ok": crc_ok, "errors": errors})
+    return results
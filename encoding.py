@@ -0,0 +1,50 @@
+import io, os
+from PIL import Image
+
+# ======== Hồ sơ mã hoá ảnh đầu ra ========
+# png          : như cũ (deflate mặc định)
+# png_fast     : nén nhẹ, bỏ kênh alpha khi ảnh không trong suốt
+# png_palette  : bảng màu <= 256 màu, không dither nên module QR vẫn sắc nét, file nhỏ
+# webp_lossless: WebP không mất dữ liệu, mức nén nhanh nhất (method/quality = 0)
+# jpeg         : JPEG chất lượng cao, không subsampling màu, dùng cho bản xem trước khi in
+PROFILES = {
+    "png": {"format": "PNG", "mime": "image/png", "ext": "png"},
+    "png_fast": {"format": "PNG", "mime": "image/png", "ext": "png", "compress_level": 1, "drop_alpha": True},
+    "png_palette": {"format": "PNG", "mime": "image/png", "ext": "png", "palette": True, "drop_alpha": True},
+    "webp_lossless": {"format": "WEBP", "mime": "image/webp", "ext": "webp", "lossless": True, "method": 0,
+                      "quality": 0},
+    "jpeg": {"format": "JPEG", "mime": "image/jpeg", "ext": "jpg", "quality": 95, "subsampling": 0, "rgb": True},
+}
+DEFAULT_PROFILE = os.environ.get("QR_OUTPUT_PROFILE", "png")
+_SAVE_OPTIONS = ("compress_level", "lossless", "method", "quality", "subsampling")
+
+
+def get_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f"Không có hồ sơ mã hoá '{name}', chọn một trong: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def _is_opaque(img):
+    return img.mode != "RGBA" or img.getchannel("A").getextrema()[0] == 255
+
+
+def encode(img, profile=None):
+    # Trả về BytesIO đã seek(0), giống các hàm create_qr_* trước đây
+    opts = get_profile(profile or DEFAULT_PROFILE)
+    if opts.get("rgb") or (opts.get("drop_alpha") and _is_opaque(img)):
+        img = img.convert("RGB")
+    if opts.get("palette"):
+        img = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    buf = io.BytesIO()
+    img.save(buf, format=opts["format"], **{k: opts[k] for k in _SAVE_OPTIONS if k in opts})
+    buf.seek(0)
+    return buf
+
+
+def mime_type(profile=None):
+    return get_profile(profile or DEFAULT_PROFILE)["mime"]
+
+
+def extension(profile=None):
+    return get_profile(profile or DEFAULT_PROFILE)["ext"]
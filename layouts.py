@@ -0,0 +1,344 @@
+from PIL import ImageDraw
+import asset_cache
+import encoding
+import metrics
+import qr_matrix
+import text_fit
+
+# ======== Poster khai báo bằng dữ liệu (layout spec) ========
+# Mỗi spec gồm: nền, ô QR và danh sách phần tử (text / stack / line).
+# Lần đầu dùng, spec được "biên dịch" thành ảnh nền đã vẽ sẵn mọi phần tĩnh (nhãn có vị trí cố định),
+# cache theo (mẫu, tỉ lệ, các trường tuỳ chọn có mặt); mỗi lần render chỉ copy nền đó 1 lần
+# rồi vẽ QR + các ô động (tên, số tài khoản, cửa hàng, ...).
+#
+# Toạ độ theo ảnh gốc (scale=1):
+#   x: số | "center" (giữa nền) | "qr_center" (giữa ô QR)
+#   y: số | ("qr", d) = cách đáy QR d px | ("bottom", d) = cách đáy nền d px
+# qr: x, y, w, h, logo (cạnh logo), border, radius (bo góc)
+# Phần tử:
+#   text : field, font (path, size) hoặc fit (path, size, min, step) + max_width, fill, transform
+#   stack: các cặp nhãn/giá trị xếp dọc, căn giữa (anchor "bg" hoặc "qr"), bỏ qua trường trống
+#   line : 1 dòng gồm nhiều đoạn chữ nối tiếp (chuỗi cố định hoặc {"field": ...}), hiện khi có 1 trong các trường "when"
+#
+# Render tăng dần: ảnh vừa vẽ được giữ lại cùng vùng bao của từng lớp (QR, từng phần tử), nằm trong asset_cache
+# nên chung giới hạn QR_ASSET_CACHE_MB với nền. Lần sau chỉ lớp có input thay đổi (QR <- data, mỗi phần tử <- các
+# trường nó đọc) được xoá về nền rồi vẽ lại;
+# lớp khác chồng lên vùng đó cũng vẽ lại cho đúng thứ tự, kết quả giống hệt vẽ từ đầu.
+
+
+def _scaler(scale):
+    if scale == 1:
+        return lambda v: v
+    return lambda v: max(1, int(round(v * scale)))
+
+
+def _present(inputs, field):
+    value = inputs.get(field, "")
+    return bool(value and value.strip())
+
+
+def normalize_branch_name(name):
+    # Viết hoa chữ cái đầu của mỗi từ
+    return " ".join([w.capitalize() for w in name.strip().split()]) if name else ""
+
+
+TRANSFORMS = {
+    None: lambda v: v,
+    "upper": lambda v: v.upper(),
+    "branch": lambda v: "Chi nhánh " + normalize_branch_name(v),
+}
+
+
+class _Frame:
+    # Kích thước / vị trí đã quy đổi theo tỉ lệ cho 1 lần vẽ
+    def __init__(self, spec, size, scale):
+        self.S = S = _scaler(scale)
+        self.w, self.h = size
+        qr = spec["qr"]
+        self.qr_x, self.qr_y, self.qr_w, self.qr_h = S(qr["x"]), S(qr["y"]), S(qr["w"]), S(qr["h"])
+
+    def x(self, value, text_w):
+        if value == "center":
+            return (self.w - text_w) // 2
+        if value == "qr_center":
+            return self.qr_x + (self.qr_w - text_w) // 2
+        return self.S(value)
+
+    def y(self, value):
+        if isinstance(value, tuple):
+            ref, d = value
+            return self.qr_y + self.qr_h + self.S(d) if ref == "qr" else self.h - self.S(d)
+        return self.S(value)
+
+    def max_width(self, value):
+        if value == "qr":
+            return self.qr_w
+        return int(self.w * value)
+
+
+# ===== Vẽ từng loại phần tử =====
+# phase "static": chỉ vẽ phần có vị trí không phụ thuộc dữ liệu (khi dựng nền);
+# phase "dynamic": vẽ phần còn lại mỗi lần render. Cùng một hàm tính toạ độ cho cả 2 pha.
+def _draw_text(draw, el, inputs, f, phase):
+    field = el.get("field")
+    if phase == ("static" if field else "dynamic"):
+        return
+    if field and not _present(inputs, field):
+        return
+    text = TRANSFORMS[el.get("transform")](inputs[field]) if field else el["text"]
+    S = f.S
+    if "fit" in el:
+        path, size, min_size, step = el["fit"]
+        font, _ = text_fit.fit_font(path, text, f.max_width(el["max_width"]), S(size), S(min_size), S(step))
+    else:
+        font = text_fit.get_font(el["font"][0], S(el["font"][1]))
+    draw.text((f.x(el["x"], text_fit.text_width(font, text)), f.y(el["y"])), text, fill=el["fill"], font=font)
+
+
+def _draw_stack(draw, el, inputs, f, phase):
+    S = f.S
+    label_path, label_size = el["label_font"]
+    font_label = text_fit.get_font(label_path, S(label_size))
+    center = (lambda w: (f.w - w) // 2) if el["anchor"] == "bg" else (lambda w: f.qr_x + (f.qr_w - w) // 2)
+    max_width = f.max_width(el["max_width"])
+    y_offset = f.y(el["y"])
+    first = True
+    for item in el["items"]:
+        if not _present(inputs, item["field"]):
+            continue
+        # Nhãn của mục đầu tiên luôn nằm ở y cố định -> vẽ sẵn vào nền
+        if phase == ("static" if first else "dynamic"):
+            label = item["label"]
+            draw.text((center(text_fit.text_width(font_label, label)), y_offset), label, fill=el["label_fill"],
+                      font=font_label)
+        if phase == "static":
+            return
+        first = False
+        y_offset += S(el["label_step"])
+        text = TRANSFORMS[item.get("transform")](inputs[item["field"]])
+        path, size, min_size, step = item["fit"]
+        font, font_size = text_fit.fit_font(path, text, max_width, S(size), S(min_size), S(step))
+        draw.text((center(text_fit.text_width(font, text)), y_offset), text, fill=item["fill"], font=font)
+        y_offset += font_size + S(item["after"])
+
+
+def _draw_line(draw, el, inputs, f, phase):
+    if not any(_present(inputs, field) for field in el["when"]):
+        return
+    font = text_fit.get_font(el["font"][0], f.S(el["font"][1]))
+    x, y = f.S(el["x"]), f.y(el["y"])
+    for i, (part, fill) in enumerate(el["parts"]):
+        text = (inputs.get(part["field"]) or "") if isinstance(part, dict) else part
+        # Đoạn chữ cố định đứng đầu dòng có vị trí cố định -> vẽ sẵn vào nền
+        static = i == 0 and not isinstance(part, dict)
+        if phase == ("static" if static else "dynamic"):
+            draw.text((x, y), text, fill=fill, font=font)
+        if phase == "static":
+            return
+        x += text_fit.text_width(font, text)
+
+
+DRAWERS = {"text": _draw_text, "stack": _draw_stack, "line": _draw_line}
+
+
+def _optional(spec):
+    # Các trường quyết định phần tĩnh có được vẽ hay không
+    out = []
+    for el in spec["elements"]:
+        out += [item["field"] for item in el.get("items", ())] + list(el.get("when", ()))
+    return tuple(dict.fromkeys(out))
+
+
+def _flags(spec, inputs):
+    return tuple(_present(inputs or {}, field) for field in _optional(spec))
+
+
+def compiled_base(spec, scale=1, inputs=None):
+    # Nền đã vẽ sẵn phần tĩnh; dùng chung (chỉ đọc), được tính vào giới hạn bộ nhớ của asset_cache
+    optional = _optional(spec)
+    flags = _flags(spec, inputs)
+    sample = dict(zip(optional, ("x" if flag else "" for flag in flags)))
+
+    def build():
+        base = asset_cache.get_scaled(spec["background"], scale)
+        f = _Frame(spec, base.size, scale)
+        draw = ImageDraw.Draw(base)
+        for el in spec["elements"]:
+            DRAWERS[el["type"]](draw, el, sample, f, "static")
+        return base
+
+    return asset_cache.get_layer((spec["id"], scale, flags), build)
+
+
+# ===== Render tăng dần =====
+BOX_PAD = 2  # nới vùng bao chữ vài px cho phần khử răng cưa
+
+
+def _element_fields(el):
+    # Các input mà 1 phần tử đọc (kể cả trường chỉ quyết định có hiện hay không)
+    names = [item["field"] for item in el.get("items", ())] + [el.get("field")] + list(el.get("when", ()))
+    names += [p["field"] for p, _ in el.get("parts", ()) if isinstance(p, dict)]
+    return tuple(dict.fromkeys(n for n in names if n))
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class _BoxDraw:
+    # Bọc ImageDraw: vẽ như cũ và ghi lại vùng bao của từng dòng chữ
+    def __init__(self, draw):
+        self.draw = draw
+        self.boxes = []
+
+    def text(self, xy, text, fill=None, font=None):
+        l, t, r, b = self.draw.textbbox(xy, text, font=font)
+        if r > l and b > t:
+            self.boxes.append((l - BOX_PAD, t - BOX_PAD, r + BOX_PAD, b + BOX_PAD))
+        self.draw.text(xy, text, fill=fill, font=font)
+
+
+class _Canvas:
+    # Ảnh đã vẽ + input đã dùng + vùng bao từng lớp (0 = QR, 1.. = phần tử theo thứ tự spec)
+    __slots__ = ("key", "img", "values", "boxes")
+
+    def __init__(self, key, img, layers):
+        self.key = key
+        self.img = img
+        self.values = {}
+        self.boxes = [[] for _ in range(layers)]
+
+
+class _CanvasCache:
+    # Canvas nằm trong asset_cache (chung giới hạn bộ nhớ với nền và lớp dựng sẵn);
+    # take() lấy hẳn canvas ra khỏi cache nên 2 thread không bao giờ vẽ chung 1 ảnh
+    KIND = "canvas"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def take(self, key):
+        canvas = asset_cache.take_item((self.KIND,) + key)
+        if canvas is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return canvas
+
+    def give(self, key, canvas):
+        asset_cache.put_item((self.KIND,) + key, canvas, asset_cache._image_nbytes(canvas.img))
+
+    def clear(self):
+        asset_cache.clear_cache(self.KIND)
+
+    def stats(self):
+        items, nbytes = asset_cache.item_usage(self.KIND)
+        return {"items": items, "bytes": nbytes, "hits": self.hits, "misses": self.misses}
+
+
+_canvases = _CanvasCache()
+
+
+def _redraw_set(canvas, changed):
+    # Lớp đổi input + mọi lớp chồng lên vùng sẽ bị xoá (lặp tới khi không thêm được lớp nào)
+    redraw = set(changed)
+    rects = [r for i in redraw for r in canvas.boxes[i]]
+    grown = True
+    while grown:
+        grown = False
+        for i, boxes in enumerate(canvas.boxes):
+            if i not in redraw and any(_overlaps(a, b) for a in boxes for b in rects):
+                redraw.add(i)
+                rects += boxes
+                grown = True
+    return redraw, rects
+
+
+def qr_layer(spec, f, data):
+    # Ảnh QR + logo đúng cỡ ô QR của spec; data: payload hoặc ma trận đã mã hoá
+    qr, S = spec["qr"], f.S
+    qr_img = qr_matrix.rasterize_image(qr_matrix.get_matrix(data), f.qr_w, f.qr_h, border=qr.get("border", 0),
+                                       radius=S(qr["radius"]) if "radius" in qr else 0)
+    logo = asset_cache.get_resized(spec["logo"], (S(qr["logo"]), S(qr["logo"])))
+    qr_img.paste(logo, ((qr_img.width - logo.width) // 2, (qr_img.height - logo.height) // 2), logo)
+    return qr_img
+
+
+def _paint(canvas, spec, inputs, f, redraw, sw, matrix):
+    # Vẽ lại các lớp trong redraw lên canvas (vùng cũ của chúng đã được xoá về nền)
+    img = canvas.img
+
+    # ===== QR + logo =====
+    if 0 in redraw:
+        qr_img = qr_layer(spec, f, inputs["data"] if matrix is None else matrix)
+        sw.mark("qr")
+        img.paste(qr_img, (f.qr_x, f.qr_y), qr_img)
+        canvas.boxes[0] = [(f.qr_x, f.qr_y, f.qr_x + qr_img.width, f.qr_y + qr_img.height)]
+    sw.mark("compose")
+
+    # ===== Các ô động =====
+    draw = ImageDraw.Draw(img)
+    for i, el in enumerate(spec["elements"], 1):
+        if i in redraw:
+            box_draw = _BoxDraw(draw)
+            DRAWERS[el["type"]](box_draw, el, inputs, f, "dynamic")
+            canvas.boxes[i] = box_draw.boxes
+    sw.mark("text")
+
+
+def paint(spec, inputs, scale=1, canvas=None, matrix=None, sw=None):
+    # Vẽ poster -> _Canvas. canvas: kết quả lần trước (bị vẽ đè, chỉ lớp có input đổi được vẽ lại) hoặc None;
+    # matrix: ma trận QR đã mã hoá sẵn cho inputs["data"] (None = qr_matrix.get_matrix)
+    if sw is None:
+        sw = metrics.stages("qr_render_stage_seconds", template=spec["id"])
+    base = compiled_base(spec, scale, inputs)
+    deps = [("data",)] + [_element_fields(el) for el in spec["elements"]]
+    f = _Frame(spec, base.size, scale)
+    key = (spec["id"], scale, _flags(spec, inputs))
+    if canvas is not None and canvas.key != key:
+        canvas = None
+    if canvas is not None:
+        changed = [i for i, names in enumerate(deps) if any(canvas.values.get(n) != inputs.get(n) for n in names)]
+        redraw, rects = _redraw_set(canvas, changed)
+        for l, t, r, b in rects:
+            box = (max(0, l), max(0, t), min(base.width, r), min(base.height, b))
+            if box[2] > box[0] and box[3] > box[1]:
+                canvas.img.paste(base.crop(box), box[:2])
+        sw.mark("background")
+        _paint(canvas, spec, inputs, f, redraw, sw, matrix)
+        # Chữ mới lớn hơn lấn sang lớp không được vẽ lại -> thứ tự chồng có thể sai, vẽ lại từ đầu
+        kept = [b for i, boxes in enumerate(canvas.boxes) if i not in redraw for b in boxes]
+        if any(_overlaps(a, b) for i in redraw for a in canvas.boxes[i] for b in kept):
+            canvas = None
+    if canvas is None:
+        canvas = _Canvas(key, base.copy(), len(deps))
+        sw.mark("background")
+        _paint(canvas, spec, inputs, f, set(range(len(deps))), sw, matrix)
+    canvas.values = {n: inputs.get(n) for names in deps for n in names}
+    return canvas
+
+
+def render(spec, inputs, profile=None, scale=1):
+    sw = metrics.stages("qr_render_stage_seconds", template=spec["id"])
+    canvas = paint(spec, inputs, scale, _canvases.take((spec["id"], scale, _flags(spec, inputs))), sw=sw)
+    buf = encoding.encode(canvas.img, profile)
+    sw.mark("encode")
+    _canvases.give(canvas.key, canvas)
+    return buf
+
+
+def canvas_cache_stats():
+    return _canvases.stats()
+
+
+def clear_canvas_cache():
+    _canvases.clear()
+
+
+def fields(spec):
+    # Các input mà spec dùng (cho key cache render)
+    out = ["data"]
+    for el in spec["elements"]:
+        out += _element_fields(el)
+    return tuple(dict.fromkeys(out))
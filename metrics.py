@@ -0,0 +1,228 @@
+import io, os, threading, time
+from bisect import bisect_left
+
+# ======== Đo thời gian từng giai đoạn (render, giải mã) -> histogram, xuất dạng Prometheus ========
+# Bật bằng QR_METRICS=1 (hoặc enable() lúc chạy, vd từ bảng debug). Khi tắt, span()/stages() trả về
+# đối tượng rỗng dùng chung: mỗi lần gọi chỉ tốn 1 phép kiểm tra cờ.
+#   with metrics.span("qr_decode_backend_seconds", backend="ZXingCPP"): ...
+#   sw = metrics.stages("qr_render_stage_seconds", template="qr3"); ...; sw.mark("qr"); ...; sw.mark("encode")
+# QR_METRICS_PORT=<port>: mở endpoint /metrics cục bộ trong chính tiến trình (vd cạnh Streamlit).
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+HELP = {
+    "qr_render_seconds": "Thời gian render trọn 1 mẫu",
+    "qr_render_stage_seconds": "Thời gian từng giai đoạn render (background, qr, text, compose, encode)",
+    "qr_asset_load_seconds": "Thời gian nạp ảnh nền/logo hoặc dựng lớp nền khi chưa có trong cache",
+    "qr_decode_backend_seconds": "Thời gian 1 lần gọi backend giải mã QR",
+    "qr_decode_seconds": "Thời gian giải mã 1 ảnh tải lên (cả tiền xử lý)",
+}
+_enabled = os.environ.get("QR_METRICS", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled():
+    return _enabled
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # ô cuối là +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        # Ước lượng theo cận trên của ô chứa phân vị q (như histogram_quantile, không nội suy)
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self._hists = {}  # (tên, ((nhãn, giá trị), ...)) -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels=()):
+        key = (name, labels)
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram()
+            hist.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def snapshot(self):
+        # -> list dict (name, labels, count, sum_ms, avg_ms, p50_ms, p95_ms), theo tên rồi nhãn
+        with self._lock:
+            items = sorted(self._hists.items())
+            out = []
+            for (name, labels), h in items:
+                p50, p95 = h.quantile(0.5), h.quantile(0.95)
+                out.append({"name": name, "labels": dict(labels), "count": h.count,
+                            "sum_ms": h.sum * 1000, "avg_ms": h.sum / h.count * 1000,
+                            "p50_ms": p50 * 1000, "p95_ms": p95 * 1000})
+            return out
+
+    def prometheus_text(self):
+        # Định dạng text exposition 0.0.4 của Prometheus
+        with self._lock:
+            items = sorted((k, list(h.counts), h.sum, h.count) for k, h in self._hists.items())
+        lines, seen = [], set()
+        for (name, labels), counts, total, count in items:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}_sum{suffix} {total:.6f}")
+            lines.append(f"{name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    if _enabled:
+        registry.observe(name, seconds, _labels(labels))
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.name, time.perf_counter() - self.start, self.labels)
+
+
+class _Stages:
+    # Các giai đoạn nối tiếp: mark(tên) ghi thời gian từ mốc trước tới giờ cho giai đoạn đó
+    __slots__ = ("name", "labels", "last")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        registry.observe(self.name, now - self.last, self.labels + (("stage", stage),))
+        self.last = now
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mark(self, stage):
+        pass
+
+
+_NOOP = _Noop()
+
+
+def span(name, **labels):
+    return _Span(name, _labels(labels)) if _enabled else _NOOP
+
+
+def stages(name, **labels):
+    return _Stages(name, _labels(labels)) if _enabled else _NOOP
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+def prometheus_text():
+    return registry.prometheus_text()
+
+
+def reset():
+    registry.reset()
+
+
+def profile_call(fn, *args, sort="cumulative", limit=30, **kwargs):
+    # Chạy fn 1 lần dưới cProfile -> (kết quả, bảng pstats dạng text); chỉ đo thread đang gọi
+    import cProfile, pstats
+    prof = cProfile.Profile()
+    result = prof.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return result, out.getvalue()
+
+
+# ===== Endpoint /metrics cục bộ (http.server, thread nền) =====
+_server = None
+
+
+def serve(port, host="127.0.0.1"):
+    # Mở 1 lần cho cả tiến trình; trả về server (gọi lại chỉ trả server cũ)
+    global _server
+    if _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=_server.serve_forever, name="qr-metrics", daemon=True).start()
+    return _server
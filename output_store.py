@@ -0,0 +1,187 @@
+import hashlib, mmap, os, shutil, tempfile, threading
+from multiprocessing.util import Finalize
+from collections import OrderedDict
+
+# ======== Kho ảnh đầu ra theo nội dung (dùng chung mọi session) ========
+# Ảnh đã render được ghi 1 lần xuống đĩa, tên file = sha256 nội dung + đuôi (handle);
+# cùng một ảnh (vd cùng cửa hàng ở nhiều session) chỉ lưu 1 bản. Đọc lại bằng mmap (dùng page cache
+# của hệ điều hành, không copy vào heap Python); các mmap hay dùng được giữ mở trong LRU phía trước.
+# Session / cache render chỉ giữ handle (chuỗi ngắn). Vượt giới hạn đĩa thì xoá file ít dùng nhất.
+# Chỉ số LRU + giới hạn đĩa là của từng tiến trình, nên mỗi tiến trình dùng thư mục riêng (hậu tố pid):
+# tiến trình này dọn kho không xoá mất file mà tiến trình khác (Streamlit, API, ...) còn đang trỏ tới.
+# Đặt QR_OUTPUT_STORE_DIR thì thư mục đó cũng phải riêng cho 1 tiến trình. Thư mục mặc định bị xoá khi thoát.
+STORE_DIR = os.environ.get("QR_OUTPUT_STORE_DIR")
+MAX_DISK_BYTES = int(os.environ.get("QR_OUTPUT_STORE_MB", "512")) * 1024 * 1024
+MAX_OPEN_BYTES = int(os.environ.get("QR_OUTPUT_STORE_MEM_MB", "64")) * 1024 * 1024
+
+
+def default_dir():
+    return os.path.join(tempfile.gettempdir(), f"qrviet-render-store-{os.getpid()}")
+
+
+class OutputStore:
+    def __init__(self, directory=None, max_disk_bytes=MAX_DISK_BYTES, max_open_bytes=MAX_OPEN_BYTES):
+        directory = directory or STORE_DIR or default_dir()
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_open_bytes = max_open_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files = OrderedDict()  # handle -> số byte, theo thứ tự dùng gần nhất (LRU trên đĩa)
+        self._disk_bytes = 0
+        self._open = OrderedDict()  # handle -> mmap (LRU phía trước)
+        self._open_bytes = 0
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        # Nhận lại các file có sẵn trong thư mục (QR_OUTPUT_STORE_DIR cố định qua các lần chạy), cũ nhất đứng đầu
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                entries.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def path(self, handle):
+        return os.path.join(self.directory, os.path.basename(handle))
+
+    def put(self, data, ext="bin"):
+        # -> handle; ghi file tạm rồi rename để không bao giờ đọc phải file ghi dở
+        handle = f"{hashlib.sha256(data).hexdigest()[:40]}.{ext}"
+        with self._lock:
+            if handle in self._files and os.path.exists(self.path(handle)):
+                self._files.move_to_end(handle)
+                return handle
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self.path(handle))
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            self._disk_bytes += len(data) - self._files.pop(handle, 0)
+            self._files[handle] = len(data)
+            self._evict_disk(keep=handle)
+            return handle
+
+    def get(self, handle):
+        # -> memoryview chỉ đọc trên mmap, None nếu ảnh đã bị xoá khỏi kho
+        with self._lock:
+            mm = self._open.get(handle)
+            if mm is not None:
+                self._open.move_to_end(handle)
+                if handle in self._files:
+                    self._files.move_to_end(handle)
+                self.hits += 1
+                return memoryview(mm)
+            try:
+                with open(self.path(handle), "rb") as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # không còn file / file rỗng
+                self._forget(handle)
+                self.misses += 1
+                return None
+            self.misses += 1
+            if handle in self._files:
+                self._files.move_to_end(handle)
+            self._open[handle] = mm
+            self._open_bytes += len(mm)
+            while self._open_bytes > self.max_open_bytes and len(self._open) > 1:
+                _, old = self._open.popitem(last=False)
+                self._open_bytes -= len(old)
+                # Không close(): memoryview đang được dùng vẫn hợp lệ, mmap tự đóng khi hết tham chiếu
+            return memoryview(mm)
+
+    def read(self, handle):
+        view = self.get(handle)
+        return None if view is None else view.tobytes()
+
+    def __contains__(self, handle):
+        with self._lock:
+            return handle in self._files
+
+    def _forget(self, handle):
+        mm = self._open.pop(handle, None)
+        if mm is not None:
+            self._open_bytes -= len(mm)
+        self._disk_bytes -= self._files.pop(handle, 0)
+
+    def _evict_disk(self, keep=None):
+        while self._disk_bytes > self.max_disk_bytes and self._files:
+            handle = next(iter(self._files))
+            if handle == keep and len(self._files) == 1:
+                break
+            if handle == keep:
+                self._files.move_to_end(handle)
+                continue
+            self._forget(handle)
+            self.evictions += 1
+            try:
+                os.unlink(self.path(handle))  # mmap đang mở vẫn đọc được tới khi đóng
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for handle in list(self._files):
+                self._forget(handle)
+                try:
+                    os.unlink(self.path(handle))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "disk_bytes": self._disk_bytes, "max_disk_bytes": self.max_disk_bytes,
+                    "open": len(self._open), "open_bytes": self._open_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def _remove_dir(directory):
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def get_store():
+    # Tạo khi dùng lần đầu (không tạo thư mục chỉ vì import); tiến trình con (fork) tạo kho riêng của nó
+    global _store, _store_pid
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = OutputStore()
+            _store_pid = os.getpid()
+            if not STORE_DIR:
+                # Như atexit nhưng chạy cả ở tiến trình con của multiprocessing, và chỉ ở tiến trình đã tạo kho
+                Finalize(None, _remove_dir, args=(_store.directory,), exitpriority=0)
+        return _store
+
+
+def put(data, ext="bin"):
+    return get_store().put(data, ext)
+
+
+def get(handle):
+    return get_store().get(handle)
+
+
+def read(handle):
+    return get_store().read(handle)
+
+
+def path(handle):
+    return get_store().path(handle)
+
+
+def store_stats():
+    return get_store().stats()
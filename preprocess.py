@@ -0,0 +1,107 @@
+import io, math, os, threading
+import cv2, numpy as np
+from PIL import Image, ImageOps
+
+# ======== Tiền xử lý ảnh tải lên trước khi giải mã ========
+# Ảnh điện thoại 12-48 MP: JPEG được giải mã thẳng ở kích thước nhỏ (draft, grayscale),
+# áp dụng hướng EXIF, rồi thử giải mã trên tháp ảnh xám từ nhỏ đến lớn.
+# Nếu vẫn không đọc được: định vị vùng QR, cắt ROI và chỉ khi đó mới thử sharpen / adaptive threshold.
+MAX_SIDE = int(os.environ.get("QR_UPLOAD_MAX_SIDE", "2048"))
+PYRAMID_SIDES = (800, 1400)
+ROI_MARGIN = 0.15
+_local = threading.local()
+
+
+def load_gray(file, max_side=MAX_SIDE, frame=0):
+    # -> mảng uint8 xám, cạnh dài nhất <= max_side; frame: trang của TIFF nhiều trang
+    if isinstance(file, (bytes, bytearray)):
+        file = io.BytesIO(file)
+    with Image.open(file) as im:
+        if frame:
+            im.seek(frame)
+        if im.format == "JPEG":
+            # libjpeg giải mã ở 1/2, 1/4, 1/8 kích thước -> không bao giờ tạo ảnh full độ phân giải
+            s = max_side / max(im.size)
+            if s < 1:
+                im.draft("L", (math.ceil(im.width * s), math.ceil(im.height * s)))
+        im = ImageOps.exif_transpose(im)
+        gray = im.convert("L")
+    if max(gray.size) > max_side:
+        gray = gray.reduce(math.ceil(max(gray.size) / max_side))
+    return np.asarray(gray)
+
+
+def pyramid(gray, sides=PYRAMID_SIDES):
+    # Các tầng nhỏ -> lớn, tầng cuối là ảnh gốc (đã giới hạn MAX_SIDE)
+    levels = []
+    longest = max(gray.shape)
+    for side in sides:
+        if side < longest:
+            s = side / longest
+            levels.append(cv2.resize(gray, (round(gray.shape[1] * s), round(gray.shape[0] * s)),
+                                     interpolation=cv2.INTER_AREA))
+    levels.append(gray)
+    return levels
+
+
+def _detector():
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = _local.detector = cv2.QRCodeDetector()
+    return detector
+
+
+def locate_roi(levels, gray):
+    # Tìm 4 góc QR trên tầng nhỏ, quy đổi sang ảnh gốc và cắt kèm lề
+    for level in levels:
+        try:
+            found, points = _detector().detect(level)
+        except cv2.error:
+            continue
+        if not found or points is None:
+            continue
+        s = gray.shape[1] / level.shape[1]
+        pts = points.reshape(-1, 2) * s
+        x0, y0 = pts.min(axis=0)
+        x1, y1 = pts.max(axis=0)
+        m = max(x1 - x0, y1 - y0) * ROI_MARGIN
+        h, w = gray.shape
+        x0, y0 = max(0, int(x0 - m)), max(0, int(y0 - m))
+        x1, y1 = min(w, int(x1 + m)), min(h, int(y1 + m))
+        if x1 - x0 > 20 and y1 - y0 > 20:
+            return gray[y0:y1, x0:x1]
+    return None
+
+
+def sharpen(gray):
+    blur = cv2.GaussianBlur(gray, (0, 0), 3)
+    return cv2.addWeighted(gray, 1.5, blur, -0.5, 0)
+
+
+def threshold(gray):
+    block = max(3, (min(gray.shape) // 16) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 5)
+
+
+def decode_upload(file, decode):
+    # decode: hàm (ảnh xám) -> (text, method), vd decoders.decode_qr_auto
+    gray = load_gray(file)
+    levels = pyramid(gray)
+    for level in levels:
+        text, method = decode(level)
+        if text:
+            return text, method
+
+    # Dự phòng: làm trên ROI nếu định vị được, không thì trên tầng nhỏ nhất
+    roi = locate_roi(levels, gray)
+    targets = [roi] if roi is not None else [levels[0]]
+    if roi is not None:
+        text, method = decode(roi)
+        if text:
+            return text, method
+    for enhance in (sharpen, threshold):
+        for target in targets:
+            text, method = decode(enhance(target))
+            if text:
+                return text, method
+    return None, None
@@ -0,0 +1,121 @@
+import os, threading
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import qrcode
+from PIL import Image
+
+# ======== Ma trận QR dùng chung theo payload ========
+# Mã hoá (Reed–Solomon + chọn version/mask) chỉ chạy 1 lần cho mỗi payload,
+# kết quả là mảng bool (True = module đen, không có viền), chỉ đọc.
+MAX_MATRICES = int(os.environ.get("QR_MATRIX_CACHE_ITEMS", "256"))
+
+_matrices = OrderedDict()
+_inflight = {}  # payload -> Future của lần mã hoá đang chạy
+_lock = threading.Lock()
+
+
+def encode_matrix(data, error_correction=qrcode.constants.ERROR_CORRECT_H):
+    qr = qrcode.QRCode(error_correction=error_correction, border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def encode_matrix_fast(data):
+    # zxing-cpp (C++) mã hoá nhanh hơn qrcode ~20 lần, cùng mức sửa lỗi H; có thể chọn mask khác nên ma trận
+    # khác về điểm ảnh (vẫn quét ra đúng payload). Dùng cho in hàng loạt; thiếu zxing-cpp thì về encode_matrix.
+    try:
+        import zxingcpp
+    except ImportError:
+        return encode_matrix(data)
+    barcode = zxingcpp.create_barcode(data, zxingcpp.BarcodeFormat.QRCode, ec_level="H")
+    matrix = np.asarray(barcode.to_image(scale=1, add_quiet_zones=False)) < 128
+    matrix.flags.writeable = False
+    return matrix
+
+
+# "fast" = zxing-cpp (mask có thể khác bản PNG), "exact" = qrcode như ảnh PNG (từng điểm giống hệt)
+ENCODERS = {"fast": encode_matrix_fast, "exact": encode_matrix}
+
+
+def get_matrix(data):
+    # Nhận payload hoặc ma trận đã mã hoá sẵn (các create_qr_* dùng được cả hai)
+    if isinstance(data, np.ndarray):
+        return data
+    # Mã hoá ngoài lock: 6 mẫu render song song cùng payload chờ chung 1 lần mã hoá (Future trong _inflight),
+    # payload khác (session / request khác) mã hoá song song, không phải chờ nhau
+    with _lock:
+        matrix = _matrices.get(data)
+        if matrix is not None:
+            _matrices.move_to_end(data)
+            return matrix
+        pending = _inflight.get(data)
+        owner = pending is None
+        if owner:
+            pending = _inflight[data] = Future()
+    if not owner:
+        return pending.result()
+    try:
+        matrix = encode_matrix(data)
+    except BaseException as e:
+        with _lock:
+            del _inflight[data]
+        pending.set_exception(e)
+        raise
+    with _lock:
+        del _inflight[data]
+        _matrices[data] = matrix
+        while len(_matrices) > MAX_MATRICES:
+            _matrices.popitem(last=False)
+    pending.set_result(matrix)
+    return matrix
+
+
+def clear_cache():
+    with _lock:
+        _matrices.clear()
+
+
+# ======== Raster QR bằng NumPy, ra thẳng kích thước đích ========
+_LUT = np.array([[255, 255, 255, 255], [0, 0, 0, 255]], dtype=np.uint8)
+
+
+@lru_cache(maxsize=64)
+def _index_map(size, modules):
+    # Pixel i thuộc module i*modules//size: mỗi module rộng floor/ceil(size/modules) px, không nội suy
+    index = np.arange(size) * modules // size
+    index.flags.writeable = False
+    return index
+
+
+@lru_cache(maxsize=32)
+def _corner_mask(width, height, radius):
+    # True = pixel nằm ngoài góc bo (trong suốt), giống draw.rounded_rectangle trên mask
+    y, x = np.ogrid[:height, :width]
+    cx = np.clip(x, radius, width - 1 - radius)
+    cy = np.clip(y, radius, height - 1 - radius)
+    mask = (x - cx) ** 2 + (y - cy) ** 2 > radius ** 2
+    mask.flags.writeable = False
+    return mask
+
+
+def rasterize(matrix, width, height=None, border=0, radius=0):
+    # Trả về mảng RGBA (height, width, 4) uint8: module đen/nền trắng, viền border module, bo góc radius px
+    height = height or width
+    if border:
+        matrix = np.pad(matrix, border, constant_values=False)
+    rows = _index_map(height, matrix.shape[0])
+    cols = _index_map(width, matrix.shape[1])
+    # Dựng 1 dòng pixel cho mỗi hàng module rồi nhân dòng theo chiều cao (copy cả dòng, rất rẻ)
+    out = _LUT[matrix[:, cols].view(np.uint8)][rows]
+    if radius:
+        out[_corner_mask(width, height, radius)] = 0
+    return out
+
+
+def rasterize_image(matrix, width, height=None, border=0, radius=0):
+    return Image.fromarray(rasterize(matrix, width, height, border, radius), "RGBA")
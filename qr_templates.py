@@ -0,0 +1,242 @@
+from PIL import Image, ImageDraw
+import os
+import asset_cache
+import encoding
+import layouts
+import metrics
+import qr_matrix
+import text_fit
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
+LOGO_PATH = os.path.join(ASSETS_DIR, "logo.png")
+FONT_PATH = os.path.join(ASSETS_DIR, "Roboto-Bold.ttf")
+FONT_LABELPATH = os.path.join(ASSETS_DIR, "RobotoCondensed-Regular.ttf")
+BG_PATHFIX = os.path.join(ASSETS_DIR, "backgroundfix.png")
+BG_PATH = os.path.join(ASSETS_DIR, "background.png")
+BG_THAI_PATH = os.path.join(ASSETS_DIR, "backgroundthantai.png")
+BG_LOA_PATH = os.path.join(ASSETS_DIR, "backgroundloa.png")
+BG_TINGBOX_PATH = os.path.join(ASSETS_DIR, "tingbox.png")
+
+
+def _scaler(scale):
+    # Nhân toạ độ / cỡ chữ / kích thước theo tỉ lệ; scale=1 giữ nguyên số gốc
+    if scale == 1:
+        return lambda v: v
+    return lambda v: max(1, int(round(v * scale)))
+
+
+def warmup_assets(background=True):
+    # Nạp trước nền + logo vào cache dùng chung
+    return asset_cache.warmup([LOGO_PATH, BG_PATHFIX, BG_PATH, BG_THAI_PATH, BG_LOA_PATH, BG_TINGBOX_PATH],
+                              background=background)
+
+
+def generate_qr_with_logo(data, profile=None, scale=1):
+    sw = metrics.stages("qr_render_stage_seconds", template="qr1")
+    matrix = qr_matrix.get_matrix(data)
+    size = _scaler(scale)((matrix.shape[0] + 4) * 10)  # box_size=10, border=2
+    img = qr_matrix.rasterize_image(matrix, size, border=2)
+    sw.mark("qr")
+    logo = asset_cache.get_resized(LOGO_PATH, (int(img.width*0.15), int(img.height*0.15)))
+    img.paste(logo, ((img.width - logo.width) // 2, (img.height - logo.height) // 2), logo)
+    sw.mark("compose")
+    buf = encoding.encode(img, profile)
+    sw.mark("encode")
+    return buf
+def _text_block(qr_x, qr_y, qr_w, qr_h, acc_name, merchant_id, S, label_font_size, qr_tip_font_size, qr_tip_gap):
+    # Các dòng chữ của 1 khối QR (toạ độ khổ ngang): list (xy, text, font, màu RGBA)
+    font_label = text_fit.get_font(FONT_LABELPATH, label_font_size)
+    font_qr_tip = text_fit.get_font(FONT_PATH, qr_tip_font_size)
+    ops = []
+
+    # ===== Dòng Quét mã QR trên QR, căn giữa QR =====
+    qr_tip_text = "Quét mã QR để thanh toán"
+    x_tip = qr_x + (qr_w - text_fit.text_width(font_qr_tip, qr_tip_text)) // 2
+    ops.append(((x_tip, qr_y - qr_tip_gap), qr_tip_text, font_qr_tip, (0,102,102,255)))
+
+    # ===== Text dưới QR với nhãn =====
+    y_offset = qr_y + qr_h + S(20)  # 20 px dưới QR
+    for label, value, gap in (("Tên tài khoản:", acc_name and acc_name.upper(), S(35)),
+                              ("Số tài khoản:", merchant_id, 0)):
+        if not (value and value.strip()):
+            continue
+        ops.append(((qr_x + (qr_w - text_fit.text_width(font_label, label))//2, y_offset), label, font_label, (0,0,0,255)))
+        y_offset += label_font_size + S(15)
+        font, font_size = text_fit.fit_font(FONT_PATH, value, qr_w, S(40), S(20), S(2))
+        ops.append(((qr_x + (qr_w - text_fit.text_width(font, value))//2, y_offset), value, font, (0,102,102,255)))
+        y_offset += font_size + gap
+    return ops
+
+
+def create_qr_with_text(data, acc_name, merchant_id, border=100, usage_ratio=0.85,
+                        qr_tip_font_size=60, qr_tip_gap=100, profile=None, scale=1):
+    # Poster 2 QR đối xứng, xuất ra khổ dọc. Bố cục tính theo khổ ngang như thiết kế gốc,
+    # nhưng vẽ thẳng lên nền đã quay sẵn: khối QR + chữ dựng 1 lần, quay 1 lần rồi dán 2 chỗ.
+    sw = metrics.stages("qr_render_stage_seconds", template="qr2")
+    S = _scaler(scale)
+    border, qr_tip_font_size, qr_tip_gap = S(border), S(qr_tip_font_size), S(qr_tip_gap)
+
+    # ===== Nền + border, quay sẵn sang khổ dọc (cache, chỉ đọc) =====
+    bg = asset_cache.get_scaled(BG_PATHFIX, scale, copy=False)
+    land_w, land_h = bg.width + border*2, bg.height + border*2  # kích thước khổ ngang
+
+    def build_base():
+        portrait = Image.new("RGBA", (land_h, land_w), (255,255,255,255))
+        portrait.paste(bg.transpose(Image.Transpose.ROTATE_270), (border, border))
+        return portrait
+
+    base = asset_cache.get_layer(("qr2", scale, border), build_base).copy()
+    sw.mark("background")
+
+    # ===== Kích thước khối QR =====
+    half_w = bg.width // 2
+    qr_w = qr_h = int(half_w * usage_ratio)  # QR vuông
+    label_font_size = S(46)
+
+    # ===== QR + logo =====
+    qr_img = qr_matrix.rasterize_image(qr_matrix.get_matrix(data), qr_w, qr_h)
+    logo_src = asset_cache.get_image(LOGO_PATH, copy=False)
+    logo_w = int(qr_w * 0.2)
+    logo_h = int(logo_src.height / logo_src.width * logo_w)
+    logo_resized = asset_cache.get_resized(LOGO_PATH, (logo_w, logo_h))
+    qr_img.paste(logo_resized, ((qr_w - logo_w)//2, (qr_h - logo_h)//2), logo_resized)
+    sw.mark("qr")
+
+    # ===== Căn giữa khối theo chiều dọc (khổ ngang) =====
+    total_text_h = 0
+    for value in (acc_name and acc_name.upper(), merchant_id):
+        if value and value.strip():
+            _, font_size = text_fit.fit_font(FONT_PATH, value, qr_w, S(40), S(20), S(2))
+            total_text_h += label_font_size + S(20) + font_size
+    qr_x = border + (half_w - qr_w)//2  # khối bên trái; khối phải lệch half_w
+    qr_y = (land_h - (qr_h + total_text_h + qr_tip_gap))//2 + qr_tip_gap
+    ops = _text_block(qr_x, qr_y, qr_w, qr_h, acc_name, merchant_id, S, label_font_size, qr_tip_font_size,
+                      qr_tip_gap)
+
+    # ===== Mask từng dòng chữ (chỉ vùng bao của chữ), vẽ và quay 1 lần =====
+    stamps = []
+    for (x, y), text, font, fill in ops:
+        l, t, r, b = font.getbbox(text)
+        mask = Image.new("L", (r - l, b - t), 0)
+        ImageDraw.Draw(mask).text((-l, -t), text, fill=255, font=font)
+        stamps.append((x + l, y + t, y + b, fill, mask.transpose(Image.Transpose.ROTATE_270)))
+    sw.mark("text")
+    qr_rot = qr_img.transpose(Image.Transpose.ROTATE_270)
+
+    # ===== Dán 2 khối: điểm (x, y) khổ ngang -> (land_h - 1 - y, x) khổ dọc =====
+    for i in range(2):
+        dx = i * half_w
+        base.paste(qr_rot, (land_h - qr_y - qr_h, qr_x + dx), qr_rot)
+        for x, top, bottom, fill, mask in stamps:
+            base.paste(fill, (land_h - bottom, x + dx), mask)
+    sw.mark("compose")
+
+    # ===== Mã hoá ảnh theo hồ sơ =====
+    buf = encoding.encode(base, profile)
+    sw.mark("encode")
+    return buf
+
+# ======== Poster có nền (qr3 - qr6) khai báo bằng layout spec, xem layouts.py ========
+_STAFF_LINE = {
+    "type": "line", "when": ("staff_name", "staff_phone"), "x": 70, "y": ("bottom", 32 + 60),
+    "font": (FONT_LABELPATH, 34),
+    "parts": [("Cán bộ hỗ trợ: ", "#007C71"), ({"field": "staff_name"}, (255, 0, 0)),
+              (" - Liên hệ: ", "#007C71"), ({"field": "staff_phone"}, (255, 0, 0))],
+}
+_BRANCH = {"type": "text", "field": "branch_name", "transform": "branch", "x": 471, "y": 157,
+           "font": (FONT_PATH, 41), "fill": "#3C7471"}
+_STORE = {"type": "text", "field": "store", "transform": "upper", "x": "center", "y": 265,
+          "font": (FONT_PATH, 70), "fill": "#007C71"}
+
+
+def _account_stack(y, fill, after, anchor="bg", max_width=0.7, label_size=46, label_step=28 + 30,
+                   name_fit=(FONT_PATH, 48, 12, 1), account_fit=(FONT_PATH, 46, 12, 1)):
+    # Nhãn "Tên tài khoản:" / "Số tài khoản:" + giá trị, xếp dọc và căn giữa
+    return {
+        "type": "stack", "anchor": anchor, "y": y, "max_width": max_width,
+        "label_font": (FONT_LABELPATH, label_size), "label_fill": "black", "label_step": label_step,
+        "items": [
+            {"field": "name", "label": "Tên tài khoản:", "transform": "upper", "fit": name_fit, "fill": fill,
+             "after": after[0]},
+            {"field": "account", "label": "Số tài khoản:", "fit": account_fit, "fill": fill, "after": after[1]},
+        ],
+    }
+
+
+LAYOUTS = {
+    "qr3": {
+        "id": "qr3", "background": BG_PATH, "logo": LOGO_PATH,
+        "qr": {"x": 460, "y": 936, "w": 540, "h": 540, "logo": 100, "border": 2, "radius": 40},
+        "elements": [_account_stack(("qr", 130), "#007C71", (45, 55)), _BRANCH, _STAFF_LINE, _STORE],
+    },
+    "qr4": {
+        "id": "qr4", "background": BG_THAI_PATH, "logo": LOGO_PATH,
+        "qr": {"x": 793, "y": 725, "w": 480, "h": 520, "logo": 100},
+        "elements": [_account_stack(("qr", 360), (0, 102, 102), (45, 35)), _BRANCH, _STAFF_LINE, _STORE],
+    },
+    "qr5": {
+        "id": "qr5", "background": BG_LOA_PATH, "logo": LOGO_PATH,
+        "qr": {"x": 175, "y": 285, "w": 560, "h": 560, "logo": 100},
+        "elements": [
+            _account_stack(("qr", 20), (0, 102, 102), (15, 20), anchor="qr", max_width="qr", label_size=28,
+                           label_step=28 + 8, name_fit=(FONT_PATH, 32, 20, 2), account_fit=(FONT_PATH, 32, 20, 2)),
+            {"type": "text", "field": "staff_name", "x": 500, "y": 1138, "font": (FONT_LABELPATH, 32),
+             "fill": (0, 102, 102)},
+            {"type": "text", "field": "staff_phone", "x": 570, "y": 1175, "font": (FONT_LABELPATH, 32),
+             "fill": (0, 102, 102)},
+        ],
+    },
+    "qr6": {
+        "id": "qr6", "background": BG_TINGBOX_PATH, "logo": LOGO_PATH,
+        "qr": {"x": 202, "y": 395, "w": 460, "h": 460, "logo": 100},
+        "elements": [
+            {"type": "text", "field": "account", "fit": (FONT_PATH, 32, 12, 1), "max_width": "qr",
+             "x": "qr_center", "y": ("qr", 20), "fill": (0, 102, 102)},
+        ],
+    },
+}
+
+
+def create_qr_with_background(data, acc_name, merchant_id, store_name, staff_name="", staff_phone="", branch_name="", profile=None, scale=1):
+    return layouts.render(LAYOUTS["qr3"], {"data": data, "name": acc_name, "account": merchant_id, "store": store_name,
+                                           "staff_name": staff_name, "staff_phone": staff_phone,
+                                           "branch_name": branch_name}, profile, scale)
+
+
+def create_qr_with_background_thantai(data, acc_name, merchant_id, store_name, staff_name="", staff_phone="", branch_name="", profile=None, scale=1):
+    return layouts.render(LAYOUTS["qr4"], {"data": data, "name": acc_name, "account": merchant_id, "store": store_name,
+                                           "staff_name": staff_name, "staff_phone": staff_phone,
+                                           "branch_name": branch_name}, profile, scale)
+
+
+def create_qr_with_background_loa(data, acc_name, merchant_id, store_name="",
+                                  staff_name="", staff_phone="", profile=None, scale=1):
+    return layouts.render(LAYOUTS["qr5"], {"data": data, "name": acc_name, "account": merchant_id,
+                                           "staff_name": staff_name, "staff_phone": staff_phone}, profile, scale)
+
+
+def create_qr_tingbox(data, merchant_id, profile=None, scale=1):
+    return layouts.render(LAYOUTS["qr6"], {"data": data, "account": merchant_id}, profile, scale)
+
+# ======== Danh sách mẫu (id cũng là key trong st.session_state) ========
+# inputs: dict gồm data, name, account, store, staff_name, staff_phone, branch_name
+TEMPLATES = {
+    "qr1": lambda i, p, k: generate_qr_with_logo(i["data"], profile=p, scale=k),
+    "qr2": lambda i, p, k: create_qr_with_text(i["data"], i["name"], i["account"], profile=p, scale=k),
+}
+# Mẫu khai báo bằng layout spec: thêm spec vào LAYOUTS là đủ, không cần hàm riêng
+TEMPLATES.update({tid: (lambda i, p, k, spec=spec: layouts.render(spec, i, p, k)) for tid, spec in LAYOUTS.items()})
+TEMPLATE_IDS = tuple(TEMPLATES)
+
+# Các input mà từng mẫu thực sự dùng (để cache không bị lệch khi đổi trường không liên quan)
+TEMPLATE_FIELDS = {
+    "qr1": ("data",),
+    "qr2": ("data", "name", "account"),
+}
+TEMPLATE_FIELDS.update({tid: layouts.fields(spec) for tid, spec in LAYOUTS.items()})
+
+
+def render_template(template_id, inputs, profile=None, scale=1):
+    # Hàm cấp module để gửi được sang process pool (pickle theo tên); scale < 1 cho bản xem trước
+    with metrics.span("qr_render_seconds", template=template_id):
+        return TEMPLATES[template_id](inputs, profile, scale)
@@ -0,0 +1,140 @@
+import io, os, time, json, hashlib, threading
+from collections import OrderedDict
+import encoding
+import layouts
+import output_store
+import qr_templates
+import render_executor
+
+# ======== Cache kết quả render (dùng chung mọi session) ========
+# Key = template id + hồ sơ mã hoá + tỉ lệ + hash các input mà mẫu đó thực sự dùng; hết hạn theo TTL, giới hạn số ảnh (LRU).
+# Cache chỉ giữ handle của output_store (ảnh nằm trên đĩa, đọc qua mmap), không giữ bytes ảnh trong RAM.
+MAX_ITEMS = int(os.environ.get("QR_RENDER_CACHE_ITEMS", "64"))
+TTL_SECONDS = float(os.environ.get("QR_RENDER_CACHE_TTL", "3600"))
+
+
+class RenderCache:
+    def __init__(self, max_items=MAX_ITEMS, ttl=TTL_SECONDS):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, data):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, data)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"items": len(self._items), "max_items": self.max_items, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_cache = RenderCache()
+
+
+def render_key(template_id, inputs, profile=None, scale=1):
+    fields = {f: inputs.get(f, "") for f in qr_templates.TEMPLATE_FIELDS[template_id]}
+    digest = hashlib.sha1(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    return f"{template_id}:{profile or encoding.DEFAULT_PROFILE}:{scale:g}:{digest}"
+
+
+def lookup_handle(template_id, inputs, profile=None, scale=1):
+    # -> handle trong output_store, None nếu chưa render hoặc file đã bị kho xoá
+    handle = _cache.get(render_key(template_id, inputs, profile, scale))
+    store = output_store.get_store()
+    if handle is None or handle not in store or not os.path.exists(store.path(handle)):
+        return None
+    return handle
+
+
+def lookup(template_id, inputs, profile=None, scale=1):
+    # -> memoryview chỉ đọc trên ảnh đã render, None nếu chưa có
+    handle = lookup_handle(template_id, inputs, profile, scale)
+    return None if handle is None else output_store.get(handle)
+
+
+def store(template_id, inputs, data, profile=None, scale=1):
+    handle = output_store.put(data, encoding.extension(profile))
+    _cache.put(render_key(template_id, inputs, profile, scale), handle)
+    return handle
+
+
+def get_or_render_handles(template_ids, inputs, profile=None, scale=1, session="default", on_wait=None):
+    # Trả về (template_id, handle, lỗi); mẫu đã có trong kho trả ngay, mẫu thiếu render song song
+    # (qua scheduler: session dùng để xếp hàng công bằng, on_wait(vị trí) khi phải chờ)
+    missing = []
+    for tid in template_ids:
+        handle = lookup_handle(tid, inputs, profile, scale)
+        if handle is None:
+            missing.append(tid)
+        else:
+            yield tid, handle, None
+    for tid, buf, err in render_executor.render_many(missing, inputs, profile, scale, session, on_wait):
+        yield tid, (None if err is not None else store(tid, inputs, buf.getbuffer(), profile, scale)), err
+
+
+def get_or_render_many(template_ids, inputs, profile=None, scale=1):
+    # Như get_or_render_handles nhưng trả về BytesIO (đọc lại từ kho)
+    for tid, handle, err in get_or_render_handles(template_ids, inputs, profile, scale):
+        if err is None:
+            data = output_store.read(handle)
+            if data is None:
+                try:
+                    data = get_or_render_bytes(tid, inputs, profile, scale)
+                except Exception as e:
+                    err = e
+        yield tid, (None if err is not None else io.BytesIO(data)), err
+
+
+def get_or_render(template_id, inputs, profile=None, scale=1):
+    for _, buf, err in get_or_render_many([template_id], inputs, profile, scale):
+        if err is not None:
+            raise err
+        return buf
+
+
+def get_or_render_handle(template_id, inputs, profile=None, scale=1, session="default", on_wait=None):
+    for _, handle, err in get_or_render_handles([template_id], inputs, profile, scale, session, on_wait):
+        if err is not None:
+            raise err
+        return handle
+
+
+def get_or_render_bytes(template_id, inputs, profile=None, scale=1, session="default", on_wait=None):
+    # -> bytes ảnh. File có thể bị xoá khỏi kho giữa lúc tra và lúc đọc: read() trả None thì kho đã quên handle,
+    # lần tra sau là miss và được render lại
+    for _ in range(2):
+        data = output_store.read(get_or_render_handle(template_id, inputs, profile, scale, session, on_wait))
+        if data is not None:
+            return data
+    raise RuntimeError(f"Không đọc được ảnh {template_id} vừa render từ kho")
+
+
+def cache_stats():
+    return dict(_cache.stats(), store=output_store.store_stats(), canvases=layouts.canvas_cache_stats())
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,61 @@
+import os, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import qr_templates
+import scheduler
+
+# ======== Bộ thực thi render dùng chung ========
+# QR_RENDER_EXECUTOR=thread (mặc định): Pillow nhả GIL khi paste/resize/encode nên thread là đủ.
+# QR_RENDER_EXECUTOR=process: dùng process pool (spawn) khi máy nhiều core.
+EXECUTOR_KIND = os.environ.get("QR_RENDER_EXECUTOR", "thread").strip().lower()
+MAX_WORKERS = int(os.environ.get("QR_RENDER_WORKERS", "0")) or min(len(qr_templates.TEMPLATE_IDS), os.cpu_count() or 1)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            if EXECUTOR_KIND == "process":
+                _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="qr-render")
+        return _executor
+
+
+def shutdown(wait=True):
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def render_many(template_ids, inputs, profile=None, scale=1, session="default", on_wait=None):
+    # Render song song, trả về (template_id, buf, lỗi) theo thứ tự mẫu nào xong trước.
+    # Mỗi mẫu phải được scheduler cho chạy (chờ ở thread gọi, on_wait(vị trí) báo vị trí trong hàng),
+    # phần bộ nhớ được trả lại ngay khi mẫu đó render xong.
+    executor = get_executor()
+    futures = {}
+    busy = None
+    for tid in template_ids:
+        if busy is None:
+            try:
+                ticket = scheduler.acquire(tid, scale, session, on_wait)
+            except scheduler.SchedulerBusy as e:
+                busy = e
+        if busy is not None:
+            yield tid, None, busy
+            continue
+        fut = executor.submit(qr_templates.render_template, tid, inputs, profile, scale)
+        fut.add_done_callback(lambda _, ticket=ticket: scheduler.release(ticket))
+        futures[fut] = tid
+    for fut in as_completed(futures):
+        tid = futures[fut]
+        try:
+            yield tid, fut.result(), None
+        except Exception as e:
+            yield tid, None, e
+
@@ -0,0 +1,190 @@
+import os, threading, time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from PIL import Image
+import qr_templates
+
+# ======== Điều phối render toàn tiến trình: giới hạn bộ nhớ + số job, xếp hàng công bằng giữa các session ========
+# Mỗi job render được ước lượng bộ nhớ từ kích thước ảnh nền của mẫu (RGBA, theo tỉ lệ) và chỉ được chạy khi
+#   số job đang chạy < QR_SCHED_MAX_JOBS  và  tổng bộ nhớ ước lượng <= QR_SCHED_MEM_MB
+# (luôn cho chạy ít nhất 1 job để job lớn hơn ngân sách không bị kẹt mãi).
+# Job chờ nằm trong hàng đợi riêng của từng session, cấp lần lượt xoay vòng giữa các session,
+# nên 1 người bấm nhiều mẫu không chặn người khác. Chờ quá QR_SCHED_TIMEOUT giây -> SchedulerBusy.
+MAX_BYTES = int(os.environ.get("QR_SCHED_MEM_MB", "192")) * 1024 * 1024
+MAX_JOBS = int(os.environ.get("QR_SCHED_MAX_JOBS", "0")) or max(2, os.cpu_count() or 1)
+TIMEOUT = float(os.environ.get("QR_SCHED_TIMEOUT", "60"))
+# Số bản RGBA cỡ ảnh nền cùng sống trong 1 lần render: bản copy của nền + bộ đệm lúc mã hoá (RGB/palette/nén)
+RENDER_COPIES = 2.5
+QR1_SIDE = 450  # qr1 không có nền: ~ (41 module + 4) * 10 px
+
+
+class SchedulerBusy(RuntimeError):
+    pass
+
+
+@lru_cache(maxsize=32)
+def _image_size(path):
+    # Chỉ đọc header, không giải mã ảnh
+    with Image.open(path) as im:
+        return im.size
+
+
+def estimate_bytes(template_id, scale=1):
+    # Bộ nhớ đỉnh ước lượng của 1 lần render (byte); lớp nền dùng chung trong asset_cache không tính vào đây
+    if template_id == "qr1":
+        w = h = QR1_SIDE
+    elif template_id == "qr2":
+        bw, bh = _image_size(qr_templates.BG_PATHFIX)
+        w, h = bw + 200, bh + 200  # border 100 px mỗi phía
+    else:
+        w, h = _image_size(qr_templates.LAYOUTS[template_id]["background"])
+    return int(w * h * scale * scale * 4 * RENDER_COPIES)
+
+
+class Ticket:
+    __slots__ = ("cost", "session", "granted", "created", "started")
+
+    def __init__(self, cost, session):
+        self.cost = cost
+        self.session = session
+        self.granted = False
+        self.created = time.monotonic()
+        self.started = None
+
+
+class Scheduler:
+    def __init__(self, max_bytes=MAX_BYTES, max_jobs=MAX_JOBS, timeout=TIMEOUT):
+        self.max_bytes = max_bytes
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.used = 0
+        self.running = 0
+        self.admitted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self._queues = OrderedDict()  # session -> deque Ticket; thứ tự = lượt xoay vòng
+        self._cond = threading.Condition()
+
+    def _fits(self, cost):
+        return self.running == 0 or (self.running < self.max_jobs and self.used + cost <= self.max_bytes)
+
+    def _start(self, ticket):
+        ticket.granted = True
+        ticket.started = time.monotonic()
+        self.used += ticket.cost
+        self.running += 1
+        self.admitted += 1
+        self.wait_time += ticket.started - ticket.created
+
+    def _order(self):
+        # Thứ tự sẽ được cấp: lượt 1 lấy job đầu của mỗi session, lượt 2 lấy job thứ 2, ...
+        queues = list(self._queues.values())
+        out = []
+        for k in range(max((len(q) for q in queues), default=0)):
+            out += [q[k] for q in queues if k < len(q)]
+        return out
+
+    def _grant(self):
+        # Cấp theo đúng thứ tự xoay vòng; job đầu chưa vừa thì dừng (không cho job nhỏ chen lên, job lớn không bị bỏ đói)
+        while self._queues:
+            session, queue = next(iter(self._queues.items()))
+            if not self._fits(queue[0].cost):
+                break
+            self._start(queue.popleft())
+            if queue:
+                self._queues.move_to_end(session)
+            else:
+                del self._queues[session]
+        self._cond.notify_all()
+
+    def _remove(self, ticket):
+        queue = self._queues.get(ticket.session)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.session]
+
+    def position(self, ticket):
+        # 1 = job tiếp theo được chạy; 0 = đã được chạy
+        with self._cond:
+            if ticket.granted:
+                return 0
+            return self._order().index(ticket) + 1
+
+    def acquire(self, cost, session="default", on_wait=None, timeout=None):
+        # Chặn tới khi được chạy -> Ticket (nhớ release). on_wait(vị trí) được gọi mỗi khi vị trí thay đổi
+        ticket = Ticket(cost, session)
+        timeout = self.timeout if timeout is None else timeout
+        with self._cond:
+            if not self._queues and self._fits(cost):
+                self._start(ticket)
+                return ticket
+            self._queues.setdefault(session, deque()).append(ticket)
+            self.queued += 1
+            self._grant()
+            deadline = time.monotonic() + timeout
+            last = None
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self.timeouts += 1
+                    self._grant()
+                    raise SchedulerBusy(f"Máy chủ đang bận, đã chờ {timeout:g}s")
+                pos = self._order().index(ticket) + 1
+                if on_wait is not None and pos != last:
+                    last = pos
+                    self._cond.release()  # callback (vd cập nhật giao diện) chạy ngoài lock
+                    try:
+                        on_wait(pos)
+                    finally:
+                        self._cond.acquire()
+                    continue
+                self._cond.wait(min(remaining, 0.5))
+            return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            if not ticket.granted:
+                return
+            ticket.granted = False
+            self.used -= ticket.cost
+            self.running -= 1
+            self._grant()
+
+    @contextmanager
+    def admit(self, cost, session="default", on_wait=None, timeout=None):
+        ticket = self.acquire(cost, session, on_wait, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._cond:
+            return {"running": self.running, "used_bytes": self.used, "max_bytes": self.max_bytes,
+                    "max_jobs": self.max_jobs, "waiting": sum(len(q) for q in self._queues.values()),
+                    "waiting_sessions": len(self._queues), "admitted": self.admitted, "queued": self.queued,
+                    "timeouts": self.timeouts,
+                    "avg_wait_ms": round(self.wait_time / self.admitted * 1000, 1) if self.admitted else 0.0}
+
+
+scheduler = Scheduler()
+
+
+def acquire(template_id, scale=1, session="default", on_wait=None, timeout=None):
+    return scheduler.acquire(estimate_bytes(template_id, scale), session, on_wait, timeout)
+
+
+def release(ticket):
+    scheduler.release(ticket)
+
+
+def admit(template_id, scale=1, session="default", on_wait=None, timeout=None):
+    return scheduler.admit(estimate_bytes(template_id, scale), session, on_wait, timeout)
+
+
+def scheduler_stats():
+    return scheduler.stats()
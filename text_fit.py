@@ -0,0 +1,44 @@
+from functools import lru_cache
+from PIL import ImageFont
+
+# ======== Pool font + tìm cỡ chữ vừa khung ========
+# FreeTypeFont được tạo 1 lần cho mỗi (path, size) và dùng chung toàn tiến trình.
+
+
+@lru_cache(maxsize=256)
+def get_font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=8192)
+def text_width(font, text):
+    # Tương đương draw.textbbox((0, 0), text, font=font)[2]
+    return font.getbbox(text)[2]
+
+
+def _font_sizes(base_size, min_size, step):
+    # Cùng dãy cỡ chữ mà vòng lặp cũ đi qua: base, base-step, ... cho tới khi <= min_size
+    sizes = [base_size]
+    while sizes[-1] > min_size:
+        sizes.append(sizes[-1] - step)
+    return sizes
+
+
+@lru_cache(maxsize=4096)
+def fit_font(path, text, max_width, base_size, min_size=12, step=1):
+    # Tìm nhị phân cỡ chữ lớn nhất có chiều rộng <= max_width, trả về (font, size)
+    sizes = _font_sizes(base_size, min_size, step)
+    lo, hi = 0, len(sizes) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if text_width(get_font(path, sizes[mid]), text) <= max_width:
+            hi = mid
+        else:
+            lo = mid + 1
+    return get_font(path, sizes[lo]), sizes[lo]
+
+
+def clear_caches():
+    fit_font.cache_clear()
+    text_width.cache_clear()
+    get_font.cache_clear()
@@ -0,0 +1,399 @@
+import argparse, base64, html, multiprocessing, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from PIL import Image, ImageColor
+import layouts
+import qr_matrix
+import qr_templates
+
+# ======== Xuất vector (PDF / SVG) + dàn trang in hàng loạt (n-up trên khổ A4/A3) ========
+# Bố cục lấy đúng từ bản raster: mẫu layout spec (qr3-qr6) chạy lại chính các hàm vẽ của layouts.py
+# với 1 "bút ghi" thay cho ImageDraw, nên toạ độ/cỡ chữ/co chữ giống hệt ảnh PNG.
+#   - QR: mỗi dãy module đen liền nhau trên 1 hàng là 1 hình chữ nhật trong 1 path duy nhất
+#   - chữ: font TrueType nhúng (subset) - Roboto / Roboto Condensed / DejaVu theo font của mẫu
+#   - nền + phần chữ tĩnh: 1 Form XObject cho mỗi (mẫu, trường tuỳ chọn có mặt), ảnh nền/logo chỉ nhúng 1 lần
+# qr2 (2 QR xoay ngang) chưa có bản vector.
+# Chạy: python vector_output.py merchants.csv -o stickers.pdf -t qr6 --page A4 [--width-mm 63]
+MM = 72 / 25.4
+PAGE_SIZES = {"A4": (210 * MM, 297 * MM), "A3": (297 * MM, 420 * MM)}
+# Chiều rộng mặc định (mm) của 1 ô khi dàn trang
+DEFAULT_WIDTH_MM = {"qr1": 40, "qr6": 63}
+FALLBACK_WIDTH_MM = 95
+VECTOR_TEMPLATES = ("qr1",) + tuple(qr_templates.LAYOUTS)
+# Mã hoá QR khi dàn trang, xem qr_matrix.ENCODERS
+ENCODERS = qr_matrix.ENCODERS
+
+
+class _Recorder:
+    # Đứng thay ImageDraw khi chạy các hàm vẽ của layouts: chỉ ghi lại lệnh vẽ chữ
+    def __init__(self):
+        self.ops = []
+
+    def text(self, xy, text, fill=None, font=None):
+        if text:
+            self.ops.append((xy[0], xy[1], text, font, fill))
+
+
+@lru_cache(maxsize=32)
+def _image_size(path):
+    with Image.open(path) as im:
+        return im.size
+
+
+def _rgb(fill):
+    # "#007C71" / "black" / (r, g, b) -> (r, g, b) 0-1
+    rgb = ImageColor.getrgb(fill) if isinstance(fill, str) else fill
+    return tuple(c / 255 for c in rgb[:3])
+
+
+def scene(template_id, inputs, matrix=None):
+    # Mô tả 1 mẫu ở toạ độ pixel gốc (scale=1, gốc trên-trái): dict size, background, qr, logo,
+    # static/dynamic (list lệnh chữ), key (mẫu + các trường tuỳ chọn có mặt, dùng cho Form dùng chung)
+    # matrix: ma trận QR đã mã hoá sẵn (vd từ process pool), None thì tự mã hoá
+    if matrix is None:
+        matrix = qr_matrix.get_matrix(inputs["data"])
+    if template_id == "qr1":
+        size = (matrix.shape[0] + 4) * 10  # như generate_qr_with_logo: box_size=10, border=2
+        logo = (int(size * 0.15), int(size * 0.15))
+        return {"key": ("qr1",), "size": (size, size), "background": None,
+                "qr": {"matrix": matrix, "box": (0, 0, size, size), "border": 2, "radius": 0},
+                "logo": (qr_templates.LOGO_PATH, (size - logo[0]) // 2, (size - logo[1]) // 2) + logo,
+                "static": [], "dynamic": []}
+    if template_id not in qr_templates.LAYOUTS:
+        raise ValueError(f"Mẫu {template_id} chưa có bản vector (hỗ trợ: {', '.join(VECTOR_TEMPLATES)})")
+    spec = qr_templates.LAYOUTS[template_id]
+    size = _image_size(spec["background"])
+    f = layouts._Frame(spec, size, 1)
+    ops = {}
+    for phase in ("static", "dynamic"):
+        draw = _Recorder()
+        for el in spec["elements"]:
+            layouts.DRAWERS[el["type"]](draw, el, inputs, f, phase)
+        ops[phase] = draw.ops
+    qr = spec["qr"]
+    logo = qr["logo"]
+    flags = tuple(layouts._present(inputs, field) for field in layouts._optional(spec))
+    return {"key": (template_id,) + flags, "size": size, "background": spec["background"],
+            "qr": {"matrix": matrix, "box": (f.qr_x, f.qr_y, f.qr_w, f.qr_h),
+                   "border": qr.get("border", 0), "radius": qr.get("radius", 0)},
+            "logo": (spec["logo"], f.qr_x + (f.qr_w - logo) // 2, f.qr_y + (f.qr_h - logo) // 2, logo, logo),
+            "static": ops["static"], "dynamic": ops["dynamic"]}
+
+
+def module_runs(matrix, border=0):
+    # Các dãy module đen liền nhau theo hàng: (cột, hàng, độ dài), toạ độ tính cả viền border
+    for r, row in enumerate(matrix.tolist()):
+        c, n = 0, len(row)
+        while c < n:
+            if row[c]:
+                start = c
+                while c < n and row[c]:
+                    c += 1
+                yield start + border, r + border, c - start
+            else:
+                c += 1
+
+
+# ===== PDF (reportlab) =====
+_registered = {}
+
+
+def _pdf_font(font):
+    # PIL FreeTypeFont -> tên font reportlab (đăng ký + nhúng subset ở lần đầu)
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    name = _registered.get(font.path)
+    if name is None:
+        name = os.path.splitext(os.path.basename(font.path))[0]
+        pdfmetrics.registerFont(TTFont(name, font.path))
+        _registered[font.path] = name
+    return name
+
+
+def _pdf_text(canvas, ops, height):
+    for x, y, text, font, fill in ops:
+        canvas.setFillColorRGB(*_rgb(fill))
+        canvas.setFont(_pdf_font(font), font.size)
+        canvas.drawString(x, height - y - font.getmetrics()[0], text)  # PIL vẽ từ đỉnh chữ, PDF từ baseline
+
+
+def _pdf_static(canvas, sc):
+    # Nền + chữ tĩnh thành Form XObject dùng chung, trả về tên form
+    name = "tpl_" + "_".join(str(int(k)) if isinstance(k, bool) else k for k in sc["key"])
+    if not canvas.hasForm(name):
+        w, h = sc["size"]
+        canvas.beginForm(name, 0, 0, w, h)
+        if sc["background"]:
+            canvas.drawImage(sc["background"], 0, 0, w, h, mask="auto")
+        else:
+            canvas.setFillColorRGB(1, 1, 1)
+            canvas.rect(0, 0, w, h, stroke=0, fill=1)
+        _pdf_text(canvas, sc["static"], h)
+        canvas.endForm()
+    return name
+
+
+def draw_pdf(canvas, sc, x, y, width):
+    # Vẽ 1 mẫu lên canvas reportlab: góc dưới-trái (x, y), rộng width điểm, giữ tỉ lệ
+    w, h = sc["size"]
+    form = _pdf_static(canvas, sc)
+    canvas.saveState()
+    canvas.translate(x, y)
+    canvas.scale(width / w, width / w)
+    canvas.doForm(form)
+
+    # ===== QR: nền trắng (bo góc nếu có) + 1 path cho mọi module đen =====
+    qr = sc["qr"]
+    qx, qy, qw, qh = qr["box"]
+    modules = qr["matrix"].shape[0] + 2 * qr["border"]
+    mw, mh = qw / modules, qh / modules
+    top = h - qy
+    canvas.saveState()
+    clip = canvas.beginPath()
+    if qr["radius"]:
+        clip.roundRect(qx, top - qh, qw, qh, qr["radius"])
+    else:
+        clip.rect(qx, top - qh, qw, qh)
+    canvas.clipPath(clip, stroke=0, fill=0)
+    canvas.setFillColorRGB(1, 1, 1)
+    canvas.rect(qx, top - qh, qw, qh, stroke=0, fill=1)
+    # Hệ toạ độ 1 đơn vị = 1 module, trục y đi xuống: path chỉ gồm số nguyên, ghi thẳng toán tử PDF
+    canvas.translate(qx, top)
+    canvas.scale(mw, -mh)
+    canvas.setFillColorRGB(0, 0, 0)
+    canvas.addLiteral("".join(f"{c} {r} {n} 1 re\n" for c, r, n in module_runs(qr["matrix"], qr["border"])) + "f")
+    canvas.restoreState()
+
+    logo_path, lx, ly, lw, lh = sc["logo"]
+    canvas.drawImage(logo_path, lx, h - ly - lh, lw, lh, mask="auto")
+    _pdf_text(canvas, sc["dynamic"], h)
+    canvas.restoreState()
+
+
+def render_pdf(template_id, inputs, output, width_mm=None):
+    # 1 mẫu -> 1 trang PDF đúng kích thước mẫu (rộng width_mm, mặc định theo pixel ở 300 dpi)
+    from reportlab.pdfgen.canvas import Canvas
+    sc = scene(template_id, inputs)
+    w, h = sc["size"]
+    width = width_mm * MM if width_mm else w * 72 / 300
+    canvas = Canvas(output, pagesize=(width, width * h / w), pageCompression=1)
+    draw_pdf(canvas, sc, 0, 0, width)
+    canvas.showPage()
+    canvas.save()
+
+
+# ===== SVG =====
+@lru_cache(maxsize=16)
+def _data_uri(path):
+    mime = "image/png" if path.lower().endswith(".png") else "image/jpeg"
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+
+@lru_cache(maxsize=8)
+def _font_face(path):
+    family = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "rb") as f:
+        data = base64.b64encode(f.read()).decode()
+    return family, f"@font-face{{font-family:'{family}';src:url(data:font/ttf;base64,{data}) format('truetype');}}"
+
+
+def _fmt(v):
+    return f"{v:.2f}".rstrip("0").rstrip(".")
+
+
+def render_svg(template_id, inputs, embed_fonts=True):
+    # 1 mẫu -> chuỗi SVG (đơn vị = pixel gốc); ảnh nền/logo và font nhúng base64
+    sc = scene(template_id, inputs)
+    w, h = sc["size"]
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+           f'width="{w}" height="{h}" viewBox="0 0 {w} {h}">']
+    ops = sc["static"] + sc["dynamic"]
+    faces = {}
+    for *_, font, _ in ops:
+        if font.path not in faces:
+            faces[font.path] = _font_face(font.path) if embed_fonts else (
+                os.path.splitext(os.path.basename(font.path))[0], "")
+    if embed_fonts and faces:
+        out.append(f"<style>{''.join(css for _, css in faces.values())}</style>")
+    if sc["background"]:
+        out.append(f'<image width="{w}" height="{h}" xlink:href="{_data_uri(sc["background"])}"/>')
+    else:
+        out.append(f'<rect width="{w}" height="{h}" fill="#fff"/>')
+
+    qr = sc["qr"]
+    qx, qy, qw, qh = qr["box"]
+    modules = qr["matrix"].shape[0] + 2 * qr["border"]
+    out.append(f'<rect x="{qx}" y="{qy}" width="{qw}" height="{qh}" rx="{qr["radius"]}" fill="#fff"/>')
+    d = "".join(f"M{c} {r}h{n}v1h-{n}z" for c, r, n in module_runs(qr["matrix"], qr["border"]))
+    out.append(f'<path transform="translate({qx} {qy}) scale({_fmt(qw / modules)} {_fmt(qh / modules)})" '
+               f'd="{d}" fill="#000"/>')
+    logo_path, lx, ly, lw, lh = sc["logo"]
+    out.append(f'<image x="{lx}" y="{ly}" width="{lw}" height="{lh}" xlink:href="{_data_uri(logo_path)}"/>')
+
+    for x, y, text, font, fill in ops:
+        r, g, b = (round(c * 255) for c in _rgb(fill))
+        out.append(f'<text x="{x}" y="{y + font.getmetrics()[0]}" font-family="\'{faces[font.path][0]}\'" '
+                   f'font-size="{font.size}" fill="#{r:02x}{g:02x}{b:02x}" xml:space="preserve">'
+                   f'{html.escape(text)}</text>')
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+# ===== Dàn trang in hàng loạt =====
+def grid(template_id, page="A4", width_mm=None, margin_mm=8, gap_mm=4):
+    # -> (cột, hàng, rộng ô, cao ô, x0, y0, khoảng cách) theo điểm PDF; lưới được căn giữa trang
+    page_w, page_h = PAGE_SIZES[page]
+    if template_id == "qr1":
+        aspect = 1.0
+    else:
+        w, h = _image_size(qr_templates.LAYOUTS[template_id]["background"])
+        aspect = h / w
+    cell_w = (width_mm or DEFAULT_WIDTH_MM.get(template_id, FALLBACK_WIDTH_MM)) * MM
+    cell_h = cell_w * aspect
+    margin, gap = margin_mm * MM, gap_mm * MM
+    cols = int((page_w - 2 * margin + gap) // (cell_w + gap))
+    rows = int((page_h - 2 * margin + gap) // (cell_h + gap))
+    if cols < 1 or rows < 1:
+        raise ValueError(f"Ô {cell_w / MM:.0f} mm không vừa khổ {page}")
+    x0 = (page_w - cols * cell_w - (cols - 1) * gap) / 2
+    y0 = (page_h - rows * cell_h - (rows - 1) * gap) / 2
+    return cols, rows, cell_w, cell_h, x0, y0, gap
+
+
+def _cut_marks(canvas, x, y, w, h, length=3 * MM):
+    # Dấu cắt mảnh ở 4 góc ô
+    canvas.setStrokeColorRGB(0.6, 0.6, 0.6)
+    canvas.setLineWidth(0.25)
+    for cx, dx in ((x, -1), (x + w, 1)):
+        for cy, dy in ((y, -1), (y + h, 1)):
+            canvas.line(cx, cy, cx + dx * length, cy)
+            canvas.line(cx, cy, cx, cy + dy * length)
+
+
+def _with_matrices(items, encode, workers, batch_size=64):
+    # -> (inputs hoặc lỗi, ma trận QR); workers > 1: mã hoá QR (phần tốn CPU nhất) trên
+    # process pool theo lô, luôn có sẵn lô kế tiếp đang mã hoá trong lúc vẽ lô hiện tại
+    if workers <= 1:
+        for inputs in items:
+            yield inputs, None if isinstance(inputs, Exception) else encode(inputs["data"])
+        return
+
+    def batches():
+        batch = []
+        for inputs in items:
+            batch.append(inputs)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        def submit(batch):
+            datas = [i["data"] for i in batch if not isinstance(i, Exception)]
+            return batch, pool.map(encode, datas, chunksize=max(1, len(datas) // workers))
+
+        pending = None
+        for batch in batches():
+            current, pending = pending, submit(batch)
+            if current is not None:
+                yield from _pair(*current)
+        if pending is not None:
+            yield from _pair(*pending)
+
+
+def _pair(batch, matrices):
+    matrices = iter(matrices)
+    for inputs in batch:
+        yield inputs, None if isinstance(inputs, Exception) else next(matrices)
+
+
+def impose_pdf(items, output, template_id="qr6", page="A4", width_mm=None, margin_mm=8, gap_mm=4,
+               cut_marks=True, on_progress=None, workers=1, encoder="fast"):
+    # items: iterable inputs (đọc dần, không giữ lại); mỗi trang đầy được đóng ngay (showPage)
+    # output: đường dẫn hoặc file nhị phân; encoder: xem ENCODERS;
+    # workers > 1: mã hoá QR song song trên nhiều process. Trả về thống kê.
+    from reportlab import rl_config
+    from reportlab.pdfgen.canvas import Canvas
+    rl_config.useA85 = 0  # luồng nhị phân thay cho ASCII85: file nhỏ hơn ~20%, không tốn thời gian mã hoá
+    cols, rows, cell_w, cell_h, x0, y0, gap = grid(template_id, page, width_mm, margin_mm, gap_mm)
+    page_w, page_h = PAGE_SIZES[page]
+    canvas = Canvas(output, pagesize=(page_w, page_h), pageCompression=1)
+    canvas.setTitle(f"VietQR {template_id}")
+    per_page = cols * rows
+    start = time.perf_counter()
+    count = pages = 0
+    errors = []
+    for index, (inputs, matrix) in enumerate(_with_matrices(items, ENCODERS[encoder], workers)):
+        if isinstance(inputs, Exception):  # dòng lỗi từ bước đọc CSV
+            errors.append((index, str(inputs)))
+            continue
+        try:
+            sc = scene(template_id, inputs, matrix)
+        except Exception as e:
+            errors.append((index, f"{type(e).__name__}: {e}"))
+            continue
+        slot = count % per_page
+        if slot == 0 and count:
+            canvas.showPage()
+        if slot == 0:
+            pages += 1
+        r, c = divmod(slot, cols)
+        x = x0 + c * (cell_w + gap)
+        y = page_h - y0 - (r + 1) * cell_h - r * gap
+        draw_pdf(canvas, sc, x, y, cell_w)
+        if cut_marks:
+            _cut_marks(canvas, x, y, cell_w, cell_h)
+        count += 1
+        if on_progress and count % per_page == 0:
+            on_progress(count, pages, len(errors))
+    if count:
+        canvas.showPage()
+    canvas.save()
+    seconds = time.perf_counter() - start
+    if on_progress:
+        on_progress(count, pages, len(errors))
+    return {"items": count, "pages": pages, "per_page": per_page, "errors": len(errors), "error_rows": errors,
+            "seconds": seconds, "items_per_sec": count / seconds if seconds else 0.0}
+
+
+def csv_items(rows):
+    # Dòng CSV -> inputs; dòng lỗi trả về exception để impose_pdf ghi nhận mà không dừng
+    from bulk import row_inputs
+    for row in rows:
+        try:
+            yield row_inputs(row)
+        except ValueError as e:
+            yield e
+
+
+def main(argv=None):
+    from bulk import read_rows
+    parser = argparse.ArgumentParser(description="Dàn trang in VietQR hàng loạt từ CSV ra PDF vector")
+    parser.add_argument("csv", help="file CSV như bulk.py")
+    parser.add_argument("-o", "--output", default="vietqr_print.pdf")
+    parser.add_argument("-t", "--template", default="qr6", choices=VECTOR_TEMPLATES)
+    parser.add_argument("--page", default="A4", choices=list(PAGE_SIZES))
+    parser.add_argument("--width-mm", type=float, default=None, help="chiều rộng 1 ô (mm)")
+    parser.add_argument("--margin-mm", type=float, default=8)
+    parser.add_argument("--gap-mm", type=float, default=4)
+    parser.add_argument("--no-cut-marks", action="store_true")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="số process mã hoá QR (mặc định 1 = trong tiến trình; nên tăng khi dùng --exact-qr)")
+    parser.add_argument("--exact-qr", action="store_true",
+                        help="mã hoá QR bằng qrcode, giống từng điểm với ảnh PNG (chậm hơn)")
+    args = parser.parse_args(argv)
+    stats = impose_pdf(csv_items(read_rows(args.csv)), args.output, args.template, args.page, args.width_mm,
+                       args.margin_mm, args.gap_mm, cut_marks=not args.no_cut_marks, workers=args.workers,
+                       encoder="exact" if args.exact_qr else "fast")
+    size = os.path.getsize(args.output)
+    print(f"{stats['items']} ô / {stats['pages']} trang ({stats['per_page']} ô/trang), {size / 1e6:.2f} MB "
+          f"trong {stats['seconds']:.1f}s; {stats['errors']} lỗi -> {args.output}")
+    for index, message in stats["error_rows"][:20]:
+        print(f"  dòng {index + 1}: {message}", file=sys.stderr)
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
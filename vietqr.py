@@ -0,0 +1,103 @@
+from crc16 import crc16_ccitt
+import emv_tlv
+
+# ======== QR Logic Functions ========
+def clean_amount_input(raw_input):
+    if not raw_input:
+        return ""
+    try:
+        # Xử lý định dạng: "1.000.000,50" => "1000000.50"
+        cleaned = raw_input.replace(".", "").replace(",", ".")
+        value = float(cleaned)
+        return str(int(value))  # Lấy phần nguyên
+    except ValueError:
+        return None
+        
+def format_tlv(tag, value): return f"{tag}{len(value):02d}{value}"
+def sanitize_input(text):
+    return ''.join(text.split())
+
+# Lỗi mà parse_tlv cũ bỏ qua: tag không phải 2 chữ số (giữ nguyên văn), độ dài int() đọc được nhưng không
+# phải 2 chữ số (" 5", "+5"), tag lặp (lấy value cuối), thừa < 4 ký tự cuối. Chỉ emv_tlv.validate() coi là lỗi.
+# Độ dài âm vẫn raise: parse_tlv cũ lặp vô hạn hoặc cắt sai với các payload này
+LENIENT_ERRORS = ("bad_tag", "loose_length", "duplicate", "trailing")
+
+def _raise_first(errors):
+    for error in errors:
+        if error["code"] not in LENIENT_ERRORS:
+            raise ValueError(error["message"])
+
+def parse_tlv(payload):
+    # Giữ cho code cũ: dict tag -> value của 1 cấp, lỗi cấu trúc đầu tiên thì raise
+    root = emv_tlv.parse(payload)
+    tlv_data = root.to_dict(deep=False)
+    _raise_first(root.errors)
+    return tlv_data
+
+def extract_vietqr_info(payload):
+    # Chỉ quét các template cần dùng (38 -> 01, 62); lỗi cấu trúc thì raise như trước
+    root = emv_tlv.parse(payload)
+    info = {"account": "", "bank_bin": "", "name": "", "note": "", "amount": root.get("54")}
+    nested_38 = root.template("38")
+    acc_info = nested_38.template("01") if nested_38 is not None else None
+    if acc_info is not None:
+        info["bank_bin"] = acc_info.get("00")
+        info["account"] = acc_info.get("01")
+    add = root.template("62")
+    if add is not None:
+        info["note"] = add.get("08")
+    _raise_first(root.errors)
+    return info
+
+def payload_parts(merchant_id, bank_bin, add_info):
+    # Phần trước và sau tag 54 (số tiền) của payload; phần sau kết thúc bằng "6304", chưa có CRC
+    p = format_tlv
+    head = p("00", "01") + p("01", "12")
+    acc_info = p("00", bank_bin) + p("01", merchant_id)
+    nested_38 = p("00", "A000000727") + p("01", acc_info) + p("02", "QRIBFTTA")
+    head += p("38", nested_38) + p("52", "0000") + p("53", "704")
+    return head, p("58", "VN") + p("62", p("08", add_info)) + "6304"
+
+def build_vietqr_payload(merchant_id, bank_bin, add_info, amount=""):
+    head, tail = payload_parts(merchant_id, bank_bin, add_info)
+    payload = head + (format_tlv("54", amount) if amount else "") + tail
+    return payload + crc16_ccitt(payload)
+
+
+# ======== Bảng mã BIN ngân hàng ========
+BANK_MAP = {
+    "970418": "BIDV",
+    "970436": "Vietcombank",
+    "970415": "VietinBank",
+    "970405": "Agribank",
+    "970422": "MB Bank",
+    "970407": "Techcombank",
+    "970423": "TPBank",
+    "970424": "Shinhan Bank",
+    "970441": "VIB",
+    "970432": "VPBank",
+    "970443": "SHB",
+    "970431": "Eximbank",
+    "970438": "BaoVietBank",
+    "970454": "VietCapitalBank",
+    "970429": "SCB",
+    "970421": "VRB",
+    "970425": "ABBank",
+    "970412": "PVcomBank",
+    "970414": "OceanBank",
+    "970428": "NamABank",
+    "970437": "HDBank",
+    "970433": "VietBank",
+    "970459": "ABBANK",
+    "970448": "OCB",
+    "970409": "BacABank",
+    "970442": "Hong Leong Bank VN",
+    "970430": "PG Bank",
+    "970446": "Co-op Bank",
+    "422589": "CIMB VN",
+    "970434": "Indovina Bank",
+    "970457": "Woori VN",
+    "970458": "UOB VN",
+    "970466": "KEB Hana HCM",
+    "970467": "KEB Hana HN",
+}